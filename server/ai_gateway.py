@@ -0,0 +1,403 @@
+"""
+AI调用网关（ai:call / qa:use）
+
+- provider接口：generate(prompts, max_tokens) 批量生成，stream(prompt, max_tokens) 逐段生成；
+  本地fake provider不依赖外部服务，模拟固定并发的模型服务，供开发和基准测试使用
+- 微批处理：AI_BATCH_WINDOW_MS窗口内的并发请求合并为一次provider调用，
+  相同的请求（同一缓存键）在途时只调用一次
+- 响应缓存：按 (provider, 规范化后的prompt, 引用文档的版本号) 精确缓存，文档产生新版本后自然失效；
+  可选语义缓存：同一组文档版本下prompt向量的余弦相似度超过阈值时复用回答
+- 按用户和权限限制同时进行的请求数，超过时返回429
+- 流式请求不参与微批处理，直接从provider逐段输出（SSE），结束后写入缓存
+"""
+
+import asyncio
+import json
+import logging
+import re
+import unicodedata
+from collections import defaultdict
+from typing import AsyncIterator, Callable, Optional
+
+import numpy as np
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, func
+
+from cache import TTLCache
+from config import settings
+from enums import PermissionEnum
+from models import DocumentVersion
+import vector_index
+
+logger = logging.getLogger(__name__)
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+# ===== Provider =====
+class AIProvider:
+    """模型服务接口"""
+
+    name = "base"
+
+    async def generate(self, prompts: list, max_tokens: list) -> list:
+        """批量生成，返回与prompts一一对应的回答"""
+        raise NotImplementedError
+
+    async def stream(self, prompt: str, max_tokens: int) -> AsyncIterator[str]:
+        """逐段生成；默认实现一次返回完整回答"""
+        yield (await self.generate([prompt], [max_tokens]))[0]
+
+
+class FakeProvider(AIProvider):
+    """本地fake provider：每次调用固定延迟（与批大小无关），逐词输出，最多max_concurrency个调用同时执行"""
+
+    name = "fake"
+
+    def __init__(self, latency_ms: float = 200, token_latency_ms: float = 10, max_concurrency: int = 1):
+        self.latency = latency_ms / 1000
+        self.token_latency = token_latency_ms / 1000
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.calls = 0
+
+    @staticmethod
+    def answer(prompt: str, max_tokens: int) -> str:
+        question = prompt.strip().splitlines()[-1] if prompt.strip() else ""
+        words = f"Fake answer to: {question} (prompt {len(prompt)} chars)".split(" ")
+        return " ".join(words[:max_tokens])
+
+    async def generate(self, prompts: list, max_tokens: list) -> list:
+        async with self._slots:
+            self.calls += 1
+            await asyncio.sleep(self.latency)
+            return [self.answer(prompt, limit) for prompt, limit in zip(prompts, max_tokens)]
+
+    async def stream(self, prompt: str, max_tokens: int) -> AsyncIterator[str]:
+        async with self._slots:
+            self.calls += 1
+            await asyncio.sleep(self.latency)
+            words = self.answer(prompt, max_tokens).split(" ")
+            for i, word in enumerate(words):
+                yield word if i == 0 else " " + word
+                await asyncio.sleep(self.token_latency)
+
+
+PROVIDERS = {
+    "fake": lambda: FakeProvider(
+        settings.AI_FAKE_LATENCY_MS, settings.AI_FAKE_TOKEN_LATENCY_MS, settings.AI_FAKE_MAX_CONCURRENCY
+    ),
+}
+
+
+def register_provider(name: str, factory: Callable):
+    """注册模型服务，factory返回AIProvider子类实例"""
+    PROVIDERS[name] = factory
+
+
+def create_provider() -> AIProvider:
+    if settings.AI_PROVIDER not in PROVIDERS:
+        raise ValueError(f"Unknown AI_PROVIDER: {settings.AI_PROVIDER}")
+    return PROVIDERS[settings.AI_PROVIDER]()
+
+
+# ===== 微批处理 =====
+class MicroBatcher:
+    """把窗口期内的请求合并为一次provider.generate调用（只在事件循环线程中使用）"""
+
+    def __init__(self, provider: AIProvider, window_ms: float, max_batch: int):
+        self.provider = provider
+        self.window = window_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self._pending: list = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+        self.batches = 0
+        self.requests = 0
+        self.largest_batch = 0
+
+    async def submit(self, prompt: str, max_tokens: int) -> str:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((prompt, max_tokens, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list):
+        self.batches += 1
+        self.requests += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        try:
+            answers = await self.provider.generate([p for p, _, _ in batch], [m for _, m, _ in batch])
+        except Exception as exc:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (_, _, future), answer in zip(batch, answers):
+            if not future.done():
+                future.set_result(answer)
+
+    def stats(self) -> dict:
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "requests": self.requests,
+            "avg_batch": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+        }
+
+
+# ===== 缓存 =====
+def normalize_prompt(prompt: str) -> str:
+    """全角/半角统一、忽略大小写、合并空白"""
+    return WHITESPACE_PATTERN.sub(" ", unicodedata.normalize("NFKC", prompt)).strip().casefold()
+
+
+class SemanticCache:
+    """同一 (provider, 文档版本) 下按prompt向量相似度复用回答，每组最多保留per_context条"""
+
+    def __init__(self, threshold: Optional[float], max_size: int, ttl: Optional[float], per_context: int = 32):
+        self.threshold = threshold
+        self.per_context = per_context
+        self._groups = TTLCache(max_size=max_size, ttl=ttl)
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold is not None
+
+    def get(self, group: tuple, prompt: str) -> Optional[str]:
+        entries = self._groups.get(group)
+        if not entries:
+            return None
+        query = vector_index.embedder.embed([prompt])[0]
+        scores = np.stack([vector for vector, _ in entries]) @ query
+        best = int(np.argmax(scores))
+        return entries[best][1] if scores[best] >= self.threshold else None
+
+    def set(self, group: tuple, prompt: str, answer: str):
+        entries = self._groups.get(group) or []
+        entries = entries[-(self.per_context - 1):] + [(vector_index.embedder.embed([prompt])[0], answer)]
+        self._groups.set(group, entries)
+
+    def discard_where(self, predicate: Callable) -> int:
+        return self._groups.discard_where(predicate)
+
+    def stats(self) -> dict:
+        return {"threshold": self.threshold, **self._groups.stats()}
+
+
+# ===== 并发限制 =====
+class ConcurrencyLimiter:
+    """按 (用户, 权限) 限制同时进行的请求数（只在事件循环线程中修改）"""
+
+    def __init__(self, limits: dict):
+        self.limits = {getattr(k, "value", k): v for k, v in limits.items()}
+        self._active = defaultdict(int)
+        self.rejected = 0
+
+    def acquire(self, user_id: int, permission: str):
+        permission = getattr(permission, "value", permission)
+        key = (user_id, permission)
+        if self._active[key] >= self.limits.get(permission, 1):
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many concurrent AI requests",
+                headers={"Retry-After": "1"},
+            )
+        self._active[key] += 1
+
+    def release(self, user_id: int, permission: str):
+        key = (user_id, getattr(permission, "value", permission))
+        self._active[key] -= 1
+        if self._active[key] <= 0:
+            del self._active[key]
+
+    def stats(self) -> dict:
+        return {
+            "limits": self.limits,
+            "active": sum(self._active.values()),
+            "rejected": self.rejected,
+        }
+
+
+# ===== 网关 =====
+class AIGateway:
+    def __init__(self, provider: AIProvider):
+        self.provider = provider
+        self.batcher = MicroBatcher(provider, settings.AI_BATCH_WINDOW_MS, settings.AI_BATCH_MAX_SIZE)
+        self.cache = TTLCache(max_size=settings.AI_CACHE_SIZE, ttl=settings.AI_CACHE_TTL_SECONDS)
+        self.semantic_cache = SemanticCache(
+            settings.AI_SEMANTIC_CACHE_THRESHOLD, settings.AI_CACHE_SIZE, settings.AI_CACHE_TTL_SECONDS
+        )
+        self.limiter = ConcurrencyLimiter({
+            PermissionEnum.AI_CALL: settings.AI_CALL_MAX_CONCURRENT,
+            PermissionEnum.QA_USE: settings.QA_USE_MAX_CONCURRENT,
+        })
+        self._inflight: dict = {}
+
+    def _key(self, prompt: str, context: tuple, max_tokens: int) -> tuple:
+        return (self.provider.name, normalize_prompt(prompt), context, max_tokens)
+
+    def cached(self, prompt: str, context: tuple, max_tokens: int) -> Optional[str]:
+        """先按精确键查找，再按语义相似度查找"""
+        answer = self.cache.get(self._key(prompt, context, max_tokens))
+        if answer is None and self.semantic_cache.enabled:
+            answer = self.semantic_cache.get((self.provider.name, context, max_tokens), prompt)
+        return answer
+
+    def _remember(self, prompt: str, context: tuple, max_tokens: int, answer: str):
+        self.cache.set(self._key(prompt, context, max_tokens), answer)
+        if self.semantic_cache.enabled:
+            self.semantic_cache.set((self.provider.name, context, max_tokens), prompt, answer)
+
+    async def complete(self, prompt: str, context: tuple = (), max_tokens: Optional[int] = None) -> tuple:
+        """返回 (回答, 是否来自缓存)；context为引用文档的 ((document_id, version_number), ...)"""
+        max_tokens = max_tokens or settings.AI_MAX_TOKENS
+        answer = self.cached(prompt, context, max_tokens)
+        if answer is not None:
+            return answer, True
+
+        key = self._key(prompt, context, max_tokens)
+        future = self._inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future), True
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            answer = await self.batcher.submit(prompt, max_tokens)
+            self._remember(prompt, context, max_tokens, answer)
+            future.set_result(answer)
+            return answer, False
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # 没有其他等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def stream(self, prompt: str, context: tuple = (), max_tokens: Optional[int] = None) -> AsyncIterator[tuple]:
+        """逐段返回 (文本, 是否来自缓存)，完整输出后写入缓存"""
+        max_tokens = max_tokens or settings.AI_MAX_TOKENS
+        answer = self.cached(prompt, context, max_tokens)
+        if answer is not None:
+            yield answer, True
+            return
+        parts = []
+        async for delta in self.provider.stream(prompt, max_tokens):
+            parts.append(delta)
+            yield delta, False
+        self._remember(prompt, context, max_tokens, "".join(parts))
+
+    def forget_document(self, document_id: int):
+        """文档删除后清理引用该文档的缓存回答"""
+        self.cache.discard_where(lambda key: any(doc_id == document_id for doc_id, _ in key[2]))
+        self.semantic_cache.discard_where(lambda key: any(doc_id == document_id for doc_id, _ in key[1]))
+
+    def stats(self) -> dict:
+        return {
+            "provider": self.provider.name,
+            "batching": self.batcher.stats(),
+            "cache": self.cache.stats(),
+            "semantic_cache": self.semantic_cache.stats(),
+            "concurrency": self.limiter.stats(),
+            "inflight": len(self._inflight),
+        }
+
+
+ai_gateway = AIGateway(create_provider())
+
+
+# ===== 路由辅助 =====
+async def document_context(db, document_ids) -> tuple:
+    """引用文档的最新版本号，作为缓存键的一部分：((document_id, version_number), ...)"""
+    ids = sorted(set(document_ids))
+    if not ids:
+        return ()
+    rows = await db.execute(
+        select(DocumentVersion.document_id, func.max(DocumentVersion.version_number))
+        .where(DocumentVersion.document_id.in_(ids))
+        .group_by(DocumentVersion.document_id)
+    )
+    versions = dict(rows.all())
+    return tuple((doc_id, versions.get(doc_id, 0)) for doc_id in ids)
+
+
+def build_prompt(question: str, sources: list) -> str:
+    """把参考内容 [(标题, 文本)] 和问题拼成prompt，参考内容总长度不超过AI_CONTEXT_MAX_CHARS"""
+    budget = settings.AI_CONTEXT_MAX_CHARS
+    blocks = []
+    for i, (title, text) in enumerate(sources, start=1):
+        if budget <= 0:
+            break
+        text = (text or "")[:budget]
+        budget -= len(text)
+        blocks.append(f"[{i}] {title}\n{text}")
+    if not blocks:
+        return question
+    return "Reference material:\n\n" + "\n\n".join(blocks) + "\n\nQuestion:\n" + question
+
+
+def sse_event(data, event: Optional[str] = None) -> str:
+    """格式化一条SSE消息"""
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    lines.append("data: " + json.dumps(data, ensure_ascii=False))
+    return "\n".join(lines) + "\n\n"
+
+
+async def sse_stream(
+    prompt: str,
+    context: tuple,
+    max_tokens: Optional[int],
+    first_event: Optional[tuple] = None
+) -> AsyncIterator[str]:
+    """SSE响应体：可选的首条事件、delta事件、done事件"""
+    try:
+        if first_event is not None:
+            yield sse_event(first_event[1], first_event[0])
+        cached = False
+        async for delta, cached in ai_gateway.stream(prompt, context, max_tokens):
+            yield sse_event({"delta": delta})
+        yield sse_event({"cached": cached}, "done")
+    except Exception:
+        logger.exception("AI stream failed")
+        yield sse_event({"detail": "AI provider error"}, "error")
+
+
+class LimitedStreamingResponse(StreamingResponse):
+    """占用并发名额的流式响应：响应结束、客户端断开或响应体未开始迭代时都会释放名额
+
+    调用方先执行 ai_gateway.limiter.acquire(user_id, permission)，
+    再把对应的release作为release参数传入
+    """
+
+    def __init__(self, content, release: Callable[[], None], **kwargs):
+        super().__init__(content, **kwargs)
+        self._release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._release()
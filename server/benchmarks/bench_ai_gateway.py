@@ -0,0 +1,134 @@
+"""
+AI网关基准测试 - 微批处理对吞吐和延迟的影响、响应缓存命中率、流式首字延迟
+运行方式: python benchmarks/bench_ai_gateway.py --clients 64 --requests 4 --latency-ms 50
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+
+_tmp_dir = tempfile.mkdtemp(prefix="wisdombase-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp_dir}/bench.db"
+os.environ["DATABASE_ECHO"] = "False"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ai_gateway  # noqa: E402
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def make_gateway(args, window_ms: float, max_batch: int) -> ai_gateway.AIGateway:
+    """在当前事件循环中创建网关（fake provider的信号量不能跨事件循环使用）"""
+    provider = ai_gateway.FakeProvider(args.latency_ms, args.token_latency_ms, args.provider_concurrency)
+    gateway = ai_gateway.AIGateway(provider)
+    gateway.batcher = ai_gateway.MicroBatcher(provider, window_ms, max_batch)
+    return gateway
+
+
+async def run_clients(gateway, clients: int, prompts_for) -> tuple:
+    """clients个并发客户端各自顺序发送请求，返回 (每个请求的延迟, 总耗时)"""
+    latencies = []
+
+    async def client(index: int):
+        for prompt in prompts_for(index):
+            started = time.perf_counter()
+            await gateway.complete(prompt, ((index % 10, 1),))
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(clients)))
+    return latencies, time.perf_counter() - started
+
+
+async def bench_batching(args, window_ms: float, max_batch: int) -> dict:
+    gateway = make_gateway(args, window_ms, max_batch)
+    latencies, elapsed = await run_clients(
+        gateway, args.clients, lambda i: [f"question {i}-{n}" for n in range(args.requests)]
+    )
+    return {
+        "scenario": "batching",
+        "window_ms": window_ms,
+        "max_batch": max_batch,
+        "requests": len(latencies),
+        "provider_calls": gateway.provider.calls,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+    }
+
+
+async def bench_cache(args) -> dict:
+    """按Zipf分布重复提问（大小写/空白不同的写法视为同一问题）"""
+    gateway = make_gateway(args, args.window_ms, args.max_batch)
+    rng = random.Random(args.seed)
+    questions = [f"How do I configure feature {n}?" for n in range(args.distinct)]
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(questions))))
+
+    def prompts_for(index: int) -> list:
+        picks = rng.choices(questions, cum_weights=cum_weights, k=args.requests * 4)
+        return [p.upper() if rng.random() < 0.2 else p.replace(" ", "  ") for p in picks]
+
+    latencies, _ = await run_clients(gateway, args.clients, prompts_for)
+    stats = gateway.cache.stats()
+    return {
+        "scenario": "cache",
+        "requests": len(latencies),
+        "distinct": args.distinct,
+        "provider_calls": gateway.provider.calls,
+        "cache_hit_rate": stats["hit_rate"],
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 1),
+    }
+
+
+async def bench_stream(args) -> dict:
+    gateway = make_gateway(args, args.window_ms, args.max_batch)
+    started = time.perf_counter()
+    await gateway.complete("Explain the document version store", ())
+    complete_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    first_token_ms = None
+    async for _ in gateway.stream("Explain the search index", ()):
+        if first_token_ms is None:
+            first_token_ms = (time.perf_counter() - started) * 1000
+    stream_ms = (time.perf_counter() - started) * 1000
+    return {
+        "scenario": "stream",
+        "complete_ms": round(complete_ms, 1),
+        "stream_first_token_ms": round(first_token_ms, 1),
+        "stream_total_ms": round(stream_ms, 1),
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="AI gateway benchmark")
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=4, help="sequential requests per client")
+    parser.add_argument("--latency-ms", type=float, default=50, help="fake provider latency per call")
+    parser.add_argument("--token-latency-ms", type=float, default=5)
+    parser.add_argument("--provider-concurrency", type=int, default=1)
+    parser.add_argument("--window-ms", type=float, default=10)
+    parser.add_argument("--max-batch", type=int, default=16)
+    parser.add_argument("--distinct", type=int, default=200, help="distinct questions in the cache scenario")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(asyncio.run(bench_batching(args, 0, 1)))
+    print(asyncio.run(bench_batching(args, args.window_ms, args.max_batch)))
+    print(asyncio.run(bench_batching(args, args.window_ms, args.max_batch * 4)))
+    print(asyncio.run(bench_cache(args)))
+    print(asyncio.run(bench_stream(args)))
+
+
+if __name__ == "__main__":
+    main_cli()
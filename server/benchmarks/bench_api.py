@@ -0,0 +1,166 @@
+"""
+API负载基准测试 - 进程内ASGI应用 + 临时SQLite数据库，输出JSON便于不同提交之间对比
+覆盖 /auth/login、/auth/refresh-token、/auth/me、/users 列表、/logs 过滤，
+报告吞吐、p50/p95/p99延迟和每个请求的数据库查询数
+运行方式: python benchmarks/bench_api.py --users 1000 --logs 100000 --concurrency 16 --output result.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+_tmp_dir = tempfile.mkdtemp(prefix="wisdombase-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp_dir}/bench.db"
+os.environ["DATABASE_ECHO"] = "False"
+os.environ["LOG_ARCHIVE_DIR"] = os.path.join(_tmp_dir, "log_archive")
+os.environ["VECTOR_INDEX_DIR"] = os.path.join(_tmp_dir, "vector_index")
+# 所有请求来自同一客户端地址，关闭登录限流
+os.environ["LOGIN_RATE_LIMIT_ENABLED"] = "False"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+import init_db  # noqa: E402
+import security  # noqa: E402
+from database import async_engine  # noqa: E402
+
+SCENARIOS = ("login", "refresh", "me", "users", "logs")
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class QueryCounter:
+    """统计异步引擎上执行的SQL语句数"""
+
+    def __init__(self):
+        self.count = 0
+        event.listen(async_engine.sync_engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+async def run_scenario(client, name: str, admin_token: str, requests: int, concurrency: int, queries: QueryCounter) -> dict:
+    # refresh token只能使用一次，预先生成
+    refresh_tokens = [security.create_token(subject=1, token_type="refresh") for _ in range(requests)] if name == "refresh" else []
+
+    async def call(i: int):
+        if name == "login":
+            return await client.post("/api/v1/auth/login", json={"username": "admin", "password": "admin123"})
+        if name == "refresh":
+            return await client.post("/api/v1/auth/refresh-token", json={"refreshToken": refresh_tokens[i]})
+        if name == "me":
+            return await client.get("/api/v1/auth/me", params={"token": admin_token})
+        if name == "users":
+            return await client.get("/api/v1/users", params={"token": admin_token, "limit": 100})
+        return await client.get("/api/v1/logs", params={"token": admin_token, "action": "LOGIN", "limit": 50})
+
+    # 预热（填充缓存、建立连接）
+    for i in range(min(concurrency, 5)):
+        if name != "refresh":
+            await call(i)
+
+    latencies, status_counts = [], {}
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index
+        while next_index < requests:
+            i = next_index
+            next_index += 1
+            started = time.perf_counter()
+            response = await call(i)
+            latencies.append((time.perf_counter() - started) * 1000)
+            status_counts[response.status_code] = status_counts.get(response.status_code, 0) + 1
+
+    queries_before = queries.count
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "scenario": name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "status_counts": {str(k): v for k, v in sorted(status_counts.items())},
+        "req_per_sec": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "db_queries_per_request": round((queries.count - queries_before) / requests, 2),
+    }
+
+
+async def run(args) -> list:
+    import main
+    queries = QueryCounter()
+    results = []
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            login = await client.post("/api/v1/auth/login", json={"username": "admin", "password": "admin123"})
+            admin_token = login.json()["data"]["accessToken"]
+            for name in args.scenarios:
+                requests = args.login_requests if name == "login" else args.requests
+                result = await run_scenario(client, name, admin_token, requests, args.concurrency, queries)
+                print(json.dumps(result, ensure_ascii=False), file=sys.stderr)
+                results.append(result)
+    await async_engine.dispose()
+    return results
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="API load and latency benchmark")
+    parser.add_argument("--users", type=int, default=1000, help="extra users to create")
+    parser.add_argument("--logs", type=int, default=100000, help="operation logs to create")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per scenario")
+    parser.add_argument("--login-requests", type=int, default=200, help="requests for the login scenario (argon2 bound)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    init_db.init_db()
+    started = time.perf_counter()
+    init_db.generate_users(args.users, password="bench123")
+    init_db.generate_logs(args.logs, days=30)
+    seed_seconds = time.perf_counter() - started
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "dataset": {"users": args.users + 3, "logs": args.logs, "seed_seconds": round(seed_seconds, 1)},
+        "results": asyncio.run(run(args)),
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,88 @@
+"""
+Token校验基准测试 - verify_token单次耗时，以及 /auth/me 在有无已验证token缓存、不同JWT实现下的吞吐
+运行方式: python benchmarks/bench_auth.py --requests 2000 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+_tmp_dir = tempfile.mkdtemp(prefix="wisdombase-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp_dir}/bench.db"
+os.environ["DATABASE_ECHO"] = "False"
+os.environ["LOG_ARCHIVE_DIR"] = os.path.join(_tmp_dir, "log_archive")
+os.environ["VECTOR_INDEX_DIR"] = os.path.join(_tmp_dir, "vector_index")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+import init_db  # noqa: E402
+import security  # noqa: E402
+from cache import TTLCache  # noqa: E402
+from config import settings  # noqa: E402
+from database import async_engine  # noqa: E402
+
+init_db.init_db()
+
+import main  # noqa: E402
+
+
+def configure(backend: str, cached: bool):
+    security.JWT_BACKEND = backend
+    security.token_cache = TTLCache(max_size=settings.TOKEN_CACHE_MAX_SIZE) if cached else None
+
+
+def verify_us(token: str, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        security.verify_token(token)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+async def measure_me(token: str, requests: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # 预热：填充principal_cache和token缓存
+        await client.get("/api/v1/auth/me", params={"token": token})
+        remaining = requests
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                response = await client.get("/api/v1/auth/me", params={"token": token})
+                assert response.status_code == 200, response.text
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    await async_engine.dispose()
+    return requests / elapsed
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Token verification benchmark")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    backends = ["jose"] + (["pyjwt"] if security.pyjwt is not None else [])
+    for backend in backends:
+        for cached in (False, True):
+            configure(backend, cached)
+            token = security.create_token(subject=1, token_type="access")
+            result = {
+                "backend": backend,
+                "token_cache": cached,
+                "verify_us": round(verify_us(token, args.iterations), 2),
+                "me_rps": round(asyncio.run(measure_me(token, args.requests, args.concurrency)), 1),
+            }
+            print(result)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,117 @@
+"""
+登录并发基准测试 - 对比密码校验在事件循环内执行与放入线程池执行
+运行方式: python benchmarks/bench_login.py --clients 200 --requests 1000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# 使用临时SQLite数据库，避免影响开发数据库
+_tmp_dir = tempfile.mkdtemp(prefix="wisdombase-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp_dir}/bench.db"
+os.environ["DATABASE_ECHO"] = "False"
+# 所有请求来自同一客户端地址，关闭登录限流
+os.environ["LOGIN_RATE_LIMIT_ENABLED"] = "False"
+os.environ["LOG_ARCHIVE_DIR"] = os.path.join(_tmp_dir, "log_archive")
+os.environ["VECTOR_INDEX_DIR"] = os.path.join(_tmp_dir, "vector_index")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+import init_db  # noqa: E402
+import main  # noqa: E402
+from database import async_engine  # noqa: E402
+import security  # noqa: E402
+from log_sink import log_sink  # noqa: E402
+from routes import auth  # noqa: E402
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(mode: str, clients: int, total_requests: int) -> dict:
+    if mode == "inline":
+        # 旧实现：在事件循环中直接校验密码
+        async def verify_inline(plain_password, hashed_password):
+            return security.verify_password(plain_password, hashed_password)
+        auth.verify_password_async = verify_inline
+    else:
+        auth.verify_password_async = security.verify_password_async
+
+    transport = httpx.ASGITransport(app=main.app)
+    login_latencies, loop_lags = [], []
+    status_counts = {}
+    remaining = total_requests
+    done = asyncio.Event()
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def login_worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                started = time.perf_counter()
+                response = await client.post(
+                    "/api/v1/auth/login",
+                    json={"username": "admin", "password": "admin123"}
+                )
+                if response.status_code == 200:
+                    login_latencies.append((time.perf_counter() - started) * 1000)
+                status_counts[response.status_code] = status_counts.get(response.status_code, 0) + 1
+
+        async def probe_worker():
+            # 登录风暴期间事件循环的调度延迟，反映其他请求是否被阻塞
+            while not done.is_set():
+                started = time.perf_counter()
+                await asyncio.sleep(0.01)
+                loop_lags.append((time.perf_counter() - started - 0.01) * 1000)
+
+        started = time.perf_counter()
+        probe = asyncio.create_task(probe_worker())
+        await asyncio.gather(*(login_worker() for _ in range(clients)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await probe
+
+    # 每次asyncio.run都会创建新的事件循环，释放连接池避免旧循环上的连接阻塞退出
+    await async_engine.dispose()
+
+    return {
+        "mode": mode,
+        "clients": clients,
+        "requests": total_requests,
+        "status_counts": status_counts,
+        "req_per_sec": round(total_requests / elapsed, 1),
+        "login_p50_ms": round(percentile(login_latencies, 50), 1),
+        "login_p99_ms": round(percentile(login_latencies, 99), 1),
+        "loop_lag_p50_ms": round(percentile(loop_lags, 50), 1),
+        "loop_lag_max_ms": round(max(loop_lags), 1),
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Login concurrency benchmark")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--mode", choices=["inline", "pool", "both"], default="both")
+    args = parser.parse_args()
+
+    init_db.init_db()
+    log_sink.start()
+    modes = ["inline", "pool"] if args.mode == "both" else [args.mode]
+    try:
+        for mode in modes:
+            result = asyncio.run(run(mode, args.clients, args.requests))
+            print(result)
+    finally:
+        log_sink.stop()
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,85 @@
+"""
+权限检查基准测试 - 对比每次请求解析permissions JSON+列表查找、frozenset查找与预编译位掩码
+运行方式: python benchmarks/bench_permissions.py --iterations 200000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+_tmp_dir = tempfile.mkdtemp(prefix="wisdombase-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp_dir}/bench.db"
+os.environ["DATABASE_ECHO"] = "False"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from enums import PERMISSION_BITS, ROLE_PERMISSION_SETS, PermissionEnum  # noqa: E402
+from security import Principal, check_permission, permission_mask  # noqa: E402
+
+
+def ns_per_call(func, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1e9
+
+
+def legacy_check(raw_permissions: str, required: str) -> bool:
+    """旧方案：每次请求json.loads后在列表中线性查找"""
+    permissions = json.loads(raw_permissions) if raw_permissions else []
+    if "*:*:*" in permissions or "permission:btn:*" in permissions:
+        return True
+    return required in permissions
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Permission check benchmark")
+    parser.add_argument("--iterations", type=int, default=200000)
+    args = parser.parse_args()
+
+    required = PermissionEnum.QA_USE.value
+    for role in ("viewer", "editor", "admin"):
+        permissions = ROLE_PERMISSION_SETS[role]
+        raw = json.dumps(sorted(permissions))
+        principal = Principal(
+            id=1, username=role, is_active=True, roles=frozenset({role}),
+            permissions=permissions, permission_mask=permission_mask(permissions)
+        )
+        bit = PERMISSION_BITS[required]
+
+        legacy_ns = ns_per_call(lambda: legacy_check(raw, required), args.iterations)
+        set_ns = ns_per_call(
+            lambda: "*:*:*" in principal.permissions or "permission:btn:*" in principal.permissions
+            or required in principal.permissions,
+            args.iterations
+        )
+        mask_ns = ns_per_call(lambda: principal.permission_mask & bit, args.iterations)
+
+        # check_permission生成的依赖函数（不含token解析；editor没有qa:use，走403分支）
+        checker = check_permission(PermissionEnum.QA_USE)
+
+        async def run_checker():
+            started = time.perf_counter()
+            for _ in range(args.iterations):
+                try:
+                    await checker(current_user=principal)
+                except Exception:
+                    pass
+            return (time.perf_counter() - started) / args.iterations * 1e9
+
+        checker_ns = asyncio.run(run_checker())
+        print({
+            "role": role,
+            "permissions": len(permissions),
+            "json_list_ns": round(legacy_ns),
+            "frozenset_ns": round(set_ns),
+            "bitmask_ns": round(mask_ns),
+            "checker_dependency_ns": round(checker_ns),
+        })
+
+
+if __name__ == "__main__":
+    main_cli()
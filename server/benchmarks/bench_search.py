@@ -0,0 +1,161 @@
+"""
+全文检索基准测试 - 对比LIKE全表扫描、FTS5和内存倒排索引的查询延迟
+运行方式: python benchmarks/bench_search.py --documents 100000 --queries 200
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+
+_tmp_dir = tempfile.mkdtemp(prefix="wisdombase-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp_dir}/bench.db"
+os.environ["DATABASE_ECHO"] = "False"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, select  # noqa: E402
+
+import init_db  # noqa: E402
+import search_index  # noqa: E402
+from database import engine, async_engine, AsyncSessionLocal  # noqa: E402
+from models import Document  # noqa: E402
+
+COMMON_CHARS = "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处府研"
+ENGLISH_WORDS = ["search", "index", "ranking", "cache", "latency", "version", "permission", "vector", "token", "shard"]
+
+
+def make_vocabulary(rng: random.Random, size: int) -> list:
+    words = ["".join(rng.choice(COMMON_CHARS) for _ in range(rng.randint(2, 4))) for _ in range(size)]
+    return words + ENGLISH_WORDS
+
+
+def make_text(rng: random.Random, vocabulary: list, cum_weights: list, length: int) -> str:
+    parts, total = [], 0
+    while total < length:
+        word = rng.choices(vocabulary, cum_weights=cum_weights)[0]
+        parts.append(word)
+        total += len(word)
+        if rng.random() < 0.08:
+            parts.append("。")
+    return "".join(parts)
+
+
+def populate(count: int, body_length: int, seed: int) -> list:
+    """批量写入文档，返回词表（按Zipf分布抽词）"""
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(rng, 5000)
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    batch = []
+    with engine.begin() as conn:
+        for i in range(count):
+            batch.append({
+                "title": make_text(rng, vocabulary, cum_weights, 12),
+                "content": make_text(rng, vocabulary, cum_weights, body_length),
+                "author_id": 1,
+                "is_published": i % 5 != 0,
+            })
+            if len(batch) == 5000:
+                conn.execute(insert(Document), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(Document), batch)
+    return vocabulary
+
+
+def make_queries(vocabulary: list, count: int, seed: int) -> list:
+    """常见词、中频词、低频词和双词组合各占一部分"""
+    rng = random.Random(seed + 1)
+    queries = []
+    for i in range(count):
+        kind = i % 4
+        if kind == 0:
+            queries.append(rng.choice(vocabulary[:50]))
+        elif kind == 1:
+            queries.append(rng.choice(vocabulary[50:1000]))
+        elif kind == 2:
+            queries.append(rng.choice(vocabulary[1000:]))
+        else:
+            queries.append(f"{rng.choice(vocabulary[:200])} {rng.choice(vocabulary[200:2000])}")
+    return queries
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def measure(name: str, queries: list, run_query) -> dict:
+    latencies, hits = [], 0
+    async with AsyncSessionLocal() as db:
+        for query in queries:
+            started = time.perf_counter()
+            results = await run_query(db, query)
+            latencies.append((time.perf_counter() - started) * 1000)
+            hits += bool(results)
+    # 每次asyncio.run结束前关闭连接，否则aiosqlite线程会阻止进程退出
+    await async_engine.dispose()
+    return {
+        "method": name,
+        "queries": len(queries),
+        "with_results": hits,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "max_ms": round(max(latencies), 2),
+    }
+
+
+async def like_query(db, query: str) -> list:
+    """旧方案：LIKE '%x%' 全表扫描（只取前20条，不排序）"""
+    statement = select(Document.id).where(Document.is_published.is_(True))
+    for word in query.split():
+        statement = statement.where(Document.content.like(f"%{word}%"))
+    return (await db.execute(statement.limit(20))).all()
+
+
+async def index_query(db, query: str) -> list:
+    return await search_index.search_documents(db, query, 20, 0, include_drafts=False)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Document search benchmark")
+    parser.add_argument("--documents", type=int, default=100000)
+    parser.add_argument("--body-length", type=int, default=300, help="characters per document body")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--backends", default="like,fts5,memory")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    init_db.init_db()
+    started = time.perf_counter()
+    vocabulary = populate(args.documents, args.body_length, args.seed)
+    print({"documents": args.documents, "populate_s": round(time.perf_counter() - started, 1)})
+    queries = make_queries(vocabulary, args.queries, args.seed)
+
+    for backend in args.backends.split(","):
+        if backend == "like":
+            print(asyncio.run(measure("like_scan", queries, like_query)))
+            continue
+        if backend == "fts5" and not search_index.fts5_available(engine):
+            print({"method": "fts5", "skipped": "SQLite build without FTS5"})
+            continue
+        search_index.search_backend = (
+            search_index.FTS5SearchBackend() if backend == "fts5" else search_index.MemorySearchBackend()
+        )
+        started = time.perf_counter()
+        search_index.init_search_index(rebuild=True)
+        build_s = round(time.perf_counter() - started, 1)
+        result = asyncio.run(measure(backend, queries, index_query))
+        result["build_s"] = build_s
+        print(result)
+        if backend == "memory":
+            # 释放内存索引，避免影响后续测试
+            search_index.search_backend.clear()
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,168 @@
+"""
+列表接口序列化基准测试 - 对比ORM对象 + 两次pydantic校验 + 标准库json（原实现）与
+列元组 + dict + orjson（当前实现）在limit=100时每行的耗时
+
+- 分阶段：查询取数（fetch）、构建响应（build）、序列化（encode），直接在异步会话上执行
+- 端到端：通过进程内ASGI请求 /users 和 /logs，报告每个请求和每行的耗时
+运行方式: python benchmarks/bench_serialization.py --users 1000 --logs 20000 --limit 100 --rounds 200
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+_tmp_dir = tempfile.mkdtemp(prefix="wisdombase-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp_dir}/bench.db"
+os.environ["DATABASE_ECHO"] = "False"
+os.environ["LOG_ARCHIVE_DIR"] = os.path.join(_tmp_dir, "log_archive")
+os.environ["VECTOR_INDEX_DIR"] = os.path.join(_tmp_dir, "vector_index")
+os.environ["LOGIN_RATE_LIMIT_ENABLED"] = "False"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+
+import init_db  # noqa: E402
+import responses  # noqa: E402
+from database import AsyncSessionLocal, async_engine  # noqa: E402
+from models import User, OperationLog  # noqa: E402
+from schemas import UserResponse, UserListResponse, OperationLogResponse, OperationLogListResponse  # noqa: E402
+from routes.users import USER_LIST_COLUMNS, user_list_items  # noqa: E402
+from routes.logs import LOG_COLUMNS  # noqa: E402
+from log_retention import ARCHIVE_FIELDS  # noqa: E402
+
+
+def stdlib_dumps(content) -> bytes:
+    """FastAPI默认JSONResponse的序列化方式"""
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+async def baseline_users(db, limit: int, field):
+    started = time.perf_counter()
+    users = (await db.scalars(select(User).order_by(User.id).limit(limit))).all()
+    fetched = time.perf_counter()
+    content = UserListResponse(total=len(users), items=[UserResponse.model_validate(user) for user in users])
+    value = await serialize_response(field=field, response_content=content, is_coroutine=True)
+    built = time.perf_counter()
+    stdlib_dumps(value)
+    return fetched - started, built - fetched, time.perf_counter() - built
+
+
+async def lean_users(db, limit: int, field=None):
+    started = time.perf_counter()
+    items = await user_list_items(db, select(*USER_LIST_COLUMNS).order_by(User.id).limit(limit))
+    fetched = time.perf_counter()
+    content = {"total": len(items), "items": items}
+    built = time.perf_counter()
+    responses.dumps(content)
+    return fetched - started, built - fetched, time.perf_counter() - built
+
+
+def log_query(columns, limit: int):
+    return select(*columns).order_by(OperationLog.created_at.desc(), OperationLog.id.desc()).limit(limit)
+
+
+async def baseline_logs(db, limit: int, field):
+    started = time.perf_counter()
+    logs = (await db.scalars(log_query([OperationLog], limit))).all()
+    fetched = time.perf_counter()
+    content = OperationLogListResponse(items=[OperationLogResponse.model_validate(log) for log in logs])
+    value = await serialize_response(field=field, response_content=content, is_coroutine=True)
+    built = time.perf_counter()
+    stdlib_dumps(value)
+    return fetched - started, built - fetched, time.perf_counter() - built
+
+
+async def lean_logs(db, limit: int, field=None):
+    started = time.perf_counter()
+    rows = await db.execute(log_query(LOG_COLUMNS, limit))
+    items = [dict(zip(ARCHIVE_FIELDS, row)) for row in rows]
+    fetched = time.perf_counter()
+    content = {"total": None, "total_is_estimate": False, "next_cursor": None, "items": items}
+    built = time.perf_counter()
+    responses.dumps(content)
+    return fetched - started, built - fetched, time.perf_counter() - built
+
+
+async def run_stages(limit: int, rounds: int) -> list:
+    cases = [
+        ("users", "baseline", baseline_users, create_response_field("users", UserListResponse)),
+        ("users", "lean", lean_users, None),
+        ("logs", "baseline", baseline_logs, create_response_field("logs", OperationLogListResponse)),
+        ("logs", "lean", lean_logs, None),
+    ]
+    results = []
+    for endpoint, variant, func, field in cases:
+        totals = [0.0, 0.0, 0.0]
+        for i in range(rounds + 5):
+            # 每轮使用新会话，避免identity map缓存ORM对象
+            async with AsyncSessionLocal() as db:
+                stages = await func(db, limit, field)
+            if i >= 5:
+                totals = [total + stage for total, stage in zip(totals, stages)]
+        per_row = [total / rounds / limit * 1e6 for total in totals]
+        results.append({
+            "endpoint": endpoint,
+            "variant": variant,
+            "fetch_us_per_row": round(per_row[0], 2),
+            "build_us_per_row": round(per_row[1], 2),
+            "encode_us_per_row": round(per_row[2], 2),
+            "total_us_per_row": round(sum(per_row), 2),
+        })
+    return results
+
+
+async def run_http(limit: int, rounds: int) -> list:
+    import main
+    results = []
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            login = await client.post("/api/v1/auth/login", json={"username": "admin", "password": "admin123"})
+            params = {"token": login.json()["data"]["accessToken"], "limit": limit}
+            for endpoint, path in (("users", "/api/v1/users"), ("logs", "/api/v1/logs")):
+                for _ in range(5):
+                    await client.get(path, params=params)
+                started = time.perf_counter()
+                for _ in range(rounds):
+                    response = await client.get(path, params=params)
+                elapsed = (time.perf_counter() - started) / rounds
+                results.append({
+                    "endpoint": endpoint,
+                    "rows": len(response.json()["items"]),
+                    "ms_per_request": round(elapsed * 1000, 3),
+                    "us_per_row": round(elapsed / limit * 1e6, 2),
+                })
+    return results
+
+
+async def run(args) -> dict:
+    stages = await run_stages(args.limit, args.rounds)
+    http = await run_http(args.limit, args.rounds)
+    await async_engine.dispose()
+    return {"orjson": responses.orjson is not None, "limit": args.limit, "stages": stages, "http": http}
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="List endpoint serialization benchmark")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--logs", type=int, default=20000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    init_db.init_db()
+    init_db.generate_users(args.users)
+    init_db.generate_logs(args.logs, days=30)
+    print(json.dumps(asyncio.run(run(args)), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main_cli()
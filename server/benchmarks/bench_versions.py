@@ -0,0 +1,175 @@
+"""
+文档版本存储基准测试 - 对比每版本全文存储与快照+增量存储的空间占用和还原延迟
+运行方式: python benchmarks/bench_versions.py --size-mb 2 --versions 500 --intervals 10,20,50
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import namedtuple
+
+_tmp_dir = tempfile.mkdtemp(prefix="wisdombase-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp_dir}/bench.db"
+os.environ["DATABASE_ECHO"] = "False"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import version_store  # noqa: E402
+
+StoredVersion = namedtuple("StoredVersion", "version_number storage codec payload")
+
+WORDS = ["知识库", "文档", "版本", "检索", "权限", "system", "index", "query", "cache", "latency", "用户", "日志"]
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def random_line(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 16))) + "\n"
+
+
+def make_document(rng: random.Random, size_bytes: int) -> list:
+    lines, total = [], 0
+    while total < size_bytes:
+        line = random_line(rng)
+        lines.append(line)
+        total += len(line.encode("utf-8"))
+    return lines
+
+
+def edit_document(rng: random.Random, lines: list) -> list:
+    """模拟一次编辑：修改、插入或删除若干行"""
+    lines = list(lines)
+    for _ in range(rng.randint(1, 5)):
+        position = rng.randrange(len(lines))
+        kind = rng.random()
+        if kind < 0.6:
+            lines[position] = random_line(rng)
+        elif kind < 0.85:
+            lines[position:position] = [random_line(rng) for _ in range(rng.randint(1, 10))]
+        elif len(lines) > 10:
+            del lines[position:position + rng.randint(1, 5)]
+    return lines
+
+
+def build_versions(size_mb: float, count: int, codec: str, seed: int) -> list:
+    """生成版本序列，每个版本同时计算快照和相对上一版本的增量（与快照间隔无关）"""
+    rng = random.Random(seed)
+    lines = make_document(rng, int(size_mb * 1024 * 1024))
+    versions = []
+    previous = None
+    encode_ms = []
+    for number in range(1, count + 1):
+        content = "".join(lines)
+        raw = content.encode("utf-8")
+        started = time.perf_counter()
+        snapshot = version_store.compress(raw, codec)
+        delta = None
+        if previous is not None:
+            delta = version_store.compress(version_store.make_delta(previous, content), codec)
+        encode_ms.append((time.perf_counter() - started) * 1000)
+        versions.append({
+            "number": number,
+            "raw_size": len(raw),
+            "snapshot": snapshot,
+            "delta": delta,
+            "digest": hashlib.sha1(raw).hexdigest(),
+        })
+        previous = content
+        lines = edit_document(rng, lines)
+    return versions, encode_ms
+
+
+def layout(versions: list, interval: int, codec: str) -> list:
+    """按快照间隔选择每个版本的存储方式（与version_store.encode_version规则一致）"""
+    stored = []
+    for version in versions:
+        delta = version["delta"]
+        if delta is None or version_store.is_snapshot_version(version["number"], interval) \
+                or len(delta) >= len(version["snapshot"]):
+            stored.append(StoredVersion(version["number"], version_store.STORAGE_SNAPSHOT, codec, version["snapshot"]))
+        else:
+            stored.append(StoredVersion(version["number"], version_store.STORAGE_DELTA, codec, delta))
+    return stored
+
+
+def reconstruct(stored: list, number: int) -> str:
+    start = number - 1
+    while stored[start].storage != version_store.STORAGE_SNAPSHOT:
+        start -= 1
+    return version_store.decode_chain(stored[start:number])
+
+
+def measure_reads(versions: list, read, samples: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    latencies = []
+    for _ in range(samples):
+        version = rng.choice(versions)
+        started = time.perf_counter()
+        content = read(version["number"])
+        latencies.append((time.perf_counter() - started) * 1000)
+        assert hashlib.sha1(content.encode("utf-8")).hexdigest() == version["digest"]
+    return {
+        "read_p50_ms": round(percentile(latencies, 50), 2),
+        "read_p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Document version storage benchmark")
+    parser.add_argument("--size-mb", type=float, default=2.0)
+    parser.add_argument("--versions", type=int, default=500)
+    parser.add_argument("--intervals", default="10,20,50")
+    parser.add_argument("--codec", choices=["zlib", "zstd"], default="zlib")
+    parser.add_argument("--samples", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.codec == "zstd" and version_store.zstandard is None:
+        parser.error("zstd codec requires the zstandard package")
+
+    versions, encode_ms = build_versions(args.size_mb, args.versions, args.codec, args.seed)
+    print({
+        "versions": args.versions,
+        "document_mb": round(versions[-1]["raw_size"] / 1024 / 1024, 2),
+        "encode_p50_ms": round(percentile(encode_ms, 50), 1),
+        "encode_p99_ms": round(percentile(encode_ms, 99), 1),
+    })
+
+    # 旧方案：每个版本一份未压缩全文
+    raw_copies = {}
+    for version in versions:
+        raw_copies[version["number"]] = version_store.decompress(version["snapshot"], args.codec)
+    result = {"scheme": "full_copy", "stored_mb": round(sum(v["raw_size"] for v in versions) / 1024 / 1024, 2)}
+    result.update(measure_reads(versions, lambda n: raw_copies[n].decode("utf-8"), args.samples, args.seed))
+    print(result)
+    raw_copies.clear()
+
+    # 每个版本一份压缩全文
+    snapshots = {v["number"]: v["snapshot"] for v in versions}
+    result = {"scheme": f"full_copy_{args.codec}", "stored_mb": round(sum(len(p) for p in snapshots.values()) / 1024 / 1024, 2)}
+    result.update(measure_reads(
+        versions, lambda n: version_store.decompress(snapshots[n], args.codec).decode("utf-8"), args.samples, args.seed
+    ))
+    print(result)
+
+    for interval in (int(i) for i in args.intervals.split(",")):
+        stored = layout(versions, interval, args.codec)
+        result = {
+            "scheme": f"snapshot_delta_{args.codec}",
+            "interval": interval,
+            "snapshots": sum(1 for s in stored if s.storage == version_store.STORAGE_SNAPSHOT),
+            "stored_mb": round(sum(len(s.payload) for s in stored) / 1024 / 1024, 2),
+        }
+        result.update(measure_reads(versions, lambda n: reconstruct(stored, n), args.samples, args.seed))
+        print(result)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,84 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class TTLCache:
+    """带过期时间的LRU缓存（线程安全）
+
+    - 超过max_size时淘汰最久未使用的条目
+    - ttl为None表示条目不过期，仅受容量约束
+    - 记录命中/未命中/淘汰次数，供监控接口读取
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """读取缓存，过期条目视为未命中"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """写入缓存，ttl参数可覆盖默认过期时间"""
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> Any:
+        """删除并返回指定条目"""
+        with self._lock:
+            item = self._data.pop(key, None)
+        return item[0] if item else None
+
+    def discard_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """删除键满足条件的全部条目，返回删除数量"""
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+        return len(keys)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """缓存统计信息"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
@@ -1,5 +1,6 @@
 import os
 from datetime import timedelta
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 
@@ -14,7 +15,30 @@ class Settings(BaseSettings):
     
     # 数据库配置
     DATABASE_URL: str = "sqlite:///./wisdombase.db"
-    DATABASE_ECHO: bool = True
+    DATABASE_ECHO: bool = False  # 逐条输出SQL，仅用于本地调试；性能分析使用下面的SQL_*配置
+    
+    # SQL性能分析配置（慢查询日志、N+1检测、请求采样）
+    SQL_PROFILER_ENABLED: bool = True
+    SQL_SLOW_QUERY_MS: float = 200  # 超过该耗时的语句记录日志（含参数）
+    SQL_SLOW_QUERY_EXPLAIN: bool = True  # 慢SELECT附带执行计划（后台线程执行EXPLAIN）
+    SQL_N_PLUS_ONE_THRESHOLD: int = 10  # 同一请求中同一条SQL执行次数达到该值时告警
+    SQL_TRACE_SAMPLE_RATE: float = 0.0  # 输出完整SQL轨迹的请求比例（0~1）
+    SQL_TRACE_MAX_STATEMENTS: int = 500  # 采样请求最多记录的语句数
+    
+    # 数据库连接池配置（SQLite内存库不适用）
+    DATABASE_POOL_SIZE: int = 5
+    DATABASE_MAX_OVERFLOW: int = 10
+    DATABASE_POOL_TIMEOUT: float = 30  # 获取连接的最长等待时间（秒）
+    DATABASE_POOL_PRE_PING: bool = True
+    DATABASE_POOL_RECYCLE: int = 1800  # 连接回收时间（秒），-1表示不回收
+    
+    # SQLite PRAGMA配置（仅SQLite生效）
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_CACHE_SIZE: int = -65536  # 负数表示KiB，约64MB
+    SQLITE_MMAP_SIZE: int = 268435456  # 256MB
+    SQLITE_TEMP_STORE: str = "MEMORY"
     
     # JWT配置
     SECRET_KEY: str = "your-secret-key-change-this-in-production"
@@ -22,6 +46,101 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 120  # 2小时
     REFRESH_TOKEN_EXPIRE_DAYS: int = 30
     
+    # JWT解码配置
+    JWT_BACKEND: str = "jose"  # jose / pyjwt（需安装PyJWT，解码更快）
+    TOKEN_CACHE_MAX_SIZE: int = 10000  # 已验证token的缓存条数，0表示不缓存
+    TOKEN_CACHE_TTL_SECONDS: float = 300  # 缓存的最长时间（不超过token的exp）
+    
+    # token吊销配置
+    TOKEN_REVOCATION_BLOOM_CAPACITY: int = 100000  # Bloom过滤器预计容纳的吊销数，超出时自动扩容
+    TOKEN_REVOCATION_BLOOM_ERROR_RATE: float = 0.001
+    TOKEN_REVOCATION_SYNC_SECONDS: float = 5  # 从数据库同步其他进程的吊销记录并清理过期记录的间隔
+    
+    # 登录限流配置（滑动窗口）
+    LOGIN_RATE_LIMIT_ENABLED: bool = True
+    LOGIN_RATE_LIMIT_STORE: str = "memory"  # 计数存储，可通过rate_limit.register_rate_limit_store注册共享存储
+    LOGIN_RATE_LIMIT_MAX_KEYS: int = 100000  # memory存储最多保存的键数
+    LOGIN_IP_MAX_ATTEMPTS: int = 30  # 每个IP在窗口内的登录尝试次数
+    LOGIN_IP_WINDOW_SECONDS: float = 60
+    LOGIN_USERNAME_MAX_FAILURES: int = 5  # 每个用户名在窗口内的失败次数，登录成功后清零
+    LOGIN_USERNAME_WINDOW_SECONDS: float = 300
+    TRUSTED_PROXIES: list = []  # 反向代理的IP，只有来自这些地址的请求才使用X-Forwarded-For确定客户端IP
+    
+    # 密码哈希线程池配置
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_INFLIGHT: int = 64  # 超过该在途数量时返回503
+    
+    # 认证用户缓存配置
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 60
+    PRINCIPAL_CACHE_MAX_SIZE: int = 10000
+    
+    # 操作日志分页：estimate模式下最多统计的行数
+    LOG_COUNT_ESTIMATE_CAP: int = 10000
+    
+    # 操作日志导出时每批读取的行数
+    LOG_EXPORT_BATCH_SIZE: int = 1000
+    
+    # 操作日志保留策略（两项都为空时不清理）
+    LOG_RETENTION_DAYS: Optional[int] = None
+    LOG_RETENTION_MAX_ROWS: Optional[int] = None
+    LOG_RETENTION_INTERVAL_SECONDS: float = 3600
+    LOG_RETENTION_CHUNK_SIZE: int = 5000
+    LOG_RETENTION_CHUNK_PAUSE: float = 0.05  # 批次间隔（秒），让出数据库锁
+    LOG_ARCHIVE_ENABLED: bool = True
+    LOG_ARCHIVE_DIR: str = "./log_archive"
+    LOG_ARCHIVE_MAX_SCAN_DAYS: int = 31  # 每次/logs请求最多读取的归档天数
+    
+    # 文档版本存储配置（快照+增量）
+    DOCUMENT_VERSION_SNAPSHOT_INTERVAL: int = 20  # 每隔多少个版本保存一次全文快照
+    DOCUMENT_VERSION_CODEC: str = "zlib"  # zlib / zstd（需安装zstandard）
+    DOCUMENT_VERSION_COMPRESS_LEVEL: int = 6
+    DOCUMENT_VERSION_CACHE_SIZE: int = 64  # 缓存的已还原版本全文数量
+    DOCUMENT_DIFF_CACHE_SIZE: int = 256  # 缓存的版本对比结果数量
+    DOCUMENT_DIFF_OFFLOAD_BYTES: int = 65536  # 超过该大小的还原/对比放到线程池执行
+    
+    # 文档全文检索配置
+    SEARCH_BACKEND: str = "auto"  # auto / fts5 / memory，auto在SQLite支持FTS5时使用FTS5
+    SEARCH_TITLE_WEIGHT: float = 2.0  # 标题匹配相对正文的权重
+    SEARCH_SNIPPET_LENGTH: int = 120  # 结果片段的字符数
+    
+    # 问答向量检索配置
+    VECTOR_INDEX_DIR: str = "./vector_index"
+    VECTOR_EMBEDDER: str = "hashing"
+    VECTOR_DIM: int = 512
+    VECTOR_CHUNK_SIZE: int = 400  # 片段最大字符数
+    VECTOR_CHUNK_OVERLAP: int = 80  # 相邻片段重叠的字符数
+    VECTOR_SEARCH_MODE: str = "exact"  # exact / ivf（需先训练IVF，未训练时按exact检索）
+    VECTOR_IVF_NPROBE: int = 8  # ivf模式下查询的桶数量
+    VECTOR_SEARCH_BATCH_ROWS: int = 65536  # 暴力检索每批计算的行数
+    
+    # AI网关配置
+    AI_PROVIDER: str = "fake"  # 模型服务，可通过ai_gateway.register_provider注册
+    AI_MAX_TOKENS: int = 512  # 请求未指定时的最大生成长度
+    AI_CONTEXT_MAX_CHARS: int = 8000  # prompt中参考内容的最大字符数
+    AI_BATCH_WINDOW_MS: float = 10  # 合并并发请求的等待窗口（毫秒）
+    AI_BATCH_MAX_SIZE: int = 16  # 每次provider调用最多合并的请求数，1表示不合并
+    AI_CACHE_SIZE: int = 1024
+    AI_CACHE_TTL_SECONDS: float = 3600
+    AI_SEMANTIC_CACHE_THRESHOLD: Optional[float] = None  # 语义缓存的相似度阈值（如0.95），为空时只做精确匹配
+    AI_CALL_MAX_CONCURRENT: int = 4  # 每个用户同时进行的ai:call请求数
+    QA_USE_MAX_CONCURRENT: int = 2  # 每个用户同时进行的qa:use请求数
+    AI_FAKE_LATENCY_MS: float = 200  # fake provider每次调用的延迟
+    AI_FAKE_TOKEN_LATENCY_MS: float = 10  # fake provider流式输出每个词的间隔
+    AI_FAKE_MAX_CONCURRENCY: int = 1  # fake provider同时执行的调用数
+    
+    # 操作日志批量写入配置
+    LOG_SINK_QUEUE_SIZE: int = 10000
+    LOG_SINK_BATCH_SIZE: int = 500
+    LOG_SINK_FLUSH_INTERVAL: float = 1.0  # 秒
+    LOG_SINK_OVERFLOW_POLICY: str = "block"  # block / drop_newest / drop_oldest
+    LOG_SINK_BLOCK_TIMEOUT: float = 0.1  # block策略下的最长等待时间（秒，仅事件循环外的调用方等待）
+    
+    # 请求指标配置（GET /metrics，Prometheus文本格式）
+    METRICS_ENABLED: bool = True
+    METRICS_TOKEN: Optional[str] = None  # 设置后抓取时需携带 Authorization: Bearer <token>
+    METRICS_LATENCY_BUCKETS: list = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]  # 请求延迟直方图的桶上界（秒）
+    METRICS_DB_BUCKETS: list = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0]  # 查询延迟直方图的桶上界（秒）
+    
     # CORS配置
     CORS_ORIGINS: list = ["http://localhost:5173", "http://localhost:3000"]
     CORS_CREDENTIALS: bool = True
@@ -1,25 +1,180 @@
-from sqlalchemy import create_engine
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 from config import settings
 
-# 创建数据库引擎
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {},
-    echo=settings.DATABASE_ECHO
+# 同步驱动与异步驱动的对应关系（按DATABASE_URL的scheme选择）
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+SYNC_DRIVERS = {
+    "sqlite": "sqlite",
+    "postgresql": "postgresql+psycopg2",
+}
+
+
+def to_async_url(url: str) -> str:
+    """将DATABASE_URL转换为异步驱动的连接串（aiosqlite/asyncpg）"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend in ASYNC_DRIVERS and parsed.drivername != ASYNC_DRIVERS[backend]:
+        parsed = parsed.set(drivername=ASYNC_DRIVERS[backend])
+    return parsed.render_as_string(hide_password=False)
+
+
+def to_sync_url(url: str) -> str:
+    """将DATABASE_URL转换为同步驱动的连接串（供init_db.py等脚本使用）"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend in SYNC_DRIVERS and parsed.drivername == ASYNC_DRIVERS[backend]:
+        parsed = parsed.set(drivername=SYNC_DRIVERS[backend])
+    return parsed.render_as_string(hide_password=False)
+
+
+def is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def is_sqlite_memory(url: str) -> bool:
+    return is_sqlite(url) and make_url(url).database in (None, "", ":memory:")
+
+
+class PoolWaitTimeMixin:
+    """记录从连接池获取连接的等待时间"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - started
+            self.wait_count += 1
+            self.wait_total += waited
+            if waited > self.wait_max:
+                self.wait_max = waited
+
+
+class TimedQueuePool(PoolWaitTimeMixin, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(PoolWaitTimeMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options(url: str, use_async: bool = False) -> dict:
+    """根据配置生成create_engine参数"""
+    options = {
+        "echo": settings.DATABASE_ECHO,
+        "pool_pre_ping": settings.DATABASE_POOL_PRE_PING,
+    }
+    if is_sqlite(url):
+        options["connect_args"] = {"check_same_thread": False}
+    if is_sqlite_memory(url):
+        # 内存数据库只能使用单连接池，不支持连接池大小配置
+        return options
+    options.update(
+        poolclass=TimedAsyncQueuePool if use_async else TimedQueuePool,
+        pool_size=settings.DATABASE_POOL_SIZE,
+        max_overflow=settings.DATABASE_MAX_OVERFLOW,
+        pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+        pool_recycle=settings.DATABASE_POOL_RECYCLE,
+    )
+    return options
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """SQLite连接建立时设置性能相关的PRAGMA"""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.execute(f"PRAGMA cache_size={int(settings.SQLITE_CACHE_SIZE)}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+        cursor.execute(f"PRAGMA temp_store={settings.SQLITE_TEMP_STORE}")
+    finally:
+        cursor.close()
+
+
+SYNC_DATABASE_URL = to_sync_url(settings.DATABASE_URL)
+ASYNC_DATABASE_URL = to_async_url(settings.DATABASE_URL)
+
+# 同步引擎：建表、初始化脚本和后台线程使用
+engine = create_engine(SYNC_DATABASE_URL, **engine_options(SYNC_DATABASE_URL))
+
+# 异步引擎：所有API路由使用，查询不阻塞事件循环
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, use_async=True)
 )
 
+if is_sqlite(SYNC_DATABASE_URL):
+    event.listen(engine, "connect", set_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
+
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
 
 # 模型基类
 Base = declarative_base()
 
 
-def get_db():
-    """数据库会话依赖注入"""
-    db = SessionLocal()
-    try:
+def create_tables(bind=None):
+    """创建缺失的表和索引（已有表上新增的索引也会补建）"""
+    bind = bind or engine
+    Base.metadata.create_all(bind=bind)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+
+
+async def get_db():
+    """数据库会话依赖注入（异步）"""
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+def pool_stats(pool) -> dict:
+    """连接池统计信息"""
+    stats = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+            timeout=pool.timeout(),
+        )
+    if isinstance(pool, PoolWaitTimeMixin):
+        stats.update(
+            wait_count=pool.wait_count,
+            wait_total_ms=round(pool.wait_total * 1000, 3),
+            wait_avg_ms=round(pool.wait_total * 1000 / pool.wait_count, 3) if pool.wait_count else 0.0,
+            wait_max_ms=round(pool.wait_max * 1000, 3),
+        )
+    return stats
+
+
+def get_pool_stats() -> dict:
+    """同步/异步引擎的连接池统计"""
+    return {
+        "sync": pool_stats(engine.pool),
+        "async": pool_stats(async_engine.pool),
+    }
@@ -29,12 +29,10 @@ async def get_current_user_dependency(
     db = None
 ):
     """获取当前用户（修改后的版本）"""
-    from database import get_db
+    from database import AsyncSessionLocal
     from security import get_current_user as _get_current_user
     
-    db_session = db or next(get_db())
-    try:
+    if db is not None:
+        return await _get_current_user(token=token, db=db)
+    async with AsyncSessionLocal() as db_session:
         return await _get_current_user(token=token, db=db_session)
-    finally:
-        if db is None:
-            db_session.close()
@@ -63,3 +63,30 @@ ROLE_PERMISSIONS = {
         PermissionEnum.QA_USE,
     ]
 }
+
+
+# ===== 预编译的权限表（导入时构建一次，请求期间只读） =====
+# 通配权限：拥有其中任一权限即视为拥有全部权限
+WILDCARD_PERMISSIONS = frozenset({PermissionEnum.ADMIN_FULL.value, "permission:btn:*"})
+
+# 权限字符串 -> 位
+PERMISSION_BITS = {permission.value: 1 << i for i, permission in enumerate(PermissionEnum)}
+ALL_PERMISSIONS_MASK = (1 << len(PERMISSION_BITS)) - 1
+
+
+def permission_mask(permissions) -> int:
+    """把权限集合编译为位掩码，含通配权限时返回全部位；不在PermissionEnum中的权限不占位"""
+    mask = 0
+    for permission in permissions:
+        permission = getattr(permission, "value", permission)
+        if permission in WILDCARD_PERMISSIONS:
+            return ALL_PERMISSIONS_MASK
+        mask |= PERMISSION_BITS.get(permission, 0)
+    return mask
+
+
+# 角色名 -> 权限字符串集合
+ROLE_PERMISSION_SETS = {
+    role.value: frozenset(permission.value for permission in permissions)
+    for role, permissions in ROLE_PERMISSIONS.items()
+}
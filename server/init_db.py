@@ -1,21 +1,33 @@
 """
-初始化脚本 - 创建默认用户
+初始化脚本 - 创建默认用户，并可批量生成测试数据
 运行方式: python init_db.py
+生成数据: python init_db.py --users 10000 --logs 10000000 --documents 1000 --versions 5
 """
 
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import select, insert, func
 from sqlalchemy.orm import Session
-from database import SessionLocal, engine, Base
-from models import User
+from database import SessionLocal, engine, create_tables
+from models import User, Role, UserRole, Document, DocumentVersion, OperationLog
 from security import hash_password
-import json
-from enums import ROLE_PERMISSIONS, RoleEnum
+from enums import RoleEnum
+from role_store import migrate_json_roles, sync_role_permissions
+from log_stats import record_rollups
+from version_store import encode_version
 
 # 创建所有表
-Base.metadata.create_all(bind=engine)
+create_tables()
 
 
 def init_db():
     """初始化数据库并创建默认用户"""
+    # 内置角色及其权限
+    migrate_json_roles(engine)
+    sync_role_permissions(engine)
     db = SessionLocal()
     
     try:
@@ -54,19 +66,14 @@ def init_db():
         ]
         
         for user_data in users_data:
-            roles = [role.value for role in user_data["roles"]]
-            permissions = []
-            for role in roles:
-                if role in ROLE_PERMISSIONS:
-                    permissions.extend([p.value for p in ROLE_PERMISSIONS[role]])
+            roles = db.scalars(select(Role).where(Role.name.in_([role.value for role in user_data["roles"]]))).all()
             
             user = User(
                 username=user_data["username"],
                 password=hash_password(user_data["password"]),
                 email=user_data["email"],
                 nickname=user_data["nickname"],
-                roles=json.dumps(roles),
-                permissions=json.dumps(list(set(permissions))),
+                roles=list(roles),
                 avatar=user_data["avatar"],
                 is_active=True
             )
@@ -88,8 +95,251 @@ def init_db():
         db.close()
 
 
+# ===== 测试数据生成 =====
+# 生成的用户角色分布
+GENERATED_ROLE_WEIGHTS = {RoleEnum.VIEWER.value: 0.80, RoleEnum.EDITOR.value: 0.18, RoleEnum.ADMIN.value: 0.02}
+
+# 操作日志的 (action, resource_type, 权重)，与各路由写入的日志一致
+GENERATED_LOG_EVENTS = (
+    ("LOGIN", "auth", 40),
+    ("LOGOUT", "auth", 20),
+    ("LOGIN_FAILED", "auth", 4),
+    ("CREATE", "document", 8),
+    ("UPDATE", "document", 18),
+    ("DELETE", "document", 2),
+    ("ROLLBACK", "document", 1),
+    ("CREATE", "user", 1),
+    ("UPDATE", "user", 3),
+    ("DELETE", "user", 0.5),
+    ("EXPORT", "log", 0.5),
+)
+
+# 按小时的活跃度（工作时间集中）
+HOURLY_ACTIVITY = np.array([1, 1, 1, 1, 1, 2, 4, 8, 14, 16, 16, 14, 10, 14, 16, 16, 14, 10, 6, 5, 4, 3, 2, 1], dtype=float)
+
+GENERATED_WORDS = (
+    "知识库 文档 检索 版本 权限 用户 部署 配置 数据库 缓存 日志 接口 索引 问答 模型 性能 "
+    "api token cache index query latency release deploy config service search version"
+).split()
+
+
+def _user_weights(count: int, rng) -> np.ndarray:
+    """用户活跃度呈长尾分布：少数用户产生大部分日志"""
+    weights = 1.0 / np.arange(1, count + 1) ** 0.8
+    rng.shuffle(weights)
+    return weights / weights.sum()
+
+
+def _log_times(count: int, start: datetime, end: datetime, rng) -> list:
+    """在 [start, end) 内按工作时间分布生成升序的时间
+
+    按自然日和小时权重抽样，落在区间外的重新抽样；区间很短、多次抽样仍落在区间外的均匀分布
+    """
+    span = (end - start).total_seconds()
+    day_start = datetime.combine(start.date(), datetime.min.time())
+    offset = (start - day_start).total_seconds()
+    day_count = int(np.ceil((offset + span) / 86400))
+    hour_probabilities = HOURLY_ACTIVITY / HOURLY_ACTIVITY.sum()
+    seconds = np.empty(count)
+    pending = np.arange(count)
+    for _ in range(8):
+        size = len(pending)
+        values = (
+            rng.integers(0, day_count, size) * 86400
+            + rng.choice(24, size, p=hour_probabilities) * 3600
+            + rng.random(size) * 3600
+            - offset
+        )
+        inside = (values >= 0) & (values < span)
+        seconds[pending[inside]] = values[inside]
+        pending = pending[~inside]
+        if not len(pending):
+            break
+    seconds[pending] = rng.random(len(pending)) * span
+    # 换算为微秒精度的timedelta时不能进位到end
+    seconds = np.minimum(seconds, span - 1e-6)
+    seconds.sort()
+    return [start + timedelta(seconds=value) for value in seconds.tolist()]
+
+
+def generate_users(count: int, password: str = "password123", batch_size: int = 10000, seed: int = 0) -> int:
+    """批量创建用户（所有用户共用一次计算的密码哈希），用户名为 user<id>"""
+    if count <= 0:
+        return 0
+    rng = np.random.default_rng(seed)
+    hashed = hash_password(password)
+    with engine.begin() as conn:
+        role_ids = dict(conn.execute(select(Role.name, Role.id)).all())
+        first_id = (conn.execute(select(func.max(User.id))).scalar() or 0) + 1
+    names = list(GENERATED_ROLE_WEIGHTS)
+    probabilities = np.array([GENERATED_ROLE_WEIGHTS[name] for name in names])
+    now = datetime.utcnow()
+    for begin in range(0, count, batch_size):
+        ids = range(first_id + begin, first_id + min(begin + batch_size, count))
+        roles = rng.choice(len(names), len(ids), p=probabilities).tolist()
+        with engine.begin() as conn:
+            conn.execute(insert(User), [
+                {
+                    "id": user_id,
+                    "username": f"user{user_id}",
+                    "password": hashed,
+                    "email": f"user{user_id}@example.com",
+                    "nickname": f"User {user_id}",
+                    "is_active": True,
+                    "created_at": now,
+                    "updated_at": now,
+                }
+                for user_id in ids
+            ])
+            conn.execute(insert(UserRole), [
+                {"user_id": user_id, "role_id": role_ids[names[role]]}
+                for user_id, role in zip(ids, roles)
+            ])
+    return count
+
+
+def generate_logs(count: int, days: int = 90, batch_size: int = 50000, seed: int = 0) -> int:
+    """批量生成操作日志（时间升序，写入同时累加预聚合统计）"""
+    if count <= 0:
+        return 0
+    rng = np.random.default_rng(seed)
+    with engine.connect() as conn:
+        user_ids = np.array(conn.execute(select(User.id)).scalars().all())
+    if len(user_ids) == 0:
+        raise ValueError("No users to attribute logs to")
+    user_probabilities = _user_weights(len(user_ids), rng)
+    event_probabilities = np.array([weight for _, _, weight in GENERATED_LOG_EVENTS], dtype=float)
+    event_probabilities /= event_probabilities.sum()
+
+    # 按批次把时间范围切成连续的段，整体保持时间与id同序
+    start = datetime.utcnow() - timedelta(days=days)
+    batches = (count + batch_size - 1) // batch_size
+    batch_days = days / batches
+    written = 0
+    for batch in range(batches):
+        size = min(batch_size, count - written)
+        # 每批的时间限定在 [batch_start, 下一批的batch_start) 内，批次之间不重叠
+        batch_start = start + timedelta(days=batch * batch_days)
+        batch_end = start + timedelta(days=(batch + 1) * batch_days)
+        times = _log_times(size, batch_start, batch_end, rng)
+        users = rng.choice(user_ids, size, p=user_probabilities).tolist()
+        events = rng.choice(len(GENERATED_LOG_EVENTS), size, p=event_probabilities).tolist()
+        resource_ids = rng.integers(1, 10000, size).tolist()
+        rows = []
+        for created_at, user_id, event, resource_id in zip(times, users, events, resource_ids):
+            action, resource_type, _ = GENERATED_LOG_EVENTS[event]
+            rows.append({
+                "user_id": user_id,
+                "action": action,
+                "resource_type": resource_type,
+                "resource_id": user_id if resource_type == "auth" else resource_id,
+                "description": f"{action} {resource_type}",
+                "created_at": created_at,
+                "ip_address": f"10.{user_id >> 16 & 255}.{user_id >> 8 & 255}.{user_id & 255}",
+            })
+        with engine.begin() as conn:
+            conn.execute(insert(OperationLog), rows)
+            record_rollups(conn, rows)
+        written += size
+        print(f"  logs {written}/{count}", end="\r", flush=True)
+    print()
+    return written
+
+
+def _generated_text(rng, paragraphs: int) -> str:
+    return "\n\n".join(
+        " ".join(rng.choice(GENERATED_WORDS, int(rng.integers(20, 60))).tolist()) + "。"
+        for _ in range(paragraphs)
+    )
+
+
+def generate_documents(count: int, max_versions: int = 5, batch_size: int = 500, seed: int = 0) -> int:
+    """批量生成文档及其版本历史（每个版本在上一版本基础上修改一个段落）"""
+    if count <= 0:
+        return 0
+    rng = np.random.default_rng(seed)
+    with engine.connect() as conn:
+        author_ids = conn.execute(
+            select(UserRole.user_id).join(Role, Role.id == UserRole.role_id)
+            .where(Role.name.in_([RoleEnum.ADMIN.value, RoleEnum.EDITOR.value]))
+        ).scalars().all()
+        first_id = (conn.execute(select(func.max(Document.id))).scalar() or 0) + 1
+    if not author_ids:
+        raise ValueError("No admin/editor users to author documents")
+    now = datetime.utcnow()
+    for begin in range(0, count, batch_size):
+        documents, versions = [], []
+        for document_id in range(first_id + begin, first_id + min(begin + batch_size, count)):
+            author_id = int(rng.choice(author_ids))
+            created_at = now - timedelta(days=float(rng.random() * 365))
+            paragraphs = _generated_text(rng, int(rng.integers(3, 12))).split("\n\n")
+            previous = None
+            version_count = int(rng.integers(1, max_versions + 1))
+            for version_number in range(1, version_count + 1):
+                if version_number > 1:
+                    paragraphs[int(rng.integers(len(paragraphs)))] = _generated_text(rng, 1)
+                content = "\n\n".join(paragraphs)
+                versions.append({
+                    "document_id": document_id,
+                    "version_number": version_number,
+                    "created_at": created_at + timedelta(hours=version_number - 1),
+                    "created_by": author_id,
+                    **encode_version(version_number, content, previous),
+                })
+                previous = content
+            documents.append({
+                "id": document_id,
+                "title": f"{rng.choice(GENERATED_WORDS)} {rng.choice(GENERATED_WORDS)} #{document_id}",
+                "content": previous,
+                "author_id": author_id,
+                "is_published": bool(rng.random() < 0.7),
+                "created_at": created_at,
+                "updated_at": created_at + timedelta(hours=version_count - 1),
+            })
+        with engine.begin() as conn:
+            conn.execute(insert(Document), documents)
+            conn.execute(insert(DocumentVersion), versions)
+    return count
+
+
+def generate_dataset(users: int, logs: int, documents: int, versions: int = 5, days: int = 90,
+                     batch_size: int = 50000, password: str = "password123", seed: int = 0):
+    """生成测试数据：用户 -> 文档 -> 操作日志"""
+    started = time.perf_counter()
+    print(f"✓ Created {generate_users(users, password, min(batch_size, 10000), seed)} users "
+          f"({time.perf_counter() - started:.1f}s)")
+    if documents:
+        step = time.perf_counter()
+        generate_documents(documents, versions, seed=seed)
+        # 全文检索索引只在为空时自动构建，这里重建；问答向量索引在服务启动时自动补齐
+        from search_index import init_search_index
+        init_search_index(rebuild=True)
+        print(f"✓ Created {documents} documents ({time.perf_counter() - step:.1f}s)")
+    if logs:
+        step = time.perf_counter()
+        generate_logs(logs, days, batch_size, seed)
+        print(f"✓ Created {logs} operation logs ({time.perf_counter() - step:.1f}s)")
+    print(f"✓ Dataset generated in {time.perf_counter() - started:.1f}s")
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Initialize the database and optionally generate a synthetic dataset")
+    parser.add_argument("--users", type=int, default=0, help="number of users to generate")
+    parser.add_argument("--logs", type=int, default=0, help="number of operation logs to generate")
+    parser.add_argument("--documents", type=int, default=0, help="number of documents to generate")
+    parser.add_argument("--versions", type=int, default=5, help="maximum versions per generated document")
+    parser.add_argument("--days", type=int, default=90, help="time span of generated logs")
+    parser.add_argument("--batch-size", type=int, default=50000, help="rows per insert batch")
+    parser.add_argument("--password", default="password123", help="password of generated users")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
     print("=" * 50)
     print("WisdomBase API - Database Initialization")
     print("=" * 50)
     init_db()
+    if args.users or args.logs or args.documents:
+        generate_dataset(
+            args.users, args.logs, args.documents, args.versions, args.days,
+            args.batch_size, args.password, args.seed
+        )
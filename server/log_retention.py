@@ -0,0 +1,331 @@
+import gzip
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, date
+from typing import Callable, Optional
+
+from sqlalchemy import select, delete, tuple_
+
+from config import settings
+from database import SessionLocal
+from models import OperationLog
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FIELDS = (
+    "id", "user_id", "action", "resource_type", "resource_id",
+    "description", "created_at", "ip_address",
+)
+
+
+def archive_path(archive_dir: str, day: date) -> str:
+    """归档文件路径：<dir>/YYYY/MM/operation_logs-YYYY-MM-DD.jsonl.gz"""
+    return os.path.join(
+        archive_dir, f"{day:%Y}", f"{day:%m}", f"operation_logs-{day:%Y-%m-%d}.jsonl.gz"
+    )
+
+
+def list_archive_days(archive_dir: str) -> list:
+    """列出已有归档的日期（升序）"""
+    days = []
+    if not os.path.isdir(archive_dir):
+        return days
+    for root, _, files in os.walk(archive_dir):
+        for name in files:
+            if name.startswith("operation_logs-") and name.endswith(".jsonl.gz"):
+                try:
+                    days.append(date.fromisoformat(name[len("operation_logs-"):-len(".jsonl.gz")]))
+                except ValueError:
+                    continue
+    return sorted(days)
+
+
+def write_archive(archive_dir: str, rows: list):
+    """按天追加写入归档文件（gzip多成员追加，可直接连续读取）"""
+    by_day = {}
+    for row in rows:
+        by_day.setdefault(row["created_at"].date(), []).append(row)
+    for day, day_rows in by_day.items():
+        path = archive_path(archive_dir, day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with gzip.open(path, "at", encoding="utf-8") as f:
+            for row in day_rows:
+                record = dict(row, created_at=row["created_at"].isoformat())
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def read_archive_day(
+    archive_dir: str,
+    day: date,
+    keep: Optional[Callable[[dict], bool]] = None,
+    limit: Optional[int] = None
+) -> list:
+    """逐行流式读取某一天的归档日志，按id去重，按 (created_at, id) 倒序返回
+
+    keep为过滤函数，在读取时过滤；limit不为None时用最小堆只保留最新的limit条，
+    内存占用与当天归档文件的大小无关
+    """
+    path = archive_path(archive_dir, day)
+    if limit == 0 or not os.path.exists(path):
+        return []
+    rows = {}
+    heap = []
+    in_heap = set()
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            record["created_at"] = datetime.fromisoformat(record["created_at"])
+            if keep is not None and not keep(record):
+                continue
+            if limit is None:
+                rows[record["id"]] = record
+                continue
+            if record["id"] in in_heap:
+                continue
+            key = (record["created_at"], record["id"])
+            if len(heap) < limit:
+                heapq.heappush(heap, (key, record))
+                in_heap.add(record["id"])
+            elif key > heap[0][0]:
+                _, evicted = heapq.heapreplace(heap, (key, record))
+                in_heap.discard(evicted["id"])
+                in_heap.add(record["id"])
+    records = list(rows.values()) if limit is None else [record for _, record in heap]
+    records.sort(key=lambda r: (r["created_at"], r["id"]), reverse=True)
+    return records
+
+
+def read_archived_logs(
+    limit: int,
+    before: Optional[tuple] = None,
+    archive_dir: Optional[str] = None,
+    max_days: Optional[int] = None,
+    user_id: Optional[int] = None,
+    action: Optional[str] = None,
+    resource_type: Optional[str] = None,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+) -> tuple:
+    """按 (created_at, id) 倒序读取最多limit条归档日志，过滤条件与 /logs 接口一致
+
+    一次最多读取max_days个归档日文件（默认LOG_ARCHIVE_MAX_SCAN_DAYS），
+    读满仍不足limit条且还有更早的归档时，返回续读位置（已读最早一天的零点）
+
+    Args:
+        before: 游标位置 (created_at, id)，只返回比它更早的记录
+
+    Returns:
+        (rows, resume_before)，没有更多需要读取的归档时resume_before为None
+    """
+    archive_dir = archive_dir or settings.LOG_ARCHIVE_DIR
+    max_days = settings.LOG_ARCHIVE_MAX_SCAN_DAYS if max_days is None else max_days
+
+    def keep(row: dict) -> bool:
+        if before and (row["created_at"], row["id"]) >= before:
+            return False
+        if user_id and row["user_id"] != user_id:
+            return False
+        if action and row["action"] != action:
+            return False
+        if resource_type and row["resource_type"] != resource_type:
+            return False
+        if start_time and row["created_at"] < start_time:
+            return False
+        if end_time and row["created_at"] >= end_time:
+            return False
+        return True
+
+    rows = []
+    scanned = 0
+    resume_before = None
+    for day in reversed(list_archive_days(archive_dir)):
+        day_start = datetime.combine(day, datetime.min.time())
+        # 当天的记录都不早于游标位置（包括续读位置为当天零点时）
+        if before and (day_start, 0) >= before:
+            continue
+        if end_time and day > end_time.date():
+            continue
+        if start_time and day < start_time.date():
+            break
+        if scanned >= max_days:
+            return rows, resume_before
+        rows.extend(read_archive_day(archive_dir, day, keep, limit - len(rows)))
+        scanned += 1
+        resume_before = (day_start, 0)
+        if len(rows) >= limit:
+            break
+    return rows, None
+
+
+class LogRetentionJob:
+    """操作日志保留策略后台任务
+
+    按保留天数和/或最大行数确定清理边界，从最旧的记录开始分批：
+    先追加写入按天分区的压缩归档文件，再按主键删除，每批单独提交，
+    避免长时间持有数据库锁。
+    """
+
+    def __init__(
+        self,
+        retention_days: Optional[int] = None,
+        max_rows: Optional[int] = None,
+        interval: float = 3600,
+        chunk_size: int = 5000,
+        chunk_pause: float = 0.05,
+        archive_enabled: bool = True,
+        archive_dir: str = "./log_archive"
+    ):
+        self.retention_days = retention_days
+        self.max_rows = max_rows
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.chunk_pause = chunk_pause
+        self.archive_enabled = archive_enabled
+        self.archive_dir = archive_dir
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._run_lock = threading.Lock()
+
+        # 统计指标
+        self.runs = 0
+        self.archived = 0
+        self.deleted = 0
+        self.last_run_at: Optional[datetime] = None
+        self.last_run_ms = 0.0
+        self.last_error: Optional[str] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.retention_days) or bool(self.max_rows)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """启动后台清理线程（未配置保留策略时不启动）"""
+        if not self.enabled or self.running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="operation-log-retention", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """停止后台线程（当前批次完成后退出）"""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as exc:
+                self.last_error = str(exc)
+                logger.exception("Operation log retention run failed")
+
+    def _boundary(self, db) -> Optional[tuple]:
+        """计算清理边界 (created_at, id)，该位置及更早的记录将被清理"""
+        boundary = None
+        if self.retention_days:
+            cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+            # 早于cutoff的最新一条记录
+            row = db.execute(
+                select(OperationLog.created_at, OperationLog.id)
+                .where(OperationLog.created_at < cutoff)
+                .order_by(OperationLog.created_at.desc(), OperationLog.id.desc())
+                .limit(1)
+            ).first()
+            if row:
+                boundary = tuple(row)
+        if self.max_rows:
+            row = db.execute(
+                select(OperationLog.created_at, OperationLog.id)
+                .order_by(OperationLog.created_at.desc(), OperationLog.id.desc())
+                .offset(self.max_rows)
+                .limit(1)
+            ).first()
+            if row and (boundary is None or tuple(row) > boundary):
+                boundary = tuple(row)
+        return boundary
+
+    def run_once(self) -> dict:
+        """执行一次清理，返回本次归档/删除的行数"""
+        with self._run_lock:
+            started = time.perf_counter()
+            archived = deleted = 0
+            db = SessionLocal()
+            try:
+                boundary = self._boundary(db)
+                db.rollback()
+                while boundary and not self._stop_event.is_set():
+                    rows = db.execute(
+                        select(*(getattr(OperationLog, f) for f in ARCHIVE_FIELDS))
+                        .where(tuple_(OperationLog.created_at, OperationLog.id) <= tuple_(*boundary))
+                        .order_by(OperationLog.created_at, OperationLog.id)
+                        .limit(self.chunk_size)
+                    ).mappings().all()
+                    if not rows:
+                        break
+                    rows = [dict(row) for row in rows]
+                    if self.archive_enabled:
+                        write_archive(self.archive_dir, rows)
+                        archived += len(rows)
+                    db.execute(
+                        delete(OperationLog).where(OperationLog.id.in_([r["id"] for r in rows]))
+                    )
+                    db.commit()
+                    deleted += len(rows)
+                    if len(rows) < self.chunk_size:
+                        break
+                    # 批次之间让出数据库锁
+                    time.sleep(self.chunk_pause)
+            finally:
+                db.close()
+
+            self.runs += 1
+            self.archived += archived
+            self.deleted += deleted
+            self.last_run_at = datetime.utcnow()
+            self.last_run_ms = (time.perf_counter() - started) * 1000
+            self.last_error = None
+            return {"archived": archived, "deleted": deleted}
+
+    def stats(self) -> dict:
+        """任务统计信息"""
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            "retention_days": self.retention_days,
+            "max_rows": self.max_rows,
+            "archive_enabled": self.archive_enabled,
+            "archive_dir": self.archive_dir,
+            "runs": self.runs,
+            "archived": self.archived,
+            "deleted": self.deleted,
+            "last_run_at": self.last_run_at,
+            "last_run_ms": round(self.last_run_ms, 3),
+            "last_error": self.last_error,
+        }
+
+
+log_retention = LogRetentionJob(
+    retention_days=settings.LOG_RETENTION_DAYS,
+    max_rows=settings.LOG_RETENTION_MAX_ROWS,
+    interval=settings.LOG_RETENTION_INTERVAL_SECONDS,
+    chunk_size=settings.LOG_RETENTION_CHUNK_SIZE,
+    chunk_pause=settings.LOG_RETENTION_CHUNK_PAUSE,
+    archive_enabled=settings.LOG_ARCHIVE_ENABLED,
+    archive_dir=settings.LOG_ARCHIVE_DIR
+)
+
@@ -0,0 +1,260 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import insert, inspect
+
+from config import settings
+from database import engine
+from models import OperationLog
+from log_stats import record_rollups
+
+logger = logging.getLogger(__name__)
+
+def migrate_nullable_log_user(engine) -> bool:
+    """把operation_logs.user_id改为可空（记录未知用户名的登录失败），已可空时直接返回False
+
+    SQLite不支持修改列约束，重建表：先删除旧索引（索引名在库内全局唯一），
+    改名后按当前模型建表和索引并复制数据
+    """
+    table = OperationLog.__tablename__
+    inspector = inspect(engine)
+    if not inspector.has_table(table):
+        return False
+    column = next(c for c in inspector.get_columns(table) if c["name"] == "user_id")
+    if column["nullable"]:
+        return False
+    with engine.begin() as conn:
+        if engine.dialect.name != "sqlite":
+            conn.exec_driver_sql(f"ALTER TABLE {table} ALTER COLUMN user_id DROP NOT NULL")
+            return True
+        for index in inspector.get_indexes(table):
+            conn.exec_driver_sql(f'DROP INDEX "{index["name"]}"')
+        conn.exec_driver_sql(f"ALTER TABLE {table} RENAME TO {table}_old")
+        OperationLog.__table__.create(conn)
+        columns = ", ".join(c.name for c in OperationLog.__table__.columns)
+        conn.exec_driver_sql(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {table}_old")
+        conn.exec_driver_sql(f"DROP TABLE {table}_old")
+    return True
+
+
+# 队列满时的处理策略
+OVERFLOW_BLOCK = "block"              # 等待队列空位，超时后丢弃（事件循环中不等待，直接丢弃）
+OVERFLOW_DROP_NEWEST = "drop_newest"  # 丢弃新日志
+OVERFLOW_DROP_OLDEST = "drop_oldest"  # 丢弃队列中最旧的日志
+
+
+class OperationLogSink:
+    """操作日志后台写入器
+
+    请求处理中只把日志放入有界队列，由后台线程按批量大小或时间间隔
+    合并成一次executemany插入，避免每条日志单独提交事务。
+    """
+
+    def __init__(
+        self,
+        max_queue_size: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        overflow_policy: str = OVERFLOW_BLOCK,
+        block_timeout: float = 0.1
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._write_lock = threading.Lock()
+
+        # 统计指标
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """启动后台写入线程"""
+        if self.running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="operation-log-sink", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """停止后台线程并写入队列中剩余的日志"""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout)
+        self._thread = None
+        self.flush()
+
+    def submit(self, row: dict) -> bool:
+        """提交一条日志，返回是否成功入队（False表示已丢弃并计入dropped）
+
+        在事件循环中调用时从不等待：队列已满时block策略也按drop_newest处理，
+        只有不在事件循环中的调用方（脚本、其他线程）才会最多等待block_timeout秒。
+        后台线程未启动时，脚本中直接同步写入；事件循环中仍放入有界队列，
+        在start()后由后台线程写入（或由flush()/stop()写入）。
+        """
+        try:
+            asyncio.get_running_loop()
+            in_loop = True
+        except RuntimeError:
+            in_loop = False
+
+        if not self.running and not in_loop:
+            # 未启动后台线程（如脚本中使用）时直接写入
+            self.enqueued += 1
+            return self._write([row])
+
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            if self.overflow_policy == OVERFLOW_BLOCK and not in_loop:
+                return self._put_blocking(row)
+            if self.overflow_policy != OVERFLOW_DROP_OLDEST:
+                self.dropped += 1
+                return False
+            try:
+                self._queue.get_nowait()
+                self.dropped += 1
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(row)
+            except queue.Full:
+                self.dropped += 1
+                return False
+        self.enqueued += 1
+        return True
+
+    def _put_blocking(self, row: dict) -> bool:
+        """block策略：最多等待block_timeout秒，超时后丢弃"""
+        try:
+            self._queue.put(row, timeout=self.block_timeout)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        return True
+
+    def flush(self):
+        """同步写入当前队列中的全部日志"""
+        while True:
+            batch = self._drain(self.batch_size)
+            if not batch:
+                return
+            self._write(batch)
+
+    def _drain(self, max_items: int) -> list:
+        batch = []
+        while len(batch) < max_items:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and not self._stop_event.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+                batch.extend(self._drain(self.batch_size - len(batch)))
+            self._write(batch)
+
+    def _write(self, batch: list) -> bool:
+        """批量插入日志（executemany），并在同一事务中累加预聚合统计，返回是否写入成功"""
+        started = time.perf_counter()
+        with self._write_lock:
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(OperationLog), batch)
+                    record_rollups(conn, batch)
+                self.written += len(batch)
+                return True
+            except Exception:
+                self.failed += len(batch)
+                logger.exception("Failed to write %d operation logs", len(batch))
+                return False
+            finally:
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                self.flushes += 1
+                self.last_flush_ms = elapsed_ms
+                self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+                self._total_flush_ms += elapsed_ms
+
+    def stats(self) -> dict:
+        """写入器统计信息"""
+        return {
+            "running": self.running,
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "overflow_policy": self.overflow_policy,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "flushes": self.flushes,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "max_flush_ms": round(self.max_flush_ms, 3),
+            "avg_flush_ms": round(self._total_flush_ms / self.flushes, 3) if self.flushes else 0.0,
+        }
+
+
+log_sink = OperationLogSink(
+    max_queue_size=settings.LOG_SINK_QUEUE_SIZE,
+    batch_size=settings.LOG_SINK_BATCH_SIZE,
+    flush_interval=settings.LOG_SINK_FLUSH_INTERVAL,
+    overflow_policy=settings.LOG_SINK_OVERFLOW_POLICY,
+    block_timeout=settings.LOG_SINK_BLOCK_TIMEOUT
+)
+
+
+def log_operation(
+    user_id: Optional[int],
+    action: str,
+    resource_type: str = "auth",
+    resource_id: Optional[int] = None,
+    description: Optional[str] = None,
+    ip_address: Optional[str] = None
+) -> bool:
+    """记录操作日志（异步批量写入）"""
+    return log_sink.submit({
+        "user_id": user_id,
+        "action": action,
+        "resource_type": resource_type,
+        "resource_id": resource_id,
+        "description": description,
+        "ip_address": ip_address,
+        "created_at": datetime.utcnow(),
+    })
@@ -0,0 +1,194 @@
+"""
+操作日志预聚合统计
+
+日志写入路径（log_sink）在插入日志的同一事务中，按 minute/hour/day 三种粒度
+累加 (bucket_start, user_id, action, resource_type) 计数，删除日志时在同一事务中
+扣减。/logs/stats 只读取汇总表，查询代价与 operation_logs 的行数无关。
+启动时汇总表为空而operation_logs有数据（如升级前的历史日志）会自动回填。
+
+回填历史数据: python log_stats.py --rebuild
+"""
+
+import argparse
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select, update, insert, delete, func, bindparam
+
+from database import engine
+from models import OperationLog, OperationLogRollup
+
+GRANULARITIES = ("minute", "hour", "day")
+# 没有用户的日志（未知用户名登录失败）在汇总表中记为user_id=0
+ANONYMOUS_USER_ID = 0
+ROLLUP_KEYS = ("granularity", "bucket_start", "user_id", "action", "resource_type")
+GROUP_COLUMNS = {
+    "action": OperationLogRollup.action,
+    "resource_type": OperationLogRollup.resource_type,
+    "user": OperationLogRollup.user_id,
+    "time": OperationLogRollup.bucket_start,
+}
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    """将时间截断到统计桶的起点"""
+    if granularity == "minute":
+        return moment.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def aggregate_rollups(rows: list, sign: int = 1) -> list:
+    """把一批日志聚合成汇总表的增量行，sign为-1时生成扣减量"""
+    counter = Counter()
+    for row in rows:
+        for granularity in GRANULARITIES:
+            counter[(
+                granularity,
+                bucket_start(row["created_at"], granularity),
+                ANONYMOUS_USER_ID if row["user_id"] is None else row["user_id"],
+                row["action"],
+                row["resource_type"],
+            )] += sign
+    return [dict(zip(ROLLUP_KEYS, key), count=count) for key, count in counter.items()]
+
+
+def _upsert_statement(dialect_name: str):
+    """SQLite/PostgreSQL使用 INSERT ... ON CONFLICT DO UPDATE 累加计数"""
+    if dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return None
+    stmt = dialect_insert(OperationLogRollup)
+    return stmt.on_conflict_do_update(
+        index_elements=list(ROLLUP_KEYS),
+        set_={"count": OperationLogRollup.count + stmt.excluded["count"]},
+    )
+
+
+def upsert_rollups(conn, deltas: list):
+    """在给定连接（事务）中累加汇总计数"""
+    if not deltas:
+        return
+    stmt = _upsert_statement(conn.dialect.name)
+    if stmt is not None:
+        conn.execute(stmt, deltas)
+        return
+    # 其他数据库：先UPDATE，未命中再INSERT
+    for delta in deltas:
+        result = conn.execute(
+            update(OperationLogRollup)
+            .where(*(getattr(OperationLogRollup, k) == delta[k] for k in ROLLUP_KEYS))
+            .values(count=OperationLogRollup.count + delta["count"])
+        )
+        if result.rowcount == 0:
+            conn.execute(insert(OperationLogRollup), [delta])
+
+
+def record_rollups(conn, rows: list):
+    """日志写入路径调用：聚合并写入汇总表"""
+    upsert_rollups(conn, aggregate_rollups(rows))
+
+
+def remove_rollups(conn, rows: list):
+    """删除日志时调用：扣减汇总计数，并清理计数归零的汇总行"""
+    deltas = aggregate_rollups(rows, sign=-1)
+    if not deltas:
+        return
+    upsert_rollups(conn, deltas)
+    conn.execute(
+        delete(OperationLogRollup).where(
+            *(getattr(OperationLogRollup, k) == bindparam(k) for k in ROLLUP_KEYS),
+            OperationLogRollup.count <= 0
+        ),
+        [{k: delta[k] for k in ROLLUP_KEYS} for delta in deltas]
+    )
+
+
+def remove_user_rollups(conn, user_id: int):
+    """删除用户的全部日志时调用：汇总行按user_id区分，直接删除该用户的汇总行"""
+    conn.execute(delete(OperationLogRollup).where(OperationLogRollup.user_id == user_id))
+
+
+def rebuild_rollups(batch_size: int = 50000) -> int:
+    """根据operation_logs全量重建汇总表，返回处理的日志行数"""
+    processed = 0
+    with engine.begin() as conn:
+        conn.execute(delete(OperationLogRollup))
+        result = conn.execution_options(yield_per=batch_size).execute(
+            select(
+                OperationLog.created_at,
+                OperationLog.user_id,
+                OperationLog.action,
+                OperationLog.resource_type,
+            )
+        )
+        for rows in result.mappings().partitions():
+            record_rollups(conn, rows)
+            processed += len(rows)
+    return processed
+
+
+def init_rollups() -> int:
+    """启动时汇总表为空但已有日志时回填，返回处理的日志行数"""
+    with engine.connect() as conn:
+        has_rollups = conn.execute(select(OperationLogRollup.granularity).limit(1)).first() is not None
+        has_logs = conn.execute(select(OperationLog.id).limit(1)).first() is not None
+    if has_rollups or not has_logs:
+        return 0
+    return rebuild_rollups()
+
+
+async def query_stats(
+    db,
+    group_by: list,
+    granularity: str = "day",
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    user_id: Optional[int] = None,
+    action: Optional[str] = None,
+    resource_type: Optional[str] = None,
+    limit: int = 1000
+) -> list:
+    """从汇总表按维度分组统计
+
+    时间范围按桶起点过滤（左闭右开），因此边界精度取决于granularity
+    """
+    columns = [GROUP_COLUMNS[dim].label(dim) for dim in group_by]
+    query = select(*columns, func.sum(OperationLogRollup.count).label("count")).where(
+        OperationLogRollup.granularity == granularity
+    )
+    if start_time:
+        query = query.where(OperationLogRollup.bucket_start >= bucket_start(start_time, granularity))
+    if end_time:
+        query = query.where(OperationLogRollup.bucket_start < end_time)
+    if user_id:
+        query = query.where(OperationLogRollup.user_id == user_id)
+    if action:
+        query = query.where(OperationLogRollup.action == action)
+    if resource_type:
+        query = query.where(OperationLogRollup.resource_type == resource_type)
+    if columns:
+        query = query.group_by(*columns)
+    if "time" in group_by:
+        query = query.order_by(OperationLogRollup.bucket_start)
+    else:
+        query = query.order_by(func.sum(OperationLogRollup.count).desc())
+    result = await db.execute(query.limit(limit))
+    return [dict(row) for row in result.mappings().all()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Operation log rollup maintenance")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild rollups from operation_logs")
+    args = parser.parse_args()
+    if args.rebuild:
+        from database import create_tables
+        create_tables()
+        print(f"✓ Rebuilt rollups from {rebuild_rollups()} operation logs")
+    else:
+        parser.print_help()
@@ -1,15 +1,61 @@
-from fastapi import FastAPI, Request, status
-from fastapi.responses import JSONResponse
+import hmac
+
+from fastapi import FastAPI, Request, HTTPException, status
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from datetime import datetime
 import logging
 
 from config import settings
-from database import engine, Base
-from routes import auth, users, logs, routes
+from database import engine, async_engine, create_tables
+from log_sink import log_sink, migrate_nullable_log_user
+from log_retention import log_retention
+from log_stats import init_rollups
+from metrics import MetricsMiddleware, metrics_registry
+from sql_profiler import SqlProfilerMiddleware, sql_profiler
+from token_revocation import revocation_store
+from version_store import migrate_full_copies
+from role_store import migrate_json_roles, sync_role_permissions
+from search_index import init_search_index
+from vector_index import init_vector_index
+from routes import auth, users, logs, routes, monitor, documents, qa, ai
 
 # 创建数据库表
-Base.metadata.create_all(bind=engine)
+create_tables()
+# 旧的roles/permissions JSON列转换为关联表，并按ROLE_PERMISSIONS同步内置角色
+migrate_json_roles(engine)
+sync_role_permissions(engine)
+# 旧的全文版本表转换为快照+增量存储（已转换时直接返回）
+migrate_full_copies(engine)
+# operation_logs.user_id改为可空（已可空时直接返回）
+migrate_nullable_log_user(engine)
+# 加载未过期的token吊销记录
+revocation_store.load()
+# 日志汇总表为空时从operation_logs回填
+init_rollups()
+# 全文检索索引为空时从documents表构建
+init_search_index()
+# 问答向量索引：补齐与documents表不一致的文档
+init_vector_index()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动/停止后台任务"""
+    log_sink.start()
+    log_retention.start()
+    revocation_store.start()
+    if settings.SQL_PROFILER_ENABLED:
+        sql_profiler.start()
+    yield
+    sql_profiler.stop()
+    revocation_store.stop()
+    log_retention.stop()
+    # 关闭前写入队列中剩余的操作日志
+    log_sink.stop()
+    await async_engine.dispose()
+
 
 # 创建FastAPI应用
 app = FastAPI(
@@ -17,7 +63,8 @@ app = FastAPI(
     version=settings.APP_VERSION,
     description="WisdomBase API - 文档管理和知识库系统",
     docs_url="/api/v1/docs",
-    openapi_url="/api/v1/openapi.json"
+    openapi_url="/api/v1/openapi.json",
+    lifespan=lifespan
 )
 
 # 配置日志
@@ -33,6 +80,18 @@ app.add_middleware(
     allow_headers=settings.CORS_ALLOW_HEADERS,
 )
 
+# SQL性能分析（慢查询、N+1、采样轨迹）
+if settings.SQL_PROFILER_ENABLED:
+    sql_profiler.instrument_engine(engine)
+    sql_profiler.instrument_engine(async_engine.sync_engine)
+    app.add_middleware(SqlProfilerMiddleware)
+
+# 请求与数据库指标（最后添加，位于最外层，延迟包含其他中间件）
+if settings.METRICS_ENABLED:
+    metrics_registry.instrument_engine(engine, "sync")
+    metrics_registry.instrument_engine(async_engine.sync_engine, "async")
+    app.add_middleware(MetricsMiddleware)
+
 
 # 自定义异常处理器
 @app.exception_handler(Exception)
@@ -60,11 +119,29 @@ async def health_check():
     }
 
 
+# 指标端点（Prometheus抓取）
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics(request: Request):
+        """请求与数据库指标（Prometheus文本格式）"""
+        if settings.METRICS_TOKEN:
+            authorization = request.headers.get("Authorization", "")
+            if not hmac.compare_digest(authorization, f"Bearer {settings.METRICS_TOKEN}"):
+                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+        return PlainTextResponse(
+            metrics_registry.render(), media_type="text/plain; version=0.0.4"
+        )
+
+
 # 包含路由
 app.include_router(auth.router, prefix=settings.API_PREFIX)
 app.include_router(users.router, prefix=settings.API_PREFIX)
 app.include_router(logs.router, prefix=settings.API_PREFIX)
+app.include_router(documents.router, prefix=settings.API_PREFIX)
+app.include_router(qa.router, prefix=settings.API_PREFIX)
+app.include_router(ai.router, prefix=settings.API_PREFIX)
 app.include_router(routes.router, prefix=settings.API_PREFIX)
+app.include_router(monitor.router, prefix=settings.API_PREFIX)
 
 
 # 根路由
@@ -0,0 +1,194 @@
+"""
+请求与数据库指标（Prometheus文本格式，GET /metrics）
+
+- 纯ASGI中间件按 (method, 路由模板) 统计请求数、状态码、延迟直方图，以及每个请求的
+  数据库查询数和数据库耗时；未匹配路由的请求统一记为 <unmatched>，避免标签数量失控
+- 数据库指标通过SQLAlchemy的before/after_cursor_execute事件采集，按请求上下文
+  （ContextVar）归属到当前请求；后台线程的查询只计入全局的查询耗时直方图
+- 直方图的桶在创建时预分配，记录时只做二分查找和整数自增，不加锁：请求在事件循环线程上
+  记录，线程池中的查询与其并发时极少数自增可能丢失，对监控数据可以接受
+"""
+
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+from config import settings
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class Histogram:
+    """累积桶直方图（桶上界升序，最后一个桶为+Inf）"""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """(le, 累积计数) 列表"""
+        total = 0
+        result = []
+        for bound, count in zip(self.bounds + ["+Inf"], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class RouteMetrics:
+    __slots__ = ("latency", "statuses", "db_queries", "db_seconds")
+
+    def __init__(self, bounds):
+        self.latency = Histogram(bounds)
+        self.statuses = {}
+        self.db_queries = 0
+        self.db_seconds = 0.0
+
+
+class RequestDbStats:
+    """当前请求的数据库查询计数（保存在ContextVar中）"""
+
+    __slots__ = ("queries", "seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+current_request_db: ContextVar[Optional[RequestDbStats]] = ContextVar("current_request_db", default=None)
+
+
+class MetricsRegistry:
+    def __init__(self, latency_buckets, db_buckets):
+        self.latency_buckets = list(latency_buckets)
+        self.routes = {}          # (method, route) -> RouteMetrics
+        self.in_flight = 0
+        self.db_latency = {}      # engine名称 -> Histogram
+        self.db_buckets = list(db_buckets)
+        self.started_at = time.time()
+
+    def route(self, method: str, route: str) -> RouteMetrics:
+        key = (method, route)
+        metrics = self.routes.get(key)
+        if metrics is None:
+            metrics = self.routes[key] = RouteMetrics(self.latency_buckets)
+        return metrics
+
+    # --- 数据库事件 ---
+    def instrument_engine(self, engine, name: str):
+        """监听引擎的SQL执行事件（异步引擎传入async_engine.sync_engine）"""
+        histogram = self.db_latency[name] = Histogram(self.db_buckets)
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            context._metrics_started = time.perf_counter()
+
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            elapsed = time.perf_counter() - context._metrics_started
+            histogram.observe(elapsed)
+            stats = current_request_db.get()
+            if stats is not None:
+                stats.queries += 1
+                stats.seconds += elapsed
+
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+    # --- 导出 ---
+    def render(self) -> str:
+        """Prometheus文本格式"""
+        lines = []
+
+        def header(name: str, kind: str, help_text: str):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histogram_lines(name: str, labels: str, histogram: Histogram):
+            for bound, count in histogram.cumulative():
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f"{name}_sum{{{labels}}} {histogram.sum:.6f}")
+            lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+        routes = sorted(self.routes.items())
+
+        header("http_requests_total", "counter", "HTTP requests by route and status code")
+        for (method, route), metrics in routes:
+            for code, count in sorted(metrics.statuses.items()):
+                lines.append(f'http_requests_total{{method="{method}",route="{route}",status="{code}"}} {count}')
+
+        header("http_request_duration_seconds", "histogram", "HTTP request latency")
+        for (method, route), metrics in routes:
+            histogram_lines("http_request_duration_seconds", f'method="{method}",route="{route}"', metrics.latency)
+
+        header("http_requests_in_flight", "gauge", "HTTP requests currently being processed")
+        lines.append(f"http_requests_in_flight {self.in_flight}")
+
+        header("http_request_db_queries_total", "counter", "Database queries issued while handling requests")
+        for (method, route), metrics in routes:
+            lines.append(f'http_request_db_queries_total{{method="{method}",route="{route}"}} {metrics.db_queries}')
+
+        header("http_request_db_seconds_total", "counter", "Time spent in database queries while handling requests")
+        for (method, route), metrics in routes:
+            lines.append(f'http_request_db_seconds_total{{method="{method}",route="{route}"}} {metrics.db_seconds:.6f}')
+
+        header("db_query_duration_seconds", "histogram", "Database query latency by engine")
+        for name, histogram in sorted(self.db_latency.items()):
+            histogram_lines("db_query_duration_seconds", f'engine="{name}"', histogram)
+
+        header("process_start_time_seconds", "gauge", "Start time of the process since unix epoch")
+        lines.append(f"process_start_time_seconds {self.started_at:.3f}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """纯ASGI中间件（不经过BaseHTTPMiddleware，避免额外的任务和流包装）"""
+
+    def __init__(self, app, registry: "MetricsRegistry" = None):
+        self.app = app
+        self.registry = registry or metrics_registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        registry = self.registry
+        status_code = 500
+        stats = RequestDbStats()
+        token = current_request_db.set(stats)
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        registry.in_flight += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            registry.in_flight -= 1
+            current_request_db.reset(token)
+            # 路由匹配后FastAPI把路由对象写入scope，使用路由模板而不是实际路径
+            route = scope.get("route")
+            metrics = registry.route(scope["method"], getattr(route, "path", UNMATCHED_ROUTE))
+            metrics.latency.observe(elapsed)
+            metrics.statuses[status_code] = metrics.statuses.get(status_code, 0) + 1
+            metrics.db_queries += stats.queries
+            metrics.db_seconds += stats.seconds
+
+
+metrics_registry = MetricsRegistry(settings.METRICS_LATENCY_BUCKETS, settings.METRICS_DB_BUCKETS)
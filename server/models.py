@@ -1,6 +1,6 @@
 from datetime import datetime
-from sqlalchemy import Column, String, Boolean, DateTime, Integer, Text, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, Boolean, DateTime, Integer, Text, LargeBinary, ForeignKey, Index, PrimaryKeyConstraint
+from sqlalchemy.orm import relationship, deferred
 from database import Base
 
 
@@ -14,8 +14,6 @@ class User(Base):
     email = Column(String(100), unique=True, nullable=False, index=True)
     nickname = Column(String(50), nullable=False)
     avatar = Column(String(255), default="https://avatars.githubusercontent.com/u/44761321")
-    roles = Column(String(100), nullable=False)  # JSON格式存储，如 "admin" 或 "editor"
-    permissions = Column(Text, nullable=False)  # JSON格式存储权限列表
     is_active = Column(Boolean, default=True, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
@@ -24,18 +22,90 @@ class User(Base):
     # 关系
     documents = relationship("Document", back_populates="author", cascade="all, delete-orphan")
     operation_logs = relationship("OperationLog", back_populates="user", cascade="all, delete-orphan")
+    # 角色及角色之外单独授予的权限（加载用户时一并查询，构建Principal时不再额外访问数据库）
+    roles = relationship("Role", secondary="user_roles", lazy="selectin", order_by="Role.name")
+    extra_permissions = relationship("Permission", secondary="user_permissions", lazy="selectin")
     
     def __repr__(self):
-        return f"<User(id={self.id}, username={self.username}, roles={self.roles})>"
+        return f"<User(id={self.id}, username={self.username})>"
+
+
+class Role(Base):
+    """角色模型（内置角色的权限由role_store按enums.ROLE_PERMISSIONS同步）"""
+    __tablename__ = "roles"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(50), unique=True, nullable=False, index=True)
+    
+    # 关系
+    permissions = relationship("Permission", secondary="role_permissions", lazy="selectin")
+    
+    def __repr__(self):
+        return f"<Role(id={self.id}, name={self.name})>"
+
+
+class Permission(Base):
+    """权限模型"""
+    __tablename__ = "permissions"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    code = Column(String(100), unique=True, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f"<Permission(id={self.id}, code={self.code})>"
+
+
+class UserRole(Base):
+    """用户-角色关联"""
+    __tablename__ = "user_roles"
+    __table_args__ = (
+        PrimaryKeyConstraint("user_id", "role_id"),
+        # 按角色查询用户
+        Index("ix_user_roles_role_id", "role_id"),
+    )
+    
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    role_id = Column(Integer, ForeignKey("roles.id", ondelete="CASCADE"), nullable=False)
+
+
+class RolePermission(Base):
+    """角色-权限关联"""
+    __tablename__ = "role_permissions"
+    __table_args__ = (
+        PrimaryKeyConstraint("role_id", "permission_id"),
+        Index("ix_role_permissions_permission_id", "permission_id"),
+    )
+    
+    role_id = Column(Integer, ForeignKey("roles.id", ondelete="CASCADE"), nullable=False)
+    permission_id = Column(Integer, ForeignKey("permissions.id", ondelete="CASCADE"), nullable=False)
+
+
+class UserPermission(Base):
+    """用户-权限关联（角色之外单独授予的权限）"""
+    __tablename__ = "user_permissions"
+    __table_args__ = (
+        PrimaryKeyConstraint("user_id", "permission_id"),
+        Index("ix_user_permissions_permission_id", "permission_id"),
+    )
+    
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    permission_id = Column(Integer, ForeignKey("permissions.id", ondelete="CASCADE"), nullable=False)
 
 
 class Document(Base):
     """文档模型"""
     __tablename__ = "documents"
+    __table_args__ = (
+        # 列表按 (created_at, id) 倒序游标分页，并支持按作者/发布状态过滤
+        Index("ix_documents_created_at_id", "created_at", "id"),
+        Index("ix_documents_author_id_created_at", "author_id", "created_at"),
+        Index("ix_documents_is_published_created_at", "is_published", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(255), nullable=False, index=True)
-    content = Column(Text, nullable=True)
+    # 正文默认延迟加载，列表查询不会读取
+    content = deferred(Column(Text, nullable=True))
     author_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     is_published = Column(Boolean, default=False, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -52,22 +122,24 @@ class Document(Base):
 class DocumentVersion(Base):
     """文档版本模型"""
     __tablename__ = "document_versions"
+    __table_args__ = (
+        Index("ix_document_versions_document_id_version_number", "document_id", "version_number", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     document_id = Column(Integer, ForeignKey("documents.id"), nullable=False)
     version_number = Column(Integer, nullable=False)
-    content = Column(Text, nullable=False)
+    # 存储方式见version_store：snapshot为压缩全文，delta为相对上一版本的压缩增量
+    storage = Column(String(10), nullable=False, default="snapshot")
+    codec = Column(String(10), nullable=False, default="zlib")
+    payload = deferred(Column(LargeBinary, nullable=False))
+    content_size = Column(Integer, nullable=False, default=0)  # 还原后的全文字节数
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
     
     # 关系
     document = relationship("Document", back_populates="versions")
     
-    class Config:
-        indexes = [
-            ("document_id", "version_number"),
-        ]
-    
     def __repr__(self):
         return f"<DocumentVersion(id={self.id}, document_id={self.document_id}, version={self.version_number})>"
 
@@ -75,9 +147,16 @@ class DocumentVersion(Base):
 class OperationLog(Base):
     """操作日志模型"""
     __tablename__ = "operation_logs"
+    __table_args__ = (
+        # 支持 (created_at, id) 倒序的游标分页及按条件过滤
+        Index("ix_operation_logs_created_at_id", "created_at", "id"),
+        Index("ix_operation_logs_user_id_created_at", "user_id", "created_at"),
+        Index("ix_operation_logs_action_created_at", "action", "created_at"),
+        Index("ix_operation_logs_resource_type_created_at", "resource_type", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # 为空表示未知用户（如不存在的用户名登录失败）
     action = Column(String(50), nullable=False)  # CREATE, READ, UPDATE, DELETE, LOGIN等
     resource_type = Column(String(50), nullable=False)  # user, document, system等
     resource_id = Column(Integer, nullable=True)
@@ -90,3 +169,39 @@ class OperationLog(Base):
     
     def __repr__(self):
         return f"<OperationLog(id={self.id}, user_id={self.user_id}, action={self.action})>"
+
+
+class OperationLogRollup(Base):
+    """操作日志预聚合统计（由日志写入路径增量维护）"""
+    __tablename__ = "operation_log_rollups"
+    __table_args__ = (
+        PrimaryKeyConstraint("granularity", "bucket_start", "user_id", "action", "resource_type"),
+        Index("ix_operation_log_rollups_granularity_action", "granularity", "action", "bucket_start"),
+        Index("ix_operation_log_rollups_granularity_resource_type", "granularity", "resource_type", "bucket_start"),
+        Index("ix_operation_log_rollups_granularity_user_id", "granularity", "user_id", "bucket_start"),
+    )
+    
+    granularity = Column(String(10), nullable=False)  # minute, hour, day
+    bucket_start = Column(DateTime, nullable=False)
+    user_id = Column(Integer, nullable=False)
+    action = Column(String(50), nullable=False)
+    resource_type = Column(String(50), nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<OperationLogRollup({self.granularity} {self.bucket_start}, action={self.action}, count={self.count})>"
+
+
+class RevokedToken(Base):
+    """已吊销的token（按jti记录，过期后清理）"""
+    __tablename__ = "revoked_tokens"
+    
+    id = Column(Integer, primary_key=True)
+    jti = Column(String(32), unique=True, nullable=False)
+    user_id = Column(Integer, nullable=False)
+    token_type = Column(String(10), nullable=False)  # access, refresh
+    expires_at = Column(DateTime, nullable=False, index=True)
+    revoked_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f"<RevokedToken(jti={self.jti}, user_id={self.user_id}, type={self.token_type})>"
@@ -0,0 +1,42 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException, status
+
+
+def encode_cursor(*values) -> str:
+    """将排序键编码为不透明的游标字符串（datetime按ISO格式保存）"""
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    """解析游标字符串，格式不正确时返回400"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != size:
+            raise ValueError("unexpected cursor shape")
+        return values
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def decode_time_id_cursor(cursor: Optional[str]) -> Optional[tuple]:
+    """解析 (created_at, id) 形式的游标"""
+    if not cursor:
+        return None
+    created_at, row_id = decode_cursor(cursor, 2)
+    try:
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
@@ -0,0 +1,193 @@
+"""
+登录限流
+
+- 滑动窗口计数：每个键只保存当前窗口和上一窗口的计数，估算值 =
+  上一窗口计数 × 上一窗口仍落在滑动窗口内的比例 + 当前窗口计数，内存占用与请求数无关
+- 按IP限制登录尝试次数，按用户名限制失败次数（登录成功后清零）
+- 在查询用户和校验密码之前检查，超限请求直接返回429，不消耗argon2计算
+- IP计数和用户名失败计数使用两个独立的存储，大量新IP不会挤掉用户名的失败计数
+- 计数存储可替换：默认进程内存储（多进程部署时各进程分别计数），
+  可通过register_rate_limit_store注册共享存储（如Redis）
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from fastapi import HTTPException, status
+
+from config import settings
+
+
+class MemoryRateLimitStore:
+    """进程内的滑动窗口计数存储
+
+    键按最近写入的窗口排序（进入新窗口时移到末尾），已过期（早于上一窗口）的键总在最前面。
+    键数达到max_keys时从头部清理过期键，每次只检查头部，不遍历全部键；
+    全部键都未过期时才淘汰最早的键（计入evictions）
+    """
+
+    name = "memory"
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._counters = OrderedDict()   # key -> [窗口序号, 当前窗口计数, 上一窗口计数]，按窗口序号有序
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def _estimate(self, counter: list, window: float, now: float) -> float:
+        index = int(now // window)
+        if counter[0] == index:
+            current, previous = counter[1], counter[2]
+        elif counter[0] == index - 1:
+            current, previous = 0, counter[1]
+        else:
+            current, previous = 0, 0
+        elapsed = now / window - index
+        return previous * (1 - elapsed) + current
+
+    def _evict_locked(self, window: float, now: float):
+        stale_before = int(now // window) - 1
+        while self._counters:
+            key, counter = next(iter(self._counters.items()))
+            if counter[0] >= stale_before:
+                break
+            del self._counters[key]
+        while len(self._counters) >= self.max_keys:
+            self._counters.popitem(last=False)
+            self.evictions += 1
+
+    async def incr(self, key: str, window: float, now: float) -> float:
+        """计数加一，返回加一后的估算值"""
+        index = int(now // window)
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None:
+                if len(self._counters) >= self.max_keys:
+                    self._evict_locked(window, now)
+                counter = self._counters[key] = [index, 0, 0]
+            elif counter[0] != index:
+                counter[2] = counter[1] if counter[0] == index - 1 else 0
+                counter[1] = 0
+                counter[0] = index
+                # 保持按窗口序号有序
+                self._counters.move_to_end(key)
+            counter[1] += 1
+            return self._estimate(counter, window, now)
+
+    async def count(self, key: str, window: float, now: float) -> float:
+        """当前估算值（不计数）"""
+        counter = self._counters.get(key)
+        if counter is None:
+            return 0.0
+        return self._estimate(counter, window, now)
+
+    async def reset(self, key: str):
+        with self._lock:
+            self._counters.pop(key, None)
+
+    def stats(self) -> dict:
+        return {"store": self.name, "keys": len(self._counters), "max_keys": self.max_keys, "evictions": self.evictions}
+
+
+RATE_LIMIT_STORES = {
+    "memory": lambda: MemoryRateLimitStore(settings.LOGIN_RATE_LIMIT_MAX_KEYS),
+}
+
+
+def register_rate_limit_store(name: str, factory: Callable):
+    """注册共享计数存储，factory返回带async incr/count/reset和stats方法的对象"""
+    RATE_LIMIT_STORES[name] = factory
+
+
+def create_rate_limit_store():
+    if settings.LOGIN_RATE_LIMIT_STORE not in RATE_LIMIT_STORES:
+        raise ValueError(f"Unknown LOGIN_RATE_LIMIT_STORE: {settings.LOGIN_RATE_LIMIT_STORE}")
+    return RATE_LIMIT_STORES[settings.LOGIN_RATE_LIMIT_STORE]()
+
+
+class LoginThrottle:
+    """登录限流：每个IP的尝试次数、每个用户名的失败次数"""
+
+    def __init__(
+        self,
+        ip_store,
+        username_store,
+        enabled: bool = True,
+        ip_max_attempts: int = 30,
+        ip_window: float = 60,
+        username_max_failures: int = 5,
+        username_window: float = 300
+    ):
+        self.ip_store = ip_store
+        self.username_store = username_store
+        self.enabled = enabled
+        self.ip_max_attempts = ip_max_attempts
+        self.ip_window = ip_window
+        self.username_max_failures = username_max_failures
+        self.username_window = username_window
+
+        # 统计指标
+        self.rejected_ip = 0
+        self.rejected_username = 0
+        self.failures = 0
+
+    @staticmethod
+    def _username_key(username: str) -> str:
+        return f"login:user:{username.lower()}"
+
+    def _reject(self, window: float, now: float):
+        retry_after = max(1, math.ceil(window - now % window))
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts, please retry later",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    async def check(self, ip_address: str, username: str):
+        """登录前检查（计入本次尝试），超限时抛出429"""
+        if not self.enabled:
+            return
+        now = time.time()
+        if await self.ip_store.incr(f"login:ip:{ip_address}", self.ip_window, now) > self.ip_max_attempts:
+            self.rejected_ip += 1
+            self._reject(self.ip_window, now)
+        if await self.username_store.count(self._username_key(username), self.username_window, now) >= self.username_max_failures:
+            self.rejected_username += 1
+            self._reject(self.username_window, now)
+
+    async def record_failure(self, username: str):
+        self.failures += 1
+        if self.enabled:
+            await self.username_store.incr(self._username_key(username), self.username_window, time.time())
+
+    async def record_success(self, username: str):
+        if self.enabled:
+            await self.username_store.reset(self._username_key(username))
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "ip_max_attempts": self.ip_max_attempts,
+            "ip_window": self.ip_window,
+            "username_max_failures": self.username_max_failures,
+            "username_window": self.username_window,
+            "rejected_ip": self.rejected_ip,
+            "rejected_username": self.rejected_username,
+            "failures": self.failures,
+            "ip_store": self.ip_store.stats(),
+            "username_store": self.username_store.stats(),
+        }
+
+
+login_throttle = LoginThrottle(
+    ip_store=create_rate_limit_store(),
+    username_store=create_rate_limit_store(),
+    enabled=settings.LOGIN_RATE_LIMIT_ENABLED,
+    ip_max_attempts=settings.LOGIN_IP_MAX_ATTEMPTS,
+    ip_window=settings.LOGIN_IP_WINDOW_SECONDS,
+    username_max_failures=settings.LOGIN_USERNAME_MAX_FAILURES,
+    username_window=settings.LOGIN_USERNAME_WINDOW_SECONDS
+)
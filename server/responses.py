@@ -0,0 +1,39 @@
+"""
+列表接口的快速JSON响应
+
+路由直接返回由查询结果构建的dict/list时使用FastJSONResponse：FastAPI不再按response_model
+重新校验，序列化优先使用orjson（原生支持datetime，输出与pydantic的JSON格式一致），
+未安装orjson时回退到标准库json。response_model仍保留在路由上用于生成OpenAPI文档。
+"""
+
+import json
+from datetime import date, datetime
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(
+        content, ensure_ascii=False, separators=(",", ":"), default=_json_default
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """orjson序列化的JSON响应（内容需为dict/list及基本类型、datetime）"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
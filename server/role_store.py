@@ -0,0 +1,124 @@
+"""
+角色与权限关联表的维护
+
+- roles / permissions 为字典表，user_roles / role_permissions / user_permissions 为关联表
+- 内置角色的权限以enums.ROLE_PERMISSIONS为准，启动时同步到role_permissions，
+  修改ROLE_PERMISSIONS后只需重启，无需改写用户数据
+- user_permissions保存角色之外单独授予的权限
+- 旧版本users表中的roles/permissions JSON列在启动时转换为关联表后删除
+
+转换旧数据: python role_store.py --migrate
+"""
+
+import argparse
+import json
+
+from sqlalchemy import inspect, select, delete, insert, text
+
+from enums import PermissionEnum, ROLE_PERMISSION_SETS
+from models import User, Role, Permission, UserRole, RolePermission, UserPermission
+
+
+def _ensure_rows(conn, model, column: str, values) -> dict:
+    """确保字典表中存在这些值，返回 值 -> id"""
+    field = getattr(model, column)
+    existing = dict(conn.execute(select(field, model.id).where(field.in_(list(values)))).all())
+    missing = [value for value in values if value not in existing]
+    if missing:
+        conn.execute(insert(model), [{column: value} for value in missing])
+        existing.update(conn.execute(select(field, model.id).where(field.in_(missing))).all())
+    return existing
+
+
+def sync_role_permissions(engine) -> int:
+    """按ROLE_PERMISSIONS同步内置角色及其权限，返回新增/删除的关联行数"""
+    changed = 0
+    with engine.begin() as conn:
+        role_ids = _ensure_rows(conn, Role, "name", list(ROLE_PERMISSION_SETS))
+        permission_ids = _ensure_rows(conn, Permission, "code", [p.value for p in PermissionEnum])
+        existing = set(conn.execute(
+            select(RolePermission.role_id, RolePermission.permission_id)
+            .where(RolePermission.role_id.in_(list(role_ids.values())))
+        ).all())
+        wanted = {
+            (role_ids[role], permission_ids[code])
+            for role, codes in ROLE_PERMISSION_SETS.items()
+            for code in codes
+        }
+        for role_id, permission_id in existing - wanted:
+            conn.execute(delete(RolePermission).where(
+                RolePermission.role_id == role_id, RolePermission.permission_id == permission_id
+            ))
+        if wanted - existing:
+            conn.execute(insert(RolePermission), [
+                {"role_id": role_id, "permission_id": permission_id}
+                for role_id, permission_id in wanted - existing
+            ])
+        changed = len(existing - wanted) + len(wanted - existing)
+    return changed
+
+
+def _parse_json_list(raw) -> list:
+    try:
+        value = json.loads(raw) if raw else []
+    except (json.JSONDecodeError, TypeError):
+        value = raw
+    if isinstance(value, str):
+        value = [value]
+    return [str(item) for item in value or []]
+
+
+def migrate_json_roles(engine) -> int:
+    """把users表的roles/permissions JSON列转换为关联表并删除这两列，返回转换的用户数
+
+    未知的角色名会新建为无权限的角色；不能由角色推导出的权限写入user_permissions
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table(User.__tablename__):
+        return 0
+    columns = {c["name"] for c in inspector.get_columns(User.__tablename__)}
+    if "roles" not in columns:
+        return 0
+
+    sync_role_permissions(engine)
+    with engine.begin() as conn:
+        rows = conn.execute(text(f"SELECT id, roles, permissions FROM {User.__tablename__}")).all()
+        users = [
+            (row.id, [role.lower() for role in _parse_json_list(row.roles)], _parse_json_list(row.permissions))
+            for row in rows
+        ]
+        role_ids = _ensure_rows(conn, Role, "name", sorted({role for _, roles, _ in users for role in roles}))
+        permission_ids = _ensure_rows(conn, Permission, "code", sorted({p for _, _, perms in users for p in perms}))
+
+        user_roles, user_permissions = [], []
+        for user_id, roles, permissions in users:
+            implied = set()
+            for role in dict.fromkeys(roles):
+                user_roles.append({"user_id": user_id, "role_id": role_ids[role]})
+                implied |= ROLE_PERMISSION_SETS.get(role, frozenset())
+            for code in dict.fromkeys(permissions):
+                if code not in implied:
+                    user_permissions.append({"user_id": user_id, "permission_id": permission_ids[code]})
+        if user_roles:
+            conn.execute(insert(UserRole), user_roles)
+        if user_permissions:
+            conn.execute(insert(UserPermission), user_permissions)
+
+        conn.execute(text(f"ALTER TABLE {User.__tablename__} DROP COLUMN roles"))
+        conn.execute(text(f"ALTER TABLE {User.__tablename__} DROP COLUMN permissions"))
+    return len(users)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Role and permission table maintenance")
+    parser.add_argument("--migrate", action="store_true", help="convert JSON roles/permissions columns to association tables")
+    parser.add_argument("--sync", action="store_true", help="sync built-in roles from enums.ROLE_PERMISSIONS")
+    args = parser.parse_args()
+    if not args.migrate and not args.sync:
+        parser.print_help()
+    else:
+        from database import engine, create_tables
+        create_tables()
+        if args.migrate:
+            print(f"✓ Migrated roles of {migrate_json_roles(engine)} users")
+        print(f"✓ Synced built-in roles ({sync_role_permissions(engine)} role permissions changed)")
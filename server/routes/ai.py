@@ -0,0 +1,66 @@
+from sqlalchemy import select
+from sqlalchemy.orm import undefer
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from database import get_db
+from models import Document
+from schemas import AICompletionRequest, AICompletionResponse
+from security import check_permission, Principal
+from enums import PermissionEnum
+from ai_gateway import ai_gateway, build_prompt, document_context, sse_stream, LimitedStreamingResponse
+from routes.documents import can_read_drafts
+
+router = APIRouter(prefix="/ai", tags=["ai"])
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+@router.post("/complete", response_model=AICompletionResponse)
+async def complete(
+    completion_data: AICompletionRequest,
+    current_user: Principal = Depends(check_permission(PermissionEnum.AI_CALL)),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    调用AI模型
+    
+    - **prompt**: 提示词
+    - **document_ids**: 作为参考内容的文档ID（按顺序拼入prompt）
+    - **max_tokens**: 最大生成长度
+    - **stream**: 为true时以SSE返回（delta事件逐段输出，done事件结束）
+    """
+    document_ids = list(dict.fromkeys(completion_data.document_ids))
+    sources = []
+    if document_ids:
+        documents = {
+            document.id: document
+            for document in await db.scalars(
+                select(Document).options(undefer(Document.content)).where(Document.id.in_(document_ids))
+            )
+        }
+        for document_id in document_ids:
+            document = documents.get(document_id)
+            if not document or (not document.is_published and not can_read_drafts(current_user)):
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Document {document_id} not found"
+                )
+            sources.append((document.title, document.content))
+    context = await document_context(db, document_ids)
+    prompt = build_prompt(completion_data.prompt, sources)
+    
+    ai_gateway.limiter.acquire(current_user.id, PermissionEnum.AI_CALL)
+    if completion_data.stream:
+        return LimitedStreamingResponse(
+            sse_stream(prompt, context, completion_data.max_tokens),
+            release=lambda: ai_gateway.limiter.release(current_user.id, PermissionEnum.AI_CALL),
+            media_type="text/event-stream",
+            headers=SSE_HEADERS
+        )
+    try:
+        answer, cached = await ai_gateway.complete(prompt, context, completion_data.max_tokens)
+    finally:
+        ai_gateway.limiter.release(current_user.id, PermissionEnum.AI_CALL)
+    
+    return AICompletionResponse(answer=answer, cached=cached, provider=ai_gateway.provider.name)
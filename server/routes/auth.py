@@ -1,52 +1,45 @@
 from datetime import datetime
-import json
 from typing import Optional
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 
+from config import settings
 from database import get_db
-from models import User, OperationLog
-from schemas import LoginRequest, LoginResponse, RefreshTokenRequest, RefreshTokenResponse
-from security import hash_password, verify_password, create_token, verify_token, get_current_user
+from models import User
+from schemas import LoginRequest, LoginResponse, RefreshTokenRequest, RefreshTokenResponse, LogoutRequest
+from security import verify_password_async, create_token, verify_token, get_current_user, build_principal, cache_principal, Principal
 from enums import ROLE_PERMISSIONS, RoleEnum
+from log_sink import log_operation
+from token_revocation import revocation_store
+from rate_limit import login_throttle
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
 def get_client_ip(request: Request) -> str:
-    """获取客户端IP地址"""
-    if x_forwarded_for := request.headers.get("X-Forwarded-For"):
-        return x_forwarded_for.split(",")[0].strip()
-    return request.client.host if request.client else "unknown"
-
-
-def log_operation(
-    db: Session,
-    user_id: int,
-    action: str,
-    resource_type: str = "auth",
-    resource_id: Optional[int] = None,
-    description: Optional[str] = None,
-    ip_address: Optional[str] = None
-):
-    """记录操作日志"""
-    log = OperationLog(
-        user_id=user_id,
-        action=action,
-        resource_type=resource_type,
-        resource_id=resource_id,
-        description=description,
-        ip_address=ip_address
-    )
-    db.add(log)
-    db.commit()
+    """获取客户端IP地址
+    
+    X-Forwarded-For可由客户端任意伪造，只有直接连接来自TRUSTED_PROXIES时才使用：
+    从右向左跳过可信代理追加的地址，第一个不是可信代理的地址即为客户端
+    """
+    client_host = request.client.host if request.client else "unknown"
+    if client_host not in settings.TRUSTED_PROXIES:
+        return client_host
+    forwarded = request.headers.get("X-Forwarded-For")
+    if not forwarded:
+        return client_host
+    for address in reversed([part.strip() for part in forwarded.split(",")]):
+        if address and address not in settings.TRUSTED_PROXIES:
+            return address
+    return client_host
 
 
 @router.post("/login", response_model=LoginResponse)
 async def login(
     login_data: LoginRequest,
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     用户登录接口
@@ -54,13 +47,33 @@ async def login(
     - **username**: 用户名
     - **password**: 密码
     
-    返回access_token、refresh_token和用户信息
+    返回access_token、refresh_token和用户信息；同一IP尝试过多或同一用户名失败过多时返回429
     """
-    # 查询用户
-    user = db.query(User).filter(User.username == login_data.username).first()
+    # 限流检查在查询用户和校验密码之前，超限请求不消耗数据库和argon2计算
+    ip_address = get_client_ip(request)
+    await login_throttle.check(ip_address, login_data.username)
     
-    if not user or not verify_password(login_data.password, user.password):
-        ip_address = get_client_ip(request)
+    # 查询用户
+    result = await db.execute(select(User).where(User.username == login_data.username))
+    user = result.scalar_one_or_none()
+    if user:
+        # roles和permissions来自关联表（查询用户时已一并加载），在结束事务前取出
+        principal = build_principal(user)
+        # 校验密码期间不占用数据库连接：先与会话分离再结束只读事务
+        db.expunge(user)
+    await db.rollback()
+    
+    if not user or not await verify_password_async(login_data.password, user.password):
+        await login_throttle.record_failure(login_data.username)
+        # 不存在的用户名同样记录（user_id为空），便于发现撞库
+        log_operation(
+            user_id=user.id if user else None,
+            action="LOGIN_FAILED",
+            resource_type="auth",
+            resource_id=user.id if user else None,
+            description=f"Failed login for {'user' if user else 'unknown user'} {login_data.username}",
+            ip_address=ip_address
+        )
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials",
@@ -73,15 +86,19 @@ async def login(
             detail="User is inactive"
         )
     
-    # 更新最后登录时间
+    # 更新最后登录时间（user已与会话分离，直接UPDATE避免提交后重新加载）
     user.last_login = datetime.utcnow()
-    db.add(user)
-    db.commit()
+    await db.execute(
+        update(User).where(User.id == user.id).values(last_login=user.last_login)
+    )
+    await db.commit()
+    # 登录时已加载完整的用户信息，直接写入principal_cache，随后的请求无需再查询用户
+    principal = cache_principal(principal, last_login=user.last_login)
+    
+    await login_throttle.record_success(login_data.username)
     
     # 记录登录日志
-    ip_address = get_client_ip(request)
     log_operation(
-        db=db,
         user_id=user.id,
         action="LOGIN",
         resource_type="auth",
@@ -94,13 +111,6 @@ async def login(
     access_token = create_token(subject=user.id, token_type="access")
     refresh_token = create_token(subject=user.id, token_type="refresh")
     
-    # 解析roles和permissions
-    roles = json.loads(user.roles) if isinstance(user.roles, str) else user.roles
-    if isinstance(roles, str):
-        roles = [roles]
-    
-    permissions = json.loads(user.permissions) if user.permissions else []
-    
     # 格式化过期时间（前端期望的格式）
     expires = (datetime.utcnow() + __import__("datetime").timedelta(
         minutes=__import__("config").settings.ACCESS_TOKEN_EXPIRE_MINUTES
@@ -112,8 +122,8 @@ async def login(
             "avatar": user.avatar,
             "username": user.username,
             "nickname": user.nickname,
-            "roles": roles,
-            "permissions": permissions,
+            "roles": sorted(principal.roles),
+            "permissions": sorted(principal.permissions),
             "accessToken": access_token,
             "refreshToken": refresh_token,
             "expires": expires
@@ -125,27 +135,36 @@ async def login(
 @router.post("/refresh-token", response_model=RefreshTokenResponse)
 async def refresh_token(
     refresh_data: RefreshTokenRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     刷新access token
     
-    使用refresh_token获取新的access_token
+    使用refresh_token获取新的access_token和新的refresh_token，旧的refresh_token随即吊销（只能使用一次）
     """
     try:
         payload = verify_token(refresh_data.refreshToken, token_type="refresh")
         user_id = int(payload.get("sub"))
         
         # 检查用户是否存在且活跃
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await db.get(User, user_id)
         if not user or not user.is_active:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="User not found or inactive"
             )
         
-        # 生成新的access token
+        # 轮换refresh token：吊销旧token，并发重复使用时只有一个请求成功
+        if not await revocation_store.revoke(db, payload):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token has been revoked"
+            )
+        await db.commit()
+        
+        # 生成新的tokens
         new_access_token = create_token(subject=user.id, token_type="access")
+        new_refresh_token = create_token(subject=user.id, token_type="refresh")
         
         # 格式化过期时间
         expires = (datetime.utcnow() + __import__("datetime").timedelta(
@@ -156,7 +175,7 @@ async def refresh_token(
             success=True,
             data={
                 "accessToken": new_access_token,
-                "refreshToken": refresh_data.refreshToken,
+                "refreshToken": new_refresh_token,
                 "expires": expires
             },
             message=""
@@ -173,17 +192,28 @@ async def refresh_token(
 @router.post("/logout")
 async def logout(
     request: Request,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    logout_data: Optional[LogoutRequest] = None,
+    token: str = None,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     用户登出接口
     
-    记录用户登出日志
+    吊销当前access token（请求体中带refreshToken时一并吊销），并记录用户登出日志
     """
+    await revocation_store.revoke(db, verify_token(token, token_type="access"))
+    if logout_data and logout_data.refreshToken:
+        try:
+            refresh_payload = verify_token(logout_data.refreshToken, token_type="refresh")
+        except HTTPException:
+            refresh_payload = None
+        if refresh_payload and int(refresh_payload["sub"]) == current_user.id:
+            await revocation_store.revoke(db, refresh_payload)
+    await db.commit()
+    
     ip_address = get_client_ip(request)
     log_operation(
-        db=db,
         user_id=current_user.id,
         action="LOGOUT",
         resource_type="auth",
@@ -197,15 +227,9 @@ async def logout(
 
 @router.get("/me")
 async def get_current_user_info(
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
-    """获取当前用户信息"""
-    roles = json.loads(current_user.roles) if isinstance(current_user.roles, str) else current_user.roles
-    if isinstance(roles, str):
-        roles = [roles]
-    
-    permissions = json.loads(current_user.permissions) if current_user.permissions else []
-    
+    """获取当前用户信息（直接由Principal快照构建，不查询数据库）"""
     return {
         "success": True,
         "data": {
@@ -214,8 +238,8 @@ async def get_current_user_info(
             "username": current_user.username,
             "nickname": current_user.nickname,
             "email": current_user.email,
-            "roles": roles,
-            "permissions": permissions,
+            "roles": sorted(current_user.roles),
+            "permissions": sorted(current_user.permissions),
             "is_active": current_user.is_active,
             "created_at": current_user.created_at,
             "last_login": current_user.last_login
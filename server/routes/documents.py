@@ -0,0 +1,477 @@
+import sys
+from typing import Optional
+from datetime import datetime
+from sqlalchemy import select, func, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import undefer
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.concurrency import run_in_threadpool
+
+from database import get_db
+from models import Document, DocumentVersion
+from schemas import (
+    DocumentCreate, DocumentUpdate, DocumentResponse, DocumentSummary, DocumentListResponse,
+    DocumentVersionSummary, DocumentVersionListResponse, DocumentVersionResponse, DocumentDiffResponse,
+    DocumentSearchHit, DocumentSearchResponse
+)
+from security import check_permission, has_permission, Principal
+from enums import PermissionEnum
+from log_sink import log_operation
+from pagination import encode_cursor, decode_time_id_cursor
+import search_index
+import vector_index
+import version_diff
+import version_store
+from version_store import encode_version, load_version_content, remember_version
+from ai_gateway import ai_gateway
+from routes.auth import get_client_ip
+
+router = APIRouter(prefix="/documents", tags=["documents"])
+
+# 列表接口只读取的摘要列
+SUMMARY_COLUMNS = (
+    Document.id,
+    Document.title,
+    Document.author_id,
+    Document.is_published,
+    Document.created_at,
+    Document.updated_at,
+)
+
+
+def is_admin(user: Principal) -> bool:
+    return "admin" in user.roles
+
+
+def can_read_drafts(user: Principal) -> bool:
+    """管理员和编辑者可以读取未发布的文档，其他用户只能读取已发布文档"""
+    return is_admin(user) or has_permission(user, PermissionEnum.DOC_UPDATE)
+
+
+def prefix_upper_bound(prefix: str) -> Optional[str]:
+    """前缀查询的上界：title >= prefix AND title < upper，可以使用title索引
+    
+    末尾的U+10FFFF无法再加一，去掉后对前一个字符加一；全部为U+10FFFF时没有上界，返回None。
+    跳过代理区（U+D800-U+DFFF），这些码点无法编码为UTF-8。
+    """
+    prefix = prefix.rstrip(chr(sys.maxunicode))
+    if not prefix:
+        return None
+    code = ord(prefix[-1]) + 1
+    if 0xD800 <= code <= 0xDFFF:
+        code = 0xE000
+    return prefix[:-1] + chr(code)
+
+
+async def get_document_or_404(
+    db: AsyncSession,
+    document_id: int,
+    current_user: Principal,
+    with_content: bool = False
+) -> Document:
+    """读取文档，不存在或无权查看时返回404"""
+    query = select(Document).where(Document.id == document_id)
+    if with_content:
+        query = query.options(undefer(Document.content))
+    document = await db.scalar(query)
+    if not document or (not document.is_published and not can_read_drafts(current_user)):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+    return document
+
+
+def ensure_can_modify(document: Document, current_user: Principal):
+    """编辑者只能修改自己创建的文档，管理员可以修改所有文档"""
+    if not is_admin(current_user) and document.author_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You can only modify your own documents"
+        )
+
+
+async def next_version_number(db: AsyncSession, document_id: int) -> int:
+    latest = await db.scalar(
+        select(func.max(DocumentVersion.version_number)).where(
+            DocumentVersion.document_id == document_id
+        )
+    )
+    return (latest or 0) + 1
+
+
+async def build_version(
+    document_id: int,
+    version_number: int,
+    content: str,
+    previous_content: Optional[str],
+    created_by: int
+) -> DocumentVersion:
+    """生成版本记录（快照或增量），压缩和diff计算放到线程池中执行"""
+    fields = await run_in_threadpool(encode_version, version_number, content, previous_content)
+    return DocumentVersion(
+        document_id=document_id,
+        version_number=version_number,
+        created_by=created_by,
+        **fields
+    )
+
+
+async def commit_document(db: AsyncSession, document: Document, reindex: bool):
+    """（按需更新检索索引后）提交文档修改
+    
+    并发修改同一文档时两个请求可能算出相同的下一个版本号，后提交的违反唯一索引，
+    此时回滚并返回409，由客户端基于最新内容重试（不自动重试，避免覆盖对方的修改）
+    """
+    try:
+        if reindex:
+            await search_index.index_document(db, document)
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Document was modified concurrently, please reload and retry"
+        )
+
+
+@router.get("", response_model=DocumentListResponse)
+async def list_documents(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    author_id: Optional[int] = None,
+    is_published: Optional[bool] = None,
+    title_prefix: Optional[str] = Query(None, min_length=1, max_length=255),
+    current_user: Principal = Depends(check_permission(PermissionEnum.DOC_READ)),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    获取文档列表（只返回摘要，不含正文）
+    
+    - **limit**: 返回的记录数
+    - **cursor**: 分页游标，取上一页返回的next_cursor
+    - **author_id**: 按作者过滤（可选）
+    - **is_published**: 按发布状态过滤（可选，无编辑权限的用户只能看到已发布文档）
+    - **title_prefix**: 按标题前缀过滤（可选，区分大小写）
+    """
+    query = select(*SUMMARY_COLUMNS)
+    
+    if not can_read_drafts(current_user):
+        is_published = True
+    if author_id:
+        query = query.where(Document.author_id == author_id)
+    if is_published is not None:
+        query = query.where(Document.is_published == is_published)
+    if title_prefix:
+        query = query.where(Document.title >= title_prefix)
+        upper_bound = prefix_upper_bound(title_prefix)
+        if upper_bound is not None:
+            query = query.where(Document.title < upper_bound)
+    
+    position = decode_time_id_cursor(cursor)
+    if position:
+        query = query.where(tuple_(Document.created_at, Document.id) < tuple_(*position))
+    
+    rows = (await db.execute(
+        query.order_by(Document.created_at.desc(), Document.id.desc()).limit(limit + 1)
+    )).all()
+    has_more = len(rows) > limit
+    items = [DocumentSummary.model_validate(row._mapping) for row in rows[:limit]]
+    next_cursor = encode_cursor(items[-1].created_at, items[-1].id) if has_more else None
+    
+    return DocumentListResponse(next_cursor=next_cursor, items=items)
+
+
+@router.get("/search", response_model=DocumentSearchResponse)
+async def search_documents(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=50),
+    offset: int = Query(0, ge=0, le=1000),
+    current_user: Principal = Depends(check_permission(PermissionEnum.DOC_READ)),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    全文检索文档（按BM25相关度排序）
+    
+    - **q**: 检索词，中文按相邻两字匹配（建议至少两个汉字），空格分隔的多个词之间为AND关系
+    - **limit**: 返回的记录数
+    - **offset**: 跳过的记录数
+    """
+    hits = await search_index.search_documents(
+        db, q, limit + 1, offset, include_drafts=can_read_drafts(current_user)
+    )
+    return DocumentSearchResponse(
+        query=q,
+        has_more=len(hits) > limit,
+        items=[DocumentSearchHit(**hit) for hit in hits[:limit]]
+    )
+
+
+@router.get("/{document_id}", response_model=DocumentResponse)
+async def get_document(
+    document_id: int,
+    current_user: Principal = Depends(check_permission(PermissionEnum.DOC_READ)),
+    db: AsyncSession = Depends(get_db)
+):
+    """获取文档详情（含正文）"""
+    document = await get_document_or_404(db, document_id, current_user, with_content=True)
+    return DocumentResponse.model_validate(document)
+
+
+@router.post("", response_model=DocumentResponse)
+async def create_document(
+    document_data: DocumentCreate,
+    request: Request,
+    current_user: Principal = Depends(check_permission(PermissionEnum.DOC_CREATE)),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    创建文档
+    
+    - **title**: 标题
+    - **content**: 正文
+    - **is_published**: 是否发布
+    """
+    document = Document(
+        title=document_data.title,
+        content=document_data.content,
+        author_id=current_user.id,
+        is_published=document_data.is_published
+    )
+    db.add(document)
+    await db.flush()
+    
+    db.add(await build_version(document.id, 1, document_data.content, None, current_user.id))
+    await search_index.index_document(db, document)
+    await db.commit()
+    remember_version(document.id, 1, document_data.content)
+    await vector_index.index_document(document.id, document.content, document.is_published, document.updated_at)
+    
+    log_operation(
+        user_id=current_user.id,
+        action="CREATE",
+        resource_type="document",
+        resource_id=document.id,
+        description=f"Created document {document.title}",
+        ip_address=get_client_ip(request)
+    )
+    
+    return DocumentResponse.model_validate(document)
+
+
+@router.put("/{document_id}", response_model=DocumentResponse)
+async def update_document(
+    document_id: int,
+    document_data: DocumentUpdate,
+    request: Request,
+    current_user: Principal = Depends(check_permission(PermissionEnum.DOC_UPDATE)),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    更新文档（编辑者只能更新自己的文档）
+    
+    正文发生变化时会生成新的版本
+    """
+    document = await get_document_or_404(db, document_id, current_user, with_content=True)
+    ensure_can_modify(document, current_user)
+    
+    if document_data.title is not None:
+        document.title = document_data.title
+    if document_data.is_published is not None:
+        document.is_published = document_data.is_published
+    version = None
+    if document_data.content is not None and document_data.content != document.content:
+        version = await build_version(
+            document.id,
+            await next_version_number(db, document.id),
+            document_data.content,
+            document.content,
+            current_user.id
+        )
+        db.add(version)
+        document.content = document_data.content
+    
+    document.updated_at = datetime.utcnow()
+    await commit_document(db, document, reindex=True)
+    if version is not None:
+        remember_version(document.id, version.version_number, document.content)
+        await vector_index.index_document(document.id, document.content, document.is_published, document.updated_at)
+    else:
+        vector_index.set_published(document.id, document.is_published, document.updated_at)
+    
+    log_operation(
+        user_id=current_user.id,
+        action="UPDATE",
+        resource_type="document",
+        resource_id=document.id,
+        description=f"Updated document {document.title}",
+        ip_address=get_client_ip(request)
+    )
+    
+    return DocumentResponse.model_validate(document)
+
+
+@router.delete("/{document_id}")
+async def delete_document(
+    document_id: int,
+    request: Request,
+    current_user: Principal = Depends(check_permission(PermissionEnum.DOC_DELETE)),
+    db: AsyncSession = Depends(get_db)
+):
+    """删除文档及其全部版本"""
+    document = await get_document_or_404(db, document_id, current_user)
+    ensure_can_modify(document, current_user)
+    
+    title = document.title
+    await db.delete(document)
+    await search_index.remove_document(db, document_id)
+    await db.commit()
+    version_store.forget_document(document_id)
+    version_diff.forget_document(document_id)
+    vector_index.remove_document(document_id)
+    ai_gateway.forget_document(document_id)
+    
+    log_operation(
+        user_id=current_user.id,
+        action="DELETE",
+        resource_type="document",
+        resource_id=document_id,
+        description=f"Deleted document {title}",
+        ip_address=get_client_ip(request)
+    )
+    
+    return {"success": True, "message": f"Document {title} deleted successfully"}
+
+
+@router.get("/{document_id}/versions", response_model=DocumentVersionListResponse)
+async def list_versions(
+    document_id: int,
+    current_user: Principal = Depends(check_permission(PermissionEnum.DOC_READ)),
+    db: AsyncSession = Depends(get_db)
+):
+    """获取文档的版本列表（按版本号倒序，不含正文）"""
+    await get_document_or_404(db, document_id, current_user)
+    versions = (await db.scalars(
+        select(DocumentVersion)
+        .where(DocumentVersion.document_id == document_id)
+        .order_by(DocumentVersion.version_number.desc())
+    )).all()
+    return DocumentVersionListResponse(
+        document_id=document_id,
+        items=[DocumentVersionSummary.model_validate(v) for v in versions]
+    )
+
+
+@router.get("/{document_id}/versions/{version_number}", response_model=DocumentVersionResponse)
+async def get_version(
+    document_id: int,
+    version_number: int,
+    current_user: Principal = Depends(check_permission(PermissionEnum.DOC_READ)),
+    db: AsyncSession = Depends(get_db)
+):
+    """获取指定版本的全文"""
+    await get_document_or_404(db, document_id, current_user)
+    version = await db.scalar(
+        select(DocumentVersion).where(
+            DocumentVersion.document_id == document_id,
+            DocumentVersion.version_number == version_number
+        )
+    )
+    if not version:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Version not found"
+        )
+    
+    content = await load_version_content(db, document_id, version_number)
+    return DocumentVersionResponse(
+        document_id=document_id,
+        version_number=version_number,
+        content=content,
+        created_by=version.created_by,
+        created_at=version.created_at
+    )
+
+
+@router.get("/{document_id}/diff", response_model=DocumentDiffResponse)
+async def diff_document_versions(
+    document_id: int,
+    from_version: int = Query(..., ge=1),
+    to_version: int = Query(..., ge=1),
+    mode: str = Query("line", pattern="^(line|word)$"),
+    current_user: Principal = Depends(check_permission(PermissionEnum.DOC_READ)),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    对比文档的两个版本
+    
+    - **from_version**: 旧版本号
+    - **to_version**: 新版本号
+    - **mode**: line按行对比，word在变更的行内再按词对比（中文按字）
+    """
+    await get_document_or_404(db, document_id, current_user)
+    result = await version_diff.diff_versions(db, document_id, from_version, to_version, mode)
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Version not found"
+        )
+    return DocumentDiffResponse(
+        document_id=document_id,
+        from_version=from_version,
+        to_version=to_version,
+        **result
+    )
+
+
+@router.post("/{document_id}/versions/{version_number}/rollback", response_model=DocumentResponse)
+async def rollback_document(
+    document_id: int,
+    version_number: int,
+    request: Request,
+    current_user: Principal = Depends(check_permission(PermissionEnum.VERSION_ROLLBACK)),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    将文档回滚到指定版本（编辑者只能回滚自己的文档）
+    
+    回滚不会删除历史版本，而是以目标版本的内容生成一个新版本
+    """
+    document = await get_document_or_404(db, document_id, current_user, with_content=True)
+    ensure_can_modify(document, current_user)
+    
+    content = await load_version_content(db, document_id, version_number)
+    if content is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Version not found"
+        )
+    
+    version = None
+    if content != (document.content or ""):
+        version = await build_version(
+            document.id,
+            await next_version_number(db, document.id),
+            content,
+            document.content,
+            current_user.id
+        )
+        db.add(version)
+        document.content = content
+        document.updated_at = datetime.utcnow()
+    await commit_document(db, document, reindex=version is not None)
+    if version is not None:
+        remember_version(document.id, version.version_number, content)
+        await vector_index.index_document(document.id, content, document.is_published, document.updated_at)
+    
+    log_operation(
+        user_id=current_user.id,
+        action="ROLLBACK",
+        resource_type="document",
+        resource_id=document.id,
+        description=f"Rolled back document {document.title} to version {version_number}",
+        ip_address=get_client_ip(request)
+    )
+    
+    return DocumentResponse.model_validate(document)
@@ -1,76 +1,332 @@
-from typing import Optional
+from typing import Optional, List
 from datetime import datetime
+import csv
+import io
 import json
-from sqlalchemy.orm import Session
+import zlib
+from sqlalchemy import select, func, delete, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 
-from database import get_db
+from config import settings
+from database import get_db, AsyncSessionLocal
 from models import User, OperationLog
 from schemas import OperationLogResponse, OperationLogListResponse
-from security import get_current_user
+from responses import FastJSONResponse
+from security import require_admin, Principal
+from pagination import encode_cursor, decode_time_id_cursor
+from log_retention import read_archived_logs, log_retention, ARCHIVE_FIELDS
+from log_sink import log_operation
+from log_stats import query_stats, remove_rollups, GROUP_COLUMNS
+from routes.auth import get_client_ip
 
 router = APIRouter(prefix="/logs", tags=["logs"])
 
+# 日志列表按ARCHIVE_FIELDS（与OperationLogResponse字段一致）选择列，行直接转换为dict
+LOG_COLUMNS = tuple(getattr(OperationLog, field) for field in ARCHIVE_FIELDS)
 
-async def require_admin(current_user: User = Depends(get_current_user)):
-    """检查管理员权限"""
-    roles = json.loads(current_user.roles) if isinstance(current_user.roles, str) else current_user.roles
-    if isinstance(roles, str):
-        roles = [roles]
+
+async def paginate_logs(
+    db: AsyncSession,
+    query,
+    limit: int,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    count: str = "none",
+    archive_filters: Optional[dict] = None
+) -> dict:
+    """按 (created_at, id) 倒序做游标分页，返回OperationLogListResponse结构的dict
     
-    if "admin" not in roles:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only admins can view operation logs"
+    - query: 按LOG_COLUMNS选择列的查询
+    - cursor为上一页返回的next_cursor；不传cursor时兼容旧的skip分页
+    - count: none不统计总数，estimate最多统计LOG_COUNT_ESTIMATE_CAP条，exact精确统计
+      （只统计数据库中的记录，不含归档）
+    - archive_filters: 不为None时，数据库记录不足一页则继续读取归档日志；每次请求最多读取
+      LOG_ARCHIVE_MAX_SCAN_DAYS天的归档，达到上限时本页可能不足limit条，但仍返回next_cursor
+    """
+    total = None
+    total_is_estimate = False
+    if count == "exact":
+        total = await db.scalar(select(func.count()).select_from(query.subquery()))
+    elif count == "estimate":
+        cap = settings.LOG_COUNT_ESTIMATE_CAP
+        total = await db.scalar(
+            select(func.count()).select_from(query.limit(cap).subquery())
+        )
+        total_is_estimate = total >= cap
+    
+    position = decode_time_id_cursor(cursor)
+    if position:
+        query = query.where(
+            tuple_(OperationLog.created_at, OperationLog.id) < tuple_(*position)
+        )
+    elif skip:
+        query = query.offset(skip)
+    
+    # 多取一条判断是否还有下一页
+    rows = await db.execute(
+        query.order_by(OperationLog.created_at.desc(), OperationLog.id.desc()).limit(limit + 1)
+    )
+    items = [dict(zip(ARCHIVE_FIELDS, row)) for row in rows]
+    
+    resume_before = None
+    if archive_filters is not None and len(items) <= limit:
+        # 归档日志总是早于数据库中剩余的日志，从当前位置继续向前读取
+        before = (items[-1]["created_at"], items[-1]["id"]) if items else position
+        archived, resume_before = await run_in_threadpool(
+            read_archived_logs, limit + 1 - len(items), before, **archive_filters
         )
-    return current_user
+        items.extend({field: row[field] for field in ARCHIVE_FIELDS} for row in archived)
+    
+    has_more = len(items) > limit
+    items = items[:limit]
+    if has_more:
+        next_cursor = encode_cursor(items[-1]["created_at"], items[-1]["id"])
+    elif resume_before:
+        # 本次读取的归档天数已达上限，从已读最早一天之前继续
+        next_cursor = encode_cursor(*resume_before)
+    else:
+        next_cursor = None
+    
+    return {
+        "total": total,
+        "total_is_estimate": total_is_estimate,
+        "next_cursor": next_cursor,
+        "items": items,
+    }
 
 
 @router.get("", response_model=OperationLogListResponse)
 async def get_operation_logs(
-    skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    count: str = Query("none", pattern="^(none|estimate|exact)$"),
     user_id: Optional[int] = None,
     action: Optional[str] = None,
     resource_type: Optional[str] = None,
-    current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    include_archived: bool = False,
+    current_user: Principal = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     获取操作日志（仅管理员）
     
-    - **skip**: 跳过的记录数
     - **limit**: 返回的记录数
+    - **cursor**: 分页游标，取上一页返回的next_cursor
+    - **skip**: 跳过的记录数（已废弃，仅在不传cursor时生效）
+    - **count**: 总数统计方式 none/estimate/exact
     - **user_id**: 按用户ID过滤（可选）
     - **action**: 按操作类型过滤（可选）
     - **resource_type**: 按资源类型过滤（可选）
+    - **start_time** / **end_time**: 按时间范围过滤，左闭右开（可选）
+    - **include_archived**: 是否包含已归档的日志
     """
-    query = db.query(OperationLog)
+    query = select(*LOG_COLUMNS)
     
     if user_id:
-        query = query.filter(OperationLog.user_id == user_id)
+        query = query.where(OperationLog.user_id == user_id)
     if action:
-        query = query.filter(OperationLog.action == action)
+        query = query.where(OperationLog.action == action)
     if resource_type:
-        query = query.filter(OperationLog.resource_type == resource_type)
+        query = query.where(OperationLog.resource_type == resource_type)
+    if start_time:
+        query = query.where(OperationLog.created_at >= start_time)
+    if end_time:
+        query = query.where(OperationLog.created_at < end_time)
     
-    total = query.count()
-    logs = query.order_by(OperationLog.created_at.desc()).offset(skip).limit(limit).all()
+    archive_filters = None
+    if include_archived:
+        archive_filters = {
+            "user_id": user_id,
+            "action": action,
+            "resource_type": resource_type,
+            "start_time": start_time,
+            "end_time": end_time,
+        }
     
-    return OperationLogListResponse(
-        total=total,
-        items=[OperationLogResponse.model_validate(log) for log in logs]
+    # 列元组直接构建响应，跳过ORM对象和response_model的重复校验
+    return FastJSONResponse(await paginate_logs(
+        db, query, limit, cursor=cursor, skip=skip, count=count,
+        archive_filters=archive_filters
+    ))
+
+
+def encode_export_rows(rows, fmt: str, header: bool = False) -> str:
+    """将一批日志行编码为NDJSON或CSV文本"""
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if header:
+            writer.writerow(ARCHIVE_FIELDS)
+        writer.writerows(
+            [row[0], row[1], row[2], row[3], row[4], row[5], row[6].isoformat(), row[7]]
+            for row in rows
+        )
+        return buffer.getvalue()
+    return "".join(
+        json.dumps(dict(zip(ARCHIVE_FIELDS, row)), ensure_ascii=False, default=datetime.isoformat) + "\n"
+        for row in rows
     )
 
 
+@router.get("/export")
+async def export_operation_logs(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    compress: bool = False,
+    user_id: Optional[int] = None,
+    action: Optional[str] = None,
+    resource_type: Optional[str] = None,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    current_user: Principal = Depends(require_admin)
+):
+    """
+    流式导出操作日志（仅管理员）
+    
+    - **format**: ndjson 或 csv
+    - **compress**: 是否gzip压缩输出
+    - 过滤条件与 /logs 相同，时间范围左闭右开
+    
+    使用服务端游标分批读取（yield_per），内存占用与结果集大小无关
+    """
+    query = select(*(getattr(OperationLog, f) for f in ARCHIVE_FIELDS))
+    if user_id:
+        query = query.where(OperationLog.user_id == user_id)
+    if action:
+        query = query.where(OperationLog.action == action)
+    if resource_type:
+        query = query.where(OperationLog.resource_type == resource_type)
+    if start_time:
+        query = query.where(OperationLog.created_at >= start_time)
+    if end_time:
+        query = query.where(OperationLog.created_at < end_time)
+    query = query.order_by(OperationLog.created_at, OperationLog.id).execution_options(
+        yield_per=settings.LOG_EXPORT_BATCH_SIZE
+    )
+    
+    async def generate():
+        # 依赖注入的会话在响应开始前就会关闭，流式读取使用独立会话
+        compressor = zlib.compressobj(wbits=31) if compress else None
+        header = True
+        async with AsyncSessionLocal() as db:
+            result = await db.stream(query)
+            async for rows in result.partitions():
+                data = encode_export_rows(rows, format, header=header).encode("utf-8")
+                header = False
+                if compressor:
+                    data = compressor.compress(data)
+                if data:
+                    yield data
+        if header and format == "csv":
+            # 没有数据时也输出表头
+            data = encode_export_rows([], format, header=True).encode("utf-8")
+            yield compressor.compress(data) if compressor else data
+        if compressor:
+            yield compressor.flush()
+    
+    log_operation(
+        user_id=current_user.id,
+        action="EXPORT",
+        resource_type="log",
+        description=f"Exported operation logs as {format}",
+        ip_address=get_client_ip(request)
+    )
+    
+    filename = f"operation_logs.{'csv' if format == 'csv' else 'ndjson'}"
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    if compress:
+        filename += ".gz"
+        media_type = "application/gzip"
+    return StreamingResponse(
+        generate(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.get("/stats")
+async def get_operation_log_stats(
+    group_by: List[str] = Query(["action"]),
+    granularity: str = Query("day", pattern="^(minute|hour|day)$"),
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    user_id: Optional[int] = None,
+    action: Optional[str] = None,
+    resource_type: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    current_user: Principal = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    操作日志统计（仅管理员）
+    
+    - **group_by**: 分组维度，可多选 action/resource_type/user/time（user为0表示未知用户名的登录失败）
+    - **granularity**: 时间桶粒度 minute/hour/day
+    - **start_time** / **end_time**: 时间范围（按时间桶对齐）
+    
+    数据来自写入路径增量维护的汇总表，不扫描operation_logs
+    """
+    invalid = [dim for dim in group_by if dim not in GROUP_COLUMNS]
+    if invalid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid group_by: {', '.join(invalid)}"
+        )
+    
+    items = await query_stats(
+        db,
+        group_by=list(dict.fromkeys(group_by)),
+        granularity=granularity,
+        start_time=start_time,
+        end_time=end_time,
+        user_id=user_id,
+        action=action,
+        resource_type=resource_type,
+        limit=limit
+    )
+    return {
+        "success": True,
+        "data": {
+            "granularity": granularity,
+            "group_by": group_by,
+            "items": items
+        },
+        "message": ""
+    }
+
+
+@router.post("/retention/run")
+async def run_log_retention(
+    current_user: Principal = Depends(require_admin)
+):
+    """立即执行一次日志保留策略：归档并清理过期日志（仅管理员）"""
+    if not log_retention.enabled:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Log retention policy is not configured"
+        )
+    result = await run_in_threadpool(log_retention.run_once)
+    return {
+        "success": True,
+        "data": result,
+        "message": f"{result['deleted']} operation logs archived and removed"
+    }
+
+
 @router.get("/{log_id}", response_model=OperationLogResponse)
 async def get_operation_log(
     log_id: int,
-    current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
 ):
     """获取单条操作日志详情（仅管理员）"""
-    log = db.query(OperationLog).filter(OperationLog.id == log_id).first()
+    log = await db.get(OperationLog, log_id)
     if not log:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -79,50 +335,56 @@ async def get_operation_log(
     return OperationLogResponse.model_validate(log)
 
 
-@router.get("/user/{user_id}")
+@router.get("/user/{user_id}", response_model=OperationLogListResponse)
 async def get_user_operation_logs(
     user_id: int,
-    skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
-    current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    count: str = Query("none", pattern="^(none|estimate|exact)$"),
+    include_archived: bool = False,
+    current_user: Principal = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
 ):
     """获取特定用户的操作日志（仅管理员）"""
-    # 验证用户是否存在
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+    # 验证用户是否存在（只查主键，不加载角色和权限）
+    if await db.scalar(select(User.id).where(User.id == user_id)) is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    total = db.query(OperationLog).filter(OperationLog.user_id == user_id).count()
-    logs = db.query(OperationLog).filter(
-        OperationLog.user_id == user_id
-    ).order_by(OperationLog.created_at.desc()).offset(skip).limit(limit).all()
-    
-    return {
-        "total": total,
-        "items": [OperationLogResponse.model_validate(log) for log in logs]
-    }
+    query = select(*LOG_COLUMNS).where(OperationLog.user_id == user_id)
+    archive_filters = {"user_id": user_id} if include_archived else None
+    return FastJSONResponse(await paginate_logs(
+        db, query, limit, cursor=cursor, skip=skip, count=count,
+        archive_filters=archive_filters
+    ))
 
 
 @router.delete("/{log_id}")
 async def delete_operation_log(
     log_id: int,
-    current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
 ):
     """删除操作日志（仅管理员）"""
-    log = db.query(OperationLog).filter(OperationLog.id == log_id).first()
+    log = await db.get(OperationLog, log_id)
     if not log:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Operation log not found"
         )
     
-    db.delete(log)
-    db.commit()
+    rows = [{
+        "created_at": log.created_at,
+        "user_id": log.user_id,
+        "action": log.action,
+        "resource_type": log.resource_type,
+    }]
+    await db.delete(log)
+    await db.run_sync(lambda session: remove_rollups(session.connection(), rows))
+    await db.commit()
     
     return {"success": True, "message": "Operation log deleted successfully"}
 
@@ -130,12 +392,22 @@ async def delete_operation_log(
 @router.delete("")
 async def delete_operation_logs_batch(
     log_ids: list[int],
-    current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
 ):
     """批量删除操作日志（仅管理员）"""
-    deleted_count = db.query(OperationLog).filter(OperationLog.id.in_(log_ids)).delete()
-    db.commit()
+    rows = (await db.execute(
+        select(
+            OperationLog.created_at,
+            OperationLog.user_id,
+            OperationLog.action,
+            OperationLog.resource_type,
+        ).where(OperationLog.id.in_(log_ids))
+    )).mappings().all()
+    result = await db.execute(delete(OperationLog).where(OperationLog.id.in_(log_ids)))
+    await db.run_sync(lambda session: remove_rollups(session.connection(), rows))
+    await db.commit()
+    deleted_count = result.rowcount
     
     return {
         "success": True,
@@ -0,0 +1,122 @@
+from fastapi import APIRouter, Depends
+
+from security import require_admin, principal_cache, token_cache, password_pool, Principal
+from log_sink import log_sink
+from log_retention import log_retention
+from token_revocation import revocation_store
+from rate_limit import login_throttle
+from sql_profiler import sql_profiler
+from database import get_pool_stats
+from version_store import version_cache
+from version_diff import diff_cache
+import search_index
+import vector_index
+from ai_gateway import ai_gateway
+
+router = APIRouter(prefix="/monitor", tags=["monitor"])
+
+
+@router.get("/cache")
+async def get_cache_stats(current_user: Principal = Depends(require_admin)):
+    """获取各缓存的命中统计（仅管理员）"""
+    return {
+        "success": True,
+        "data": {
+            "principal_cache": principal_cache.stats(),
+            "token_cache": token_cache.stats() if token_cache is not None else None,
+            "token_revocation": revocation_store.stats(),
+            "version_cache": version_cache.stats(),
+            "diff_cache": diff_cache.stats(),
+        },
+        "message": ""
+    }
+
+
+@router.get("/log-sink")
+async def get_log_sink_stats(current_user: Principal = Depends(require_admin)):
+    """获取操作日志写入队列的统计信息（仅管理员）"""
+    return {
+        "success": True,
+        "data": log_sink.stats(),
+        "message": ""
+    }
+
+
+@router.get("/login-throttle")
+async def get_login_throttle_stats(current_user: Principal = Depends(require_admin)):
+    """获取登录限流的统计信息（仅管理员）"""
+    return {
+        "success": True,
+        "data": login_throttle.stats(),
+        "message": ""
+    }
+
+
+@router.get("/sql-profiler")
+async def get_sql_profiler_stats(current_user: Principal = Depends(require_admin)):
+    """获取SQL性能分析统计和最近的慢查询/N+1记录（仅管理员）"""
+    return {
+        "success": True,
+        "data": sql_profiler.stats(),
+        "message": ""
+    }
+
+
+@router.get("/password-pool")
+async def get_password_pool_stats(current_user: Principal = Depends(require_admin)):
+    """获取密码哈希线程池的统计信息（仅管理员）"""
+    return {
+        "success": True,
+        "data": password_pool.stats(),
+        "message": ""
+    }
+
+
+@router.get("/log-retention")
+async def get_log_retention_stats(current_user: Principal = Depends(require_admin)):
+    """获取日志保留/归档任务的统计信息（仅管理员）"""
+    return {
+        "success": True,
+        "data": log_retention.stats(),
+        "message": ""
+    }
+
+
+@router.get("/pool")
+async def get_database_pool_stats(current_user: Principal = Depends(require_admin)):
+    """获取数据库连接池的统计信息（仅管理员）"""
+    return {
+        "success": True,
+        "data": get_pool_stats(),
+        "message": ""
+    }
+
+
+@router.get("/search")
+async def get_search_index_stats(current_user: Principal = Depends(require_admin)):
+    """获取全文检索索引的统计信息（仅管理员）"""
+    return {
+        "success": True,
+        "data": search_index.search_backend.stats(),
+        "message": ""
+    }
+
+
+@router.get("/vector-index")
+async def get_vector_index_stats(current_user: Principal = Depends(require_admin)):
+    """获取问答向量索引的统计信息（仅管理员）"""
+    return {
+        "success": True,
+        "data": vector_index.vector_index.stats(),
+        "message": ""
+    }
+
+
+@router.get("/ai-gateway")
+async def get_ai_gateway_stats(current_user: Principal = Depends(require_admin)):
+    """获取AI网关的批处理、缓存和并发统计（仅管理员）"""
+    return {
+        "success": True,
+        "data": ai_gateway.stats(),
+        "message": ""
+    }
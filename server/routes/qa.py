@@ -0,0 +1,139 @@
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Depends, Request
+from fastapi.concurrency import run_in_threadpool
+
+from database import get_db
+from schemas import QASearchRequest, QAChunk, QASearchResponse, QAAskRequest, QAAnswerResponse
+from security import check_permission, require_admin, Principal
+from enums import PermissionEnum
+from log_sink import log_operation
+import vector_index
+from ai_gateway import ai_gateway, build_prompt, document_context, sse_stream, LimitedStreamingResponse
+from routes.auth import get_client_ip
+from routes.documents import can_read_drafts
+from routes.ai import SSE_HEADERS
+
+router = APIRouter(prefix="/qa", tags=["qa"])
+
+
+@router.post("/search", response_model=QASearchResponse)
+async def search(
+    search_data: QASearchRequest,
+    current_user: Principal = Depends(check_permission(PermissionEnum.QA_USE)),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    检索与问题最相关的文档片段
+    
+    - **query**: 问题
+    - **top_k**: 返回的片段数
+    - **mode**: exact为暴力检索，ivf为近似检索（未训练IVF时按exact执行），默认取配置
+    """
+    hits = await vector_index.search_chunks(
+        db,
+        search_data.query,
+        search_data.top_k,
+        include_drafts=can_read_drafts(current_user),
+        mode=search_data.mode
+    )
+    return QASearchResponse(
+        query=search_data.query,
+        items=[QAChunk(**hit) for hit in hits]
+    )
+
+
+@router.post("/ask", response_model=QAAnswerResponse)
+async def ask(
+    ask_data: QAAskRequest,
+    current_user: Principal = Depends(check_permission(PermissionEnum.QA_USE)),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    知识库问答：检索最相关的片段作为参考内容，再由模型生成回答
+    
+    - **question**: 问题
+    - **top_k**: 参考片段数
+    - **stream**: 为true时以SSE返回（sources事件为参考片段，delta事件逐段输出，done事件结束）
+    """
+    hits = await vector_index.search_chunks(
+        db, ask_data.question, ask_data.top_k, include_drafts=can_read_drafts(current_user)
+    )
+    sources = [QAChunk(**hit) for hit in hits]
+    context = await document_context(db, [hit["document_id"] for hit in hits])
+    prompt = build_prompt(ask_data.question, [(hit["title"], hit["text"]) for hit in hits])
+    
+    ai_gateway.limiter.acquire(current_user.id, PermissionEnum.QA_USE)
+    if ask_data.stream:
+        return LimitedStreamingResponse(
+            sse_stream(
+                prompt, context, ask_data.max_tokens,
+                first_event=("sources", [source.model_dump() for source in sources])
+            ),
+            release=lambda: ai_gateway.limiter.release(current_user.id, PermissionEnum.QA_USE),
+            media_type="text/event-stream",
+            headers=SSE_HEADERS
+        )
+    try:
+        answer, cached = await ai_gateway.complete(prompt, context, ask_data.max_tokens)
+    finally:
+        ai_gateway.limiter.release(current_user.id, PermissionEnum.QA_USE)
+    
+    return QAAnswerResponse(question=ask_data.question, answer=answer, cached=cached, sources=sources)
+
+
+@router.post("/index/rebuild")
+async def rebuild_index(
+    request: Request,
+    train_ivf: bool = False,
+    nlist: Optional[int] = None,
+    current_user: Principal = Depends(require_admin)
+):
+    """
+    重新计算全部文档的向量（仅管理员）
+    
+    - **train_ivf**: 重建后是否训练IVF桶中心
+    - **nlist**: IVF桶数量，默认为片段数的平方根
+    """
+    documents = await run_in_threadpool(vector_index.init_vector_index, True)
+    lists = 0
+    if train_ivf:
+        lists = await run_in_threadpool(vector_index.vector_index.train_ivf, nlist)
+    
+    log_operation(
+        user_id=current_user.id,
+        action="UPDATE",
+        resource_type="system",
+        description=f"Rebuilt vector index ({documents} documents, {lists} IVF lists)",
+        ip_address=get_client_ip(request)
+    )
+    
+    return {
+        "success": True,
+        "data": {"documents": documents, "ivf_lists": lists},
+        "message": "Vector index rebuilt"
+    }
+
+
+@router.post("/index/train-ivf")
+async def train_ivf(
+    request: Request,
+    nlist: Optional[int] = None,
+    current_user: Principal = Depends(require_admin)
+):
+    """训练IVF桶中心并重新分配全部向量（仅管理员）"""
+    lists = await run_in_threadpool(vector_index.vector_index.train_ivf, nlist)
+    
+    log_operation(
+        user_id=current_user.id,
+        action="UPDATE",
+        resource_type="system",
+        description=f"Trained vector index IVF ({lists} lists)",
+        ip_address=get_client_ip(request)
+    )
+    
+    return {
+        "success": True,
+        "data": {"ivf_lists": lists},
+        "message": "IVF trained"
+    }
@@ -1,62 +1,131 @@
-from typing import Optional
-import json
+from typing import List, Optional
 from datetime import datetime
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func, delete
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 
 from database import get_db
-from models import User, OperationLog
+from models import User, Role, Permission, UserRole, RolePermission, UserPermission, Document, OperationLog
 from schemas import UserResponse, UserListResponse, UserCreate, UserUpdate
-from security import hash_password, get_current_user
-from enums import ROLE_PERMISSIONS
+from security import hash_password_async, require_admin, invalidate_principal, Principal
+from enums import WILDCARD_PERMISSIONS
+from log_sink import log_operation
+from log_stats import remove_user_rollups
+from responses import FastJSONResponse
+import search_index
+import version_store
+import version_diff
+import vector_index
+from ai_gateway import ai_gateway
 
 router = APIRouter(prefix="/users", tags=["users"])
 
+# 用户列表只读取响应需要的列（不含密码哈希），不构建ORM对象
+USER_LIST_COLUMNS = (
+    User.id, User.username, User.email, User.nickname, User.avatar,
+    User.is_active, User.created_at, User.last_login,
+)
 
-async def require_admin(current_user: User = Depends(get_current_user)):
-    """检查管理员权限"""
-    roles = json.loads(current_user.roles) if isinstance(current_user.roles, str) else current_user.roles
-    if isinstance(roles, str):
-        roles = [roles]
-    
-    if "admin" not in roles:
+
+async def resolve_roles(db: AsyncSession, names: List[str]) -> List[Role]:
+    """角色名（不区分大小写）转换为Role，存在未知角色时返回400"""
+    names = list(dict.fromkeys(name.lower() for name in names))
+    roles = (await db.scalars(select(Role).where(Role.name.in_(names)))).all()
+    unknown = set(names) - {role.name for role in roles}
+    if unknown:
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only admins can access this resource"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown roles: {', '.join(sorted(unknown))}"
         )
-    return current_user
+    return list(roles)
+
+
+async def user_list_items(db: AsyncSession, query) -> list:
+    """执行按USER_LIST_COLUMNS选择的查询，附加角色名，返回与UserResponse字段一致的dict列表"""
+    rows = (await db.execute(query)).all()
+    if not rows:
+        return []
+    role_names = {}
+    role_rows = await db.execute(
+        select(UserRole.user_id, Role.name)
+        .join(Role, Role.id == UserRole.role_id)
+        .where(UserRole.user_id.in_([row[0] for row in rows]))
+        .order_by(Role.name)
+    )
+    for user_id, name in role_rows:
+        role_names.setdefault(user_id, []).append(name)
+    return [
+        {
+            "id": user_id,
+            "username": username,
+            "email": email,
+            "nickname": nickname,
+            "avatar": avatar,
+            "roles": role_names.get(user_id, []),
+            "is_active": is_active,
+            "created_at": created_at,
+            "last_login": last_login,
+        }
+        for user_id, username, email, nickname, avatar, is_active, created_at, last_login in rows
+    ]
 
 
 @router.get("", response_model=UserListResponse)
 async def list_users(
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
-    current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    role: Optional[str] = Query(None, max_length=50),
+    permission: Optional[str] = Query(None, max_length=100),
+    current_user: Principal = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     获取用户列表（仅管理员）
     
     - **skip**: 跳过的记录数
     - **limit**: 返回的记录数
+    - **role**: 只返回拥有该角色的用户
+    - **permission**: 只返回拥有该权限的用户（通过角色、单独授权或通配权限）
     """
-    total = db.query(User).count()
-    users = db.query(User).offset(skip).limit(limit).all()
+    filters = []
+    if role:
+        filters.append(User.id.in_(
+            select(UserRole.user_id)
+            .join(Role, Role.id == UserRole.role_id)
+            .where(Role.name == role.lower())
+        ))
+    if permission:
+        codes = [permission, *WILDCARD_PERMISSIONS]
+        via_roles = (
+            select(UserRole.user_id)
+            .join(RolePermission, RolePermission.role_id == UserRole.role_id)
+            .join(Permission, Permission.id == RolePermission.permission_id)
+            .where(Permission.code.in_(codes))
+        )
+        direct = (
+            select(UserPermission.user_id)
+            .join(Permission, Permission.id == UserPermission.permission_id)
+            .where(Permission.code.in_(codes))
+        )
+        filters.append(User.id.in_(via_roles.union(direct)))
     
-    return UserListResponse(
-        total=total,
-        items=[UserResponse.model_validate(user) for user in users]
+    total = await db.scalar(select(func.count()).select_from(User).where(*filters))
+    items = await user_list_items(
+        db, select(*USER_LIST_COLUMNS).where(*filters).order_by(User.id).offset(skip).limit(limit)
     )
+    
+    # 列元组直接构建响应，跳过ORM对象和response_model的重复校验
+    return FastJSONResponse({"total": total, "items": items})
 
 
 @router.get("/{user_id}", response_model=UserResponse)
 async def get_user(
     user_id: int,
-    current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
 ):
     """获取用户详情（仅管理员）"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -68,8 +137,8 @@ async def get_user(
 @router.post("", response_model=UserResponse)
 async def create_user(
     user_data: UserCreate,
-    current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     创建新用户（仅管理员）
@@ -81,7 +150,7 @@ async def create_user(
     - **roles**: 角色列表
     """
     # 检查用户名是否已存在
-    existing_user = db.query(User).filter(User.username == user_data.username).first()
+    existing_user = await db.scalar(select(User).where(User.username == user_data.username))
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -89,44 +158,39 @@ async def create_user(
         )
     
     # 检查邮箱是否已存在
-    existing_email = db.query(User).filter(User.email == user_data.email).first()
+    existing_email = await db.scalar(select(User).where(User.email == user_data.email))
     if existing_email:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already exists"
         )
     
-    # 获取权限
-    permissions = []
-    for role in user_data.roles:
-        if role.lower() in ROLE_PERMISSIONS:
-            permissions.extend(ROLE_PERMISSIONS[role.lower()])
+    # 角色的权限由role_permissions关联得到，用户行只保存角色关联
+    roles = await resolve_roles(db, user_data.roles)
     
     # 创建用户
     new_user = User(
         username=user_data.username,
-        password=hash_password(user_data.password),
+        password=await hash_password_async(user_data.password),
         email=user_data.email,
         nickname=user_data.nickname,
-        roles=json.dumps(user_data.roles),
-        permissions=json.dumps(list(set(permissions))),  # 去重
+        roles=roles,
+        extra_permissions=[],
         is_active=True
     )
     
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     
     # 记录操作日志
-    log = OperationLog(
+    log_operation(
         user_id=current_user.id,
         action="CREATE",
         resource_type="user",
         resource_id=new_user.id,
         description=f"Created user {new_user.username}"
     )
-    db.add(log)
-    db.commit()
     
     return UserResponse.model_validate(new_user)
 
@@ -135,8 +199,8 @@ async def create_user(
 async def update_user(
     user_id: int,
     user_data: UserUpdate,
-    current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     更新用户信息（仅管理员）
@@ -146,7 +210,7 @@ async def update_user(
     - **avatar**: 头像URL
     - **roles**: 角色列表
     """
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -155,10 +219,10 @@ async def update_user(
     
     # 检查邮箱是否已被其他用户使用
     if user_data.email and user_data.email != user.email:
-        existing_email = db.query(User).filter(
+        existing_email = await db.scalar(select(User).where(
             User.email == user_data.email,
             User.id != user_id
-        ).first()
+        ))
         if existing_email:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -173,28 +237,22 @@ async def update_user(
     if user_data.avatar:
         user.avatar = user_data.avatar
     if user_data.roles:
-        permissions = []
-        for role in user_data.roles:
-            if role.lower() in ROLE_PERMISSIONS:
-                permissions.extend(ROLE_PERMISSIONS[role.lower()])
-        user.roles = json.dumps(user_data.roles)
-        user.permissions = json.dumps(list(set(permissions)))
+        user.roles = await resolve_roles(db, user_data.roles)
     
     user.updated_at = datetime.utcnow()
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
+    invalidate_principal(user_id)
     
     # 记录操作日志
-    log = OperationLog(
+    log_operation(
         user_id=current_user.id,
         action="UPDATE",
         resource_type="user",
         resource_id=user_id,
         description=f"Updated user {user.username}"
     )
-    db.add(log)
-    db.commit()
     
     return UserResponse.model_validate(user)
 
@@ -202,8 +260,8 @@ async def update_user(
 @router.delete("/{user_id}")
 async def delete_user(
     user_id: int,
-    current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
 ):
     """删除用户（仅管理员，不能删除自己）"""
     if user_id == current_user.id:
@@ -212,7 +270,7 @@ async def delete_user(
             detail="Cannot delete yourself"
         )
     
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -220,19 +278,33 @@ async def delete_user(
         )
     
     username = user.username
-    db.delete(user)
-    db.commit()
+    # 用户的文档随用户级联删除，先取出文档id，在同一事务中清理其检索索引
+    document_ids = (await db.scalars(
+        select(Document.id).where(Document.author_id == user_id)
+    )).all()
+    for document_id in document_ids:
+        await search_index.remove_document(db, document_id)
+    # 用户的操作日志批量删除（不经过ORM级联逐行加载），同一事务中扣除其统计汇总
+    await db.execute(delete(OperationLog).where(OperationLog.user_id == user_id))
+    await db.run_sync(lambda session: remove_user_rollups(session.connection(), user_id))
+    await db.delete(user)
+    await db.commit()
+    invalidate_principal(user_id)
+    for document_id in document_ids:
+        version_store.forget_document(document_id)
+        version_diff.forget_document(document_id)
+        ai_gateway.forget_document(document_id)
+    if document_ids:
+        vector_index.remove_documents(document_ids)
     
     # 记录操作日志
-    log = OperationLog(
+    log_operation(
         user_id=current_user.id,
         action="DELETE",
         resource_type="user",
         resource_id=user_id,
         description=f"Deleted user {username}"
     )
-    db.add(log)
-    db.commit()
     
     return {"success": True, "message": f"User {username} deleted successfully"}
 
@@ -240,8 +312,8 @@ async def delete_user(
 @router.put("/{user_id}/status")
 async def toggle_user_status(
     user_id: int,
-    current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
 ):
     """切换用户激活状态（仅管理员）"""
     if user_id == current_user.id:
@@ -250,7 +322,7 @@ async def toggle_user_status(
             detail="Cannot change your own status"
         )
     
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -259,18 +331,17 @@ async def toggle_user_status(
     
     user.is_active = not user.is_active
     db.add(user)
-    db.commit()
+    await db.commit()
+    invalidate_principal(user_id)
     
     # 记录操作日志
-    log = OperationLog(
+    log_operation(
         user_id=current_user.id,
         action="UPDATE",
         resource_type="user",
         resource_id=user_id,
         description=f"{'Activated' if user.is_active else 'Deactivated'} user {user.username}"
     )
-    db.add(log)
-    db.commit()
     
     return {
         "success": True,
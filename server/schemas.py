@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, field_validator
 from typing import Optional, List
 from datetime import datetime
 
@@ -40,6 +40,11 @@ class RefreshTokenRequest(BaseModel):
     refreshToken: str
 
 
+class LogoutRequest(BaseModel):
+    """登出请求"""
+    refreshToken: Optional[str] = None
+
+
 class RefreshTokenResponse(BaseModel):
     """刷新token响应"""
     success: bool
@@ -77,6 +82,12 @@ class UserResponse(BaseModel):
     created_at: datetime
     last_login: Optional[datetime]
     
+    @field_validator("roles", mode="before")
+    @classmethod
+    def role_names(cls, roles):
+        """用户模型的roles为Role对象列表，转换为角色名"""
+        return [getattr(role, "name", role) for role in roles]
+    
     class Config:
         from_attributes = True
 
@@ -106,7 +117,20 @@ class DocumentResponse(BaseModel):
     """文档响应"""
     id: int
     title: str
-    content: str
+    content: Optional[str]
+    author_id: int
+    is_published: bool
+    created_at: datetime
+    updated_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+
+class DocumentSummary(BaseModel):
+    """文档摘要（列表使用，不含正文）"""
+    id: int
+    title: str
     author_id: int
     is_published: bool
     created_at: datetime
@@ -117,16 +141,134 @@ class DocumentResponse(BaseModel):
 
 
 class DocumentListResponse(BaseModel):
-    """文档列表响应"""
-    total: int
-    items: List[DocumentResponse]
+    """文档列表响应（游标分页）"""
+    next_cursor: Optional[str] = None
+    items: List[DocumentSummary]
+
+
+class DocumentSearchHit(BaseModel):
+    """文档检索结果"""
+    id: int
+    title: str
+    author_id: int
+    is_published: bool
+    updated_at: datetime
+    score: float
+    snippet: Optional[str] = None
+
+
+class DocumentSearchResponse(BaseModel):
+    """文档检索响应（按相关度排序）"""
+    query: str
+    has_more: bool
+    items: List[DocumentSearchHit]
+
+
+class DocumentVersionSummary(BaseModel):
+    """文档版本摘要"""
+    version_number: int
+    storage: str
+    content_size: int
+    created_by: int
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+
+class DocumentVersionListResponse(BaseModel):
+    """文档版本列表响应"""
+    document_id: int
+    items: List[DocumentVersionSummary]
+
+
+class DocumentVersionResponse(BaseModel):
+    """文档版本详情（含还原后的全文）"""
+    document_id: int
+    version_number: int
+    content: str
+    created_by: int
+    created_at: datetime
+
+
+class DiffChange(BaseModel):
+    """对比片段：equal/insert/delete/replace，equal片段只返回old"""
+    op: str
+    old: Optional[str] = None
+    new: Optional[str] = None
+
+
+class DocumentDiffResponse(BaseModel):
+    """文档版本对比响应"""
+    document_id: int
+    from_version: int
+    to_version: int
+    mode: str
+    added: int
+    removed: int
+    changes: List[DiffChange]
+
+
+# ===== 问答检索相关 =====
+class QASearchRequest(BaseModel):
+    """问答检索请求"""
+    query: str = Field(..., min_length=1, max_length=1000)
+    top_k: int = Field(5, ge=1, le=20)
+    mode: Optional[str] = Field(None, pattern="^(exact|ivf)$")
+
+
+class QAChunk(BaseModel):
+    """检索命中的文档片段"""
+    document_id: int
+    title: str
+    start: int
+    text: str
+    score: float
+
+
+class QASearchResponse(BaseModel):
+    """问答检索响应（按相似度排序）"""
+    query: str
+    items: List[QAChunk]
+
+
+class QAAskRequest(BaseModel):
+    """问答请求：先检索相关片段，再由模型生成回答"""
+    question: str = Field(..., min_length=1, max_length=1000)
+    top_k: int = Field(5, ge=1, le=20)
+    max_tokens: Optional[int] = Field(None, ge=1, le=4096)
+    stream: bool = False
+
+
+class QAAnswerResponse(BaseModel):
+    """问答响应"""
+    question: str
+    answer: str
+    cached: bool
+    sources: List[QAChunk]
+
+
+# ===== AI调用相关 =====
+class AICompletionRequest(BaseModel):
+    """AI调用请求，document_ids为作为参考内容的文档"""
+    prompt: str = Field(..., min_length=1, max_length=8000)
+    document_ids: List[int] = Field(default_factory=list, max_length=20)
+    max_tokens: Optional[int] = Field(None, ge=1, le=4096)
+    stream: bool = False
+
+
+class AICompletionResponse(BaseModel):
+    """AI调用响应"""
+    answer: str
+    cached: bool
+    provider: str
 
 
 # ===== 操作日志相关 =====
 class OperationLogResponse(BaseModel):
     """操作日志响应"""
     id: int
-    user_id: int
+    user_id: Optional[int]
     action: str
     resource_type: str
     resource_id: Optional[int]
@@ -139,8 +281,10 @@ class OperationLogResponse(BaseModel):
 
 
 class OperationLogListResponse(BaseModel):
-    """操作日志列表响应"""
-    total: int
+    """操作日志列表响应（游标分页）"""
+    total: Optional[int] = None
+    total_is_estimate: bool = False
+    next_cursor: Optional[str] = None
     items: List[OperationLogResponse]
 
 
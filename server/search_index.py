@@ -0,0 +1,387 @@
+"""
+文档全文检索
+
+- 分词：拉丁文按单词（转小写），中日韩文本按相邻两字切分（bigram），单字保留原字
+- SQLite且支持FTS5时使用FTS5虚拟表（document_search，rowid即文档id），
+  与文档写入在同一事务中更新，使用内置bm25排序
+- 其他数据库使用进程内倒排索引（启动时从数据库构建），Python实现BM25排序；
+  写入在所在事务提交后才生效，回滚的修改不会进入索引
+- 查询中的每个连续片段作为一个短语，各片段之间为AND关系（内存索引不校验相邻位置）
+
+重建索引: python search_index.py --rebuild
+"""
+
+import argparse
+import asyncio
+import heapq
+import logging
+import math
+import re
+import sys
+import threading
+from array import array
+from collections import Counter
+from typing import Optional
+
+from sqlalchemy import select, func, text, event
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import engine
+from models import Document
+from version_diff import CJK_RANGES
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "document_search"
+
+TOKEN_PATTERN = re.compile(rf"[{CJK_RANGES}]+|[^\W{CJK_RANGES}]+")
+CJK_PATTERN = re.compile(rf"[{CJK_RANGES}]")
+
+# BM25参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# session.info中待提交后执行的内存索引修改
+PENDING_KEY = "search_index_pending"
+
+
+def _segment_tokens(segment: str) -> list:
+    if CJK_PATTERN.match(segment):
+        if len(segment) == 1:
+            return [segment]
+        return [segment[i:i + 2] for i in range(len(segment) - 1)]
+    return [segment]
+
+
+def tokenize(text_value: Optional[str]) -> list:
+    """把文本切分为索引词"""
+    tokens = []
+    for segment in TOKEN_PATTERN.findall((text_value or "").lower()):
+        tokens.extend(_segment_tokens(segment))
+    return tokens
+
+
+def query_segments(query: str) -> list:
+    """把查询切分为片段，每个片段为 (原文, 索引词列表)"""
+    return [(segment, _segment_tokens(segment)) for segment in TOKEN_PATTERN.findall(query.lower())]
+
+
+def fts_match_expression(segments: list) -> str:
+    """FTS5 MATCH表达式：每个片段为一个短语，片段之间AND"""
+    return " AND ".join('"' + " ".join(tokens) + '"' for _, tokens in segments)
+
+
+class FTS5SearchBackend:
+    """SQLite FTS5检索（索引词预先分好，FTS5只按空格切分）"""
+
+    name = "fts5"
+
+    def create(self, conn):
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+            f"USING fts5(title, body, tokenize='unicode61 remove_diacritics 0')"
+        ))
+
+    def is_empty(self, conn) -> bool:
+        return conn.execute(text(f"SELECT rowid FROM {FTS_TABLE} LIMIT 1")).first() is None
+
+    def clear(self, conn):
+        conn.execute(text(f"DELETE FROM {FTS_TABLE}"))
+
+    def bulk_index(self, conn, rows: list):
+        """rows: (id, title, content, is_published)"""
+        conn.execute(
+            text(f"INSERT INTO {FTS_TABLE}(rowid, title, body) VALUES (:id, :title, :body)"),
+            [
+                {"id": row[0], "title": " ".join(tokenize(row[1])), "body": " ".join(tokenize(row[2]))}
+                for row in rows
+            ]
+        )
+
+    async def index(self, db, document_id: int, title: str, content: str, is_published: bool):
+        body = await _tokenize_async(content)
+        await db.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {"id": document_id})
+        await db.execute(
+            text(f"INSERT INTO {FTS_TABLE}(rowid, title, body) VALUES (:id, :title, :body)"),
+            {"id": document_id, "title": " ".join(tokenize(title)), "body": " ".join(body)}
+        )
+
+    async def remove(self, db, document_id: int):
+        await db.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {"id": document_id})
+
+    async def search(self, db, segments: list, limit: int, offset: int, include_drafts: bool) -> list:
+        rank = f"bm25({FTS_TABLE}, {float(settings.SEARCH_TITLE_WEIGHT)}, 1.0)"
+        if include_drafts:
+            statement = (
+                f"SELECT rowid, -{rank} AS score FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH :query "
+            )
+        else:
+            # 只有需要过滤未发布文档时才关联documents表
+            statement = (
+                f"SELECT d.id, -{rank} AS score FROM {FTS_TABLE} "
+                f"JOIN documents d ON d.id = {FTS_TABLE}.rowid "
+                f"WHERE {FTS_TABLE} MATCH :query AND d.is_published = 1 "
+            )
+        result = await db.execute(
+            text(statement + f"ORDER BY {rank} LIMIT :limit OFFSET :offset"),
+            {"query": fts_match_expression(segments), "limit": limit, "offset": offset}
+        )
+        return [(row[0], row[1]) for row in result.all()]
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+
+class MemorySearchBackend:
+    """进程内倒排索引（非SQLite或SQLite不支持FTS5时使用）
+
+    倒排表使用array紧凑存储 (文档id, 词频)，标题中的词按SEARCH_TITLE_WEIGHT倍词频计入；
+    多进程部署时各进程分别维护索引，其他进程写入的文档在重启或重建前不可见
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        self._postings = {}       # term -> (array文档id, array词频)
+        self._doc_terms = {}      # document_id -> 文档包含的词（删除时使用）
+        self._doc_length = {}     # document_id -> 加权词数
+        self._published = {}      # document_id -> is_published
+        self._total_length = 0.0
+        self._lock = threading.Lock()
+
+    def create(self, conn):
+        pass
+
+    def is_empty(self, conn) -> bool:
+        return not self._doc_terms
+
+    def clear(self, conn=None):
+        with self._lock:
+            self._postings.clear()
+            self._doc_terms.clear()
+            self._doc_length.clear()
+            self._published.clear()
+            self._total_length = 0.0
+
+    def _term_counts(self, title: str, content: str) -> Counter:
+        counts = Counter(tokenize(content))
+        weight = settings.SEARCH_TITLE_WEIGHT
+        for term, tf in Counter(tokenize(title)).items():
+            counts[term] += tf * weight
+        return counts
+
+    def _remove_locked(self, document_id: int):
+        terms = self._doc_terms.pop(document_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            ids, tfs = self._postings[term]
+            position = ids.index(document_id)
+            del ids[position]
+            del tfs[position]
+            if not ids:
+                del self._postings[term]
+        self._total_length -= self._doc_length.pop(document_id)
+        self._published.pop(document_id, None)
+
+    def _add(self, document_id: int, counts: Counter, is_published: bool):
+        with self._lock:
+            self._remove_locked(document_id)
+            terms = []
+            for term, tf in counts.items():
+                term = sys.intern(term)
+                entry = self._postings.get(term)
+                if entry is None:
+                    entry = self._postings[term] = (array("i"), array("f"))
+                entry[0].append(document_id)
+                entry[1].append(tf)
+                terms.append(term)
+            self._doc_terms[document_id] = tuple(terms)
+            length = float(sum(counts.values()))
+            self._doc_length[document_id] = length
+            self._total_length += length
+            self._published[document_id] = bool(is_published)
+
+    def _remove(self, document_id: int):
+        with self._lock:
+            self._remove_locked(document_id)
+
+    def bulk_index(self, conn, rows: list):
+        for document_id, title, content, is_published in rows:
+            self._add(document_id, self._term_counts(title, content), is_published)
+
+    async def index(self, db, document_id: int, title: str, content: str, is_published: bool):
+        if len(content or "") > settings.DOCUMENT_DIFF_OFFLOAD_BYTES:
+            counts = await asyncio.to_thread(self._term_counts, title, content)
+        else:
+            counts = self._term_counts(title, content)
+        _after_commit(db, lambda: self._add(document_id, counts, is_published))
+
+    async def remove(self, db, document_id: int):
+        _after_commit(db, lambda: self._remove(document_id))
+
+    def _rank(self, terms: list, include_drafts: bool, top: int) -> list:
+        """AND语义的BM25排序：从最短的倒排表开始逐个求交集并累加得分"""
+        with self._lock:
+            postings = [self._postings.get(term) for term in terms]
+            if not postings or any(p is None for p in postings):
+                return []
+            postings.sort(key=lambda p: len(p[0]))
+            total_docs = len(self._doc_terms)
+            avg_length = self._total_length / total_docs if total_docs else 1.0
+            doc_length = self._doc_length
+            published = self._published
+
+            scores = None
+            for ids, tfs in postings:
+                idf = math.log(1 + (total_docs - len(ids) + 0.5) / (len(ids) + 0.5))
+                merged = {}
+                for document_id, tf in zip(ids, tfs):
+                    if scores is None:
+                        if not include_drafts and not published[document_id]:
+                            continue
+                        score = 0.0
+                    else:
+                        score = scores.get(document_id)
+                        if score is None:
+                            continue
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_length[document_id] / avg_length)
+                    merged[document_id] = score + idf * tf * (BM25_K1 + 1) / (tf + norm)
+                scores = merged
+                if not scores:
+                    return []
+        return heapq.nlargest(top, ((score, document_id) for document_id, score in scores.items()))
+
+    async def search(self, db, segments: list, limit: int, offset: int, include_drafts: bool) -> list:
+        terms = list(dict.fromkeys(token for _, tokens in segments for token in tokens))
+        ranked = await asyncio.to_thread(self._rank, terms, include_drafts, offset + limit)
+        return [(document_id, score) for score, document_id in ranked[offset:offset + limit]]
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "documents": len(self._doc_terms),
+            "terms": len(self._postings),
+            "postings": sum(len(ids) for ids, _ in self._postings.values()),
+        }
+
+
+def _after_commit(db, apply):
+    """登记在db所在事务提交后执行的修改"""
+    db.sync_session.info.setdefault(PENDING_KEY, []).append(apply)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending(session):
+    for apply in session.info.pop(PENDING_KEY, ()):
+        apply()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(PENDING_KEY, None)
+
+
+async def _tokenize_async(content: Optional[str]) -> list:
+    if len(content or "") > settings.DOCUMENT_DIFF_OFFLOAD_BYTES:
+        return await asyncio.to_thread(tokenize, content)
+    return tokenize(content)
+
+
+def fts5_available(engine) -> bool:
+    if engine.dialect.name != "sqlite":
+        return False
+    with engine.connect() as conn:
+        options = {row[0] for row in conn.execute(text("PRAGMA compile_options"))}
+    return "ENABLE_FTS5" in options
+
+
+def select_backend(engine):
+    """按SEARCH_BACKEND配置选择检索实现（auto：SQLite支持FTS5时使用FTS5）"""
+    if settings.SEARCH_BACKEND == "memory":
+        return MemorySearchBackend()
+    if settings.SEARCH_BACKEND == "fts5" or fts5_available(engine):
+        return FTS5SearchBackend()
+    return MemorySearchBackend()
+
+
+search_backend = select_backend(engine)
+
+
+def init_search_index(rebuild: bool = False) -> int:
+    """启动时创建索引，索引为空（或rebuild为True）时从documents表构建，返回索引的文档数"""
+    indexed = 0
+    with engine.begin() as conn:
+        search_backend.create(conn)
+        if not rebuild and not search_backend.is_empty(conn):
+            return 0
+        search_backend.clear(conn)
+        result = conn.execution_options(yield_per=1000).execute(
+            select(Document.id, Document.title, Document.content, Document.is_published)
+        )
+        for rows in result.partitions():
+            search_backend.bulk_index(conn, rows)
+            indexed += len(rows)
+    logger.info("Search index (%s) built with %d documents", search_backend.name, indexed)
+    return indexed
+
+
+async def index_document(db, document: Document):
+    """在当前事务中更新文档的索引（创建/更新/回滚后调用，提交前执行；内存索引在提交后生效）"""
+    await search_backend.index(db, document.id, document.title, document.content, document.is_published)
+
+
+async def remove_document(db, document_id: int):
+    """在当前事务中删除文档的索引（内存索引在提交后生效）"""
+    await search_backend.remove(db, document_id)
+
+
+def snippet_column(dialect_name: str, term: str):
+    """正文中第一个匹配位置附近的片段（只截取片段，不读取完整正文）"""
+    length = settings.SEARCH_SNIPPET_LENGTH
+    if dialect_name == "postgresql":
+        position = func.strpos(func.lower(Document.content), term)
+        start = func.greatest(1, position - length // 4)
+    else:
+        position = func.instr(func.lower(Document.content), term)
+        start = func.max(1, position - length // 4)
+    return func.substr(Document.content, start, length)
+
+
+async def search_documents(db, query: str, limit: int, offset: int, include_drafts: bool) -> list:
+    """检索文档，返回按相关度排序的结果（含片段）"""
+    segments = query_segments(query)
+    if not segments:
+        return []
+    ranked = await search_backend.search(db, segments, limit, offset, include_drafts)
+    if not ranked:
+        return []
+
+    ids = [document_id for document_id, _ in ranked]
+    snippet = snippet_column(db.bind.dialect.name, segments[0][0]).label("snippet")
+    rows = (await db.execute(
+        select(
+            Document.id, Document.title, Document.author_id, Document.is_published,
+            Document.updated_at, snippet
+        ).where(Document.id.in_(ids))
+    )).mappings().all()
+    by_id = {row["id"]: row for row in rows}
+    return [
+        dict(by_id[document_id], score=round(score, 4))
+        for document_id, score in ranked
+        if document_id in by_id
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Document search index maintenance")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild the search index from documents")
+    args = parser.parse_args()
+    if args.rebuild:
+        from database import create_tables
+        create_tables()
+        print(f"✓ Indexed {init_search_index(rebuild=True)} documents")
+    else:
+        parser.print_help()
@@ -1,21 +1,123 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
 from datetime import datetime, timedelta, timezone
 from typing import Optional
-import json
+import asyncio
+import hashlib
+import logging
+import secrets
+import time
 
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import settings
 from database import get_db
 from models import User
-from enums import ROLE_PERMISSIONS
+from enums import PERMISSION_BITS, ALL_PERMISSIONS_MASK, permission_mask
+from cache import TTLCache
+from token_revocation import revocation_store
+
+try:
+    import jwt as pyjwt  # PyJWT为可选依赖，解码比python-jose快
+except ImportError:
+    pyjwt = None
+
+logger = logging.getLogger(__name__)
 
 # 密码加密上下文 - 使用 argon2（更安全，无长度限制）
 pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
 
 
+@dataclass(frozen=True)
+class Principal:
+    """已认证用户的轻量快照（roles/permissions已解析，permission_mask为预编译的权限位，
+    附带/auth/me需要的资料字段，读取当前用户信息无需再查询数据库）"""
+    id: int
+    username: str
+    is_active: bool
+    roles: frozenset
+    permissions: frozenset
+    permission_mask: int = 0
+    avatar: Optional[str] = None
+    nickname: Optional[str] = None
+    email: Optional[str] = None
+    created_at: Optional[datetime] = None
+    last_login: Optional[datetime] = None
+
+
+# 已认证用户缓存：user_id -> Principal
+principal_cache = TTLCache(
+    max_size=settings.PRINCIPAL_CACHE_MAX_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS
+)
+
+
+def build_principal(user: User) -> Principal:
+    """由用户模型（roles/extra_permissions已加载）构建Principal快照，权限为各角色权限与单独授权的并集"""
+    permissions = frozenset(
+        [permission.code for role in user.roles for permission in role.permissions]
+        + [permission.code for permission in user.extra_permissions]
+    )
+    return Principal(
+        id=user.id,
+        username=user.username,
+        is_active=user.is_active,
+        roles=frozenset(role.name for role in user.roles),
+        permissions=permissions,
+        permission_mask=permission_mask(permissions),
+        avatar=user.avatar,
+        nickname=user.nickname,
+        email=user.email,
+        created_at=user.created_at,
+        last_login=user.last_login
+    )
+
+
+def has_permission(principal: Principal, permission) -> bool:
+    """检查权限：PermissionEnum中的权限只做一次位与运算，自定义权限退回到集合查找"""
+    permission = getattr(permission, "value", permission)
+    bit = PERMISSION_BITS.get(permission)
+    if bit is not None:
+        return bool(principal.permission_mask & bit)
+    return principal.permission_mask == ALL_PERMISSIONS_MASK or permission in principal.permissions
+
+
+# 已验证的token：token哈希 -> payload，条目在token的exp时过期；TOKEN_CACHE_MAX_SIZE为0时不缓存
+token_cache = TTLCache(
+    max_size=settings.TOKEN_CACHE_MAX_SIZE,
+    ttl=settings.TOKEN_CACHE_TTL_SECONDS
+) if settings.TOKEN_CACHE_MAX_SIZE > 0 else None
+
+
+def jwt_backend() -> str:
+    """配置的JWT实现，未安装PyJWT时回退到python-jose"""
+    if settings.JWT_BACKEND == "pyjwt":
+        if pyjwt is not None:
+            return "pyjwt"
+        logger.warning("PyJWT is not installed, falling back to python-jose")
+    return "jose"
+
+
+JWT_BACKEND = jwt_backend()
+JWT_ERRORS = (JWTError, pyjwt.PyJWTError) if pyjwt is not None else (JWTError,)
+
+
+def invalidate_principal(user_id: int):
+    """用户信息变更后使缓存失效"""
+    principal_cache.pop(user_id)
+
+
+def cache_principal(principal: Principal, **changes) -> Principal:
+    """写入principal_cache（changes为需要更新的字段，如登录后的last_login），返回写入的快照"""
+    if changes:
+        principal = replace(principal, **changes)
+    principal_cache.set(principal.id, principal)
+    return principal
+
+
 def hash_password(password: str) -> str:
     """对密码进行哈希"""
     return pwd_context.hash(password)
@@ -26,6 +128,63 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+class PasswordWorkerPool:
+    """密码哈希/校验专用线程池
+    
+    argon2计算期间会释放GIL，放到独立线程池中执行可避免阻塞事件循环。
+    同时在途任务数超过max_inflight时直接返回503，而不是无限排队。
+    """
+    
+    def __init__(self, workers: int, max_inflight: int):
+        self.workers = workers
+        self.max_inflight = max_inflight
+        self.inflight = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="password-worker"
+        )
+    
+    async def run(self, func, *args):
+        # inflight只在事件循环线程中修改，无需加锁
+        if self.inflight >= self.max_inflight:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please retry later",
+                headers={"Retry-After": "1"},
+            )
+        self.inflight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            self.inflight -= 1
+    
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_inflight": self.max_inflight,
+            "inflight": self.inflight,
+            "rejected": self.rejected,
+        }
+
+
+password_pool = PasswordWorkerPool(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_inflight=settings.PASSWORD_HASH_MAX_INFLIGHT
+)
+
+
+async def hash_password_async(password: str) -> str:
+    """在密码线程池中对密码进行哈希"""
+    return await password_pool.run(hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """在密码线程池中验证密码"""
+    return await password_pool.run(verify_password, plain_password, hashed_password)
+
+
 def create_token(
     subject: str,
     token_type: str = "access",
@@ -49,9 +208,11 @@ def create_token(
         "sub": str(subject),
         "exp": expire,
         "iat": datetime.now(timezone.utc),
-        "type": token_type
+        "type": token_type,
+        "jti": secrets.token_hex(16)
     }
-    encoded_jwt = jwt.encode(
+    encoder = pyjwt if JWT_BACKEND == "pyjwt" else jwt
+    encoded_jwt = encoder.encode(
         to_encode,
         settings.SECRET_KEY,
         algorithm=settings.ALGORITHM
@@ -59,50 +220,76 @@ def create_token(
     return encoded_jwt
 
 
+def decode_token(token: str) -> dict:
+    """校验签名和exp并解码，失败时抛出JWT_ERRORS中的异常"""
+    decoder = pyjwt if JWT_BACKEND == "pyjwt" else jwt
+    return decoder.decode(
+        token,
+        settings.SECRET_KEY,
+        algorithms=[settings.ALGORITHM]
+    )
+
+
+def token_cache_key(token: str) -> bytes:
+    return hashlib.blake2b(token.encode("utf-8"), digest_size=16).digest()
+
+
 def verify_token(token: str, token_type: str = "access") -> dict:
     """验证JWT Token
     
+    验证通过的payload按token哈希缓存到exp为止（最长TOKEN_CACHE_TTL_SECONDS），
+    同一token的后续请求跳过签名校验和解码；返回的payload为共享对象，调用方不得修改。
+    吊销检查只查内存中的吊销列表，不访问数据库
+    
     Args:
         token: 要验证的token
         token_type: 期望的token类型
-        
+    
     Returns:
         token的payload字典
     """
-    try:
-        payload = jwt.decode(
-            token,
-            settings.SECRET_KEY,
-            algorithms=[settings.ALGORITHM]
-        )
-        user_id: str = payload.get("sub")
-        token_type_in_token: str = payload.get("type")
-        
-        if user_id is None or token_type_in_token != token_type:
+    cache = token_cache
+    key = token_cache_key(token) if cache is not None else None
+    payload = cache.get(key) if cache is not None else None
+    if payload is None:
+        try:
+            payload = decode_token(token)
+        except JWT_ERRORS:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid token"
+                detail="Could not validate credentials"
             )
-        return payload
-    except JWTError:
+        remaining = payload.get("exp", 0) - time.time()
+        if cache is not None and remaining > 0:
+            cache.set(key, payload, ttl=min(remaining, settings.TOKEN_CACHE_TTL_SECONDS))
+    
+    if payload.get("sub") is None or payload.get("type") != token_type:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid token"
+        )
+    if revocation_store.is_revoked(payload.get("jti")):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials"
+            detail="Token has been revoked"
         )
+    return payload
 
 
 async def get_current_user(
     token: str = None,
-    db: Session = Depends(get_db)
-) -> User:
+    db: AsyncSession = Depends(get_db)
+) -> Principal:
     """从token中获取当前用户
     
+    优先读取principal_cache，未命中时才查询数据库
+    
     Args:
         token: 从请求头中提取的access token
         db: 数据库会话
-        
+    
     Returns:
-        当前用户对象
+        当前用户的Principal快照
     """
     if token is None:
         raise HTTPException(
@@ -113,41 +300,55 @@ async def get_current_user(
     payload = verify_token(token, token_type="access")
     user_id: int = int(payload.get("sub"))
     
-    user = db.query(User).filter(User.id == user_id).first()
-    if user is None or not user.is_active:
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        user = await db.get(User, user_id)
+        if user is not None:
+            principal = cache_principal(build_principal(user))
+    
+    if principal is None or not principal.is_active:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found or inactive"
         )
-    return user
+    return principal
 
 
-async def get_user_permissions(user: User = Depends(get_current_user)) -> list:
-    """获取用户权限列表"""
-    try:
-        permissions = json.loads(user.permissions)
-        if isinstance(permissions, list):
-            return permissions
-    except (json.JSONDecodeError, TypeError):
-        pass
-    return []
+async def require_admin(current_user: Principal = Depends(get_current_user)) -> Principal:
+    """管理员权限依赖，通过时返回当前用户"""
+    if "admin" not in current_user.roles:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can access this resource"
+        )
+    return current_user
+
+
+async def get_user_permissions(user: Principal = Depends(get_current_user)) -> frozenset:
+    """获取用户权限集合"""
+    return user.permissions
 
 
 def check_permission(required_permission: str):
-    """权限检查依赖"""
-    async def permission_checker(
-        current_user: User = Depends(get_current_user),
-        permissions: list = Depends(get_user_permissions)
-    ):
-        # 如果有admin权限，直接通过
-        if "*:*:*" in permissions or "permission:btn:*" in permissions:
-            return True
-        
-        if required_permission not in permissions:
+    """权限检查依赖，通过时返回当前用户
+    
+    所需权限在创建依赖时编译为位，请求时只检查Principal中缓存的权限位掩码
+    （通配权限*:*:*、permission:btn:*编译为全部位）
+    """
+    # PermissionEnum成员统一转成字符串
+    required_permission = getattr(required_permission, "value", required_permission)
+    required_bit = PERMISSION_BITS.get(required_permission)
+    
+    async def permission_checker(current_user: Principal = Depends(get_current_user)) -> Principal:
+        if required_bit is not None:
+            allowed = current_user.permission_mask & required_bit
+        else:
+            allowed = has_permission(current_user, required_permission)
+        if not allowed:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Insufficient permissions"
             )
-        return True
+        return current_user
     
     return permission_checker
@@ -0,0 +1,286 @@
+"""
+SQL性能分析（替代DATABASE_ECHO逐条输出SQL）
+
+- 纯ASGI中间件为每个请求创建分析上下文（ContextVar），引擎的cursor事件把每条SQL归属到当前请求
+- 慢查询：耗时超过SQL_SLOW_QUERY_MS的语句连同参数记录日志，SELECT语句由后台线程在同步引擎上
+  执行EXPLAIN并附带执行计划（异步驱动与同步驱动参数格式不同时跳过EXPLAIN）
+- N+1检测：请求结束时同一条SQL执行次数达到SQL_N_PLUS_ONE_THRESHOLD时记录警告
+- 采样：按SQL_TRACE_SAMPLE_RATE抽样请求，请求结束时输出该请求的完整SQL轨迹
+- 最近的慢查询和N+1记录通过 /monitor/sql-profiler 查看
+"""
+
+import logging
+import queue
+import random
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+from config import settings
+from database import engine
+
+logger = logging.getLogger(__name__)
+
+# 各数据库查看执行计划的语句前缀
+EXPLAIN_PREFIXES = {
+    "sqlite": "EXPLAIN QUERY PLAN ",
+    "postgresql": "EXPLAIN ",
+    "mysql": "EXPLAIN ",
+}
+
+MAX_STATEMENT_CHARS = 2000
+MAX_PARAMS_CHARS = 500
+
+
+def _shorten(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def _format_params(parameters, executemany: bool) -> str:
+    if executemany:
+        return f"<executemany: {len(parameters)} rows>"
+    return _shorten(repr(parameters), MAX_PARAMS_CHARS)
+
+
+class RequestProfile:
+    """单个请求的SQL统计"""
+
+    __slots__ = ("method", "path", "started", "statements", "queries", "seconds", "trace")
+
+    def __init__(self, method: str, path: str, sampled: bool):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.statements = Counter()
+        self.queries = 0
+        self.seconds = 0.0
+        self.trace = [] if sampled else None
+
+
+current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("current_profile", default=None)
+
+
+class SqlProfiler:
+    def __init__(
+        self,
+        slow_query_ms: float = 200,
+        explain: bool = True,
+        n_plus_one_threshold: int = 10,
+        sample_rate: float = 0.0,
+        max_trace_statements: int = 500,
+        history_size: int = 50
+    ):
+        self.slow_query_seconds = slow_query_ms / 1000
+        self.explain = explain
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.sample_rate = sample_rate
+        self.max_trace_statements = max_trace_statements
+        self._explain_queue: queue.Queue = queue.Queue(maxsize=100)
+        self._plans = OrderedDict()          # 语句 -> 执行计划（同一语句只EXPLAIN一次）
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+        # 统计指标
+        self.requests = 0
+        self.sampled = 0
+        self.slow_queries = 0
+        self.n_plus_one = 0
+        self.explained = 0
+        self.recent_slow = deque(maxlen=history_size)
+        self.recent_n_plus_one = deque(maxlen=history_size)
+
+    # --- 请求上下文 ---
+    def begin_request(self, method: str, path: str):
+        self.requests += 1
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if sampled:
+            self.sampled += 1
+        return current_profile.set(RequestProfile(method, path, sampled))
+
+    def end_request(self, token):
+        profile = current_profile.get()
+        current_profile.reset(token)
+        if profile is None or not profile.queries:
+            return
+        for statement, count in profile.statements.items():
+            if count >= self.n_plus_one_threshold:
+                self.n_plus_one += 1
+                self.recent_n_plus_one.append({
+                    "method": profile.method,
+                    "path": profile.path,
+                    "count": count,
+                    "statement": _shorten(statement, MAX_STATEMENT_CHARS),
+                })
+                logger.warning(
+                    "Possible N+1 query: %s %s executed the same statement %d times: %s",
+                    profile.method, profile.path, count, _shorten(statement, MAX_STATEMENT_CHARS)
+                )
+        if profile.trace is not None:
+            elapsed_ms = (time.perf_counter() - profile.started) * 1000
+            lines = [
+                f"  +{offset:8.2f}ms {duration:8.2f}ms  {statement}"
+                for offset, duration, statement in profile.trace
+            ]
+            logger.info(
+                "SQL trace %s %s: %d statements, %.2fms in database, %.2fms total\n%s",
+                profile.method, profile.path, profile.queries, profile.seconds * 1000, elapsed_ms,
+                "\n".join(lines)
+            )
+
+    # --- 引擎事件 ---
+    def instrument_engine(self, target_engine):
+        """监听引擎的SQL执行事件（异步引擎传入async_engine.sync_engine）"""
+        event.listen(target_engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(target_engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        context._profile_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        finished = time.perf_counter()
+        elapsed = finished - context._profile_started
+        profile = current_profile.get()
+        if profile is not None:
+            profile.queries += 1
+            profile.seconds += elapsed
+            profile.statements[statement] += 1
+            if profile.trace is not None and len(profile.trace) < self.max_trace_statements:
+                profile.trace.append((
+                    (context._profile_started - profile.started) * 1000,
+                    elapsed * 1000,
+                    _shorten(statement, MAX_STATEMENT_CHARS),
+                ))
+        if elapsed >= self.slow_query_seconds:
+            self._slow_query(conn, statement, parameters, executemany, elapsed, profile)
+
+    # --- 慢查询 ---
+    def _slow_query(self, conn, statement, parameters, executemany, elapsed, profile):
+        self.slow_queries += 1
+        entry = {
+            "duration_ms": round(elapsed * 1000, 3),
+            "method": profile.method if profile else None,
+            "path": profile.path if profile else None,
+            "statement": _shorten(statement, MAX_STATEMENT_CHARS),
+            "params": _format_params(parameters, executemany),
+            "plan": None,
+        }
+        self.recent_slow.append(entry)
+        explainable = (
+            self.explain
+            and self.running
+            and not executemany
+            and statement.lstrip()[:6].upper() in ("SELECT", "WITH")
+            and conn.dialect.name in EXPLAIN_PREFIXES
+            and conn.dialect.name == engine.dialect.name
+            and conn.dialect.paramstyle == engine.dialect.paramstyle
+        )
+        if explainable:
+            try:
+                self._explain_queue.put_nowait((entry, statement, parameters))
+                return
+            except queue.Full:
+                pass
+        self._log_slow(entry)
+
+    @staticmethod
+    def _log_slow(entry: dict):
+        logger.warning(
+            "Slow query %.1fms%s: %s | params: %s%s",
+            entry["duration_ms"],
+            f" ({entry['method']} {entry['path']})" if entry["path"] else "",
+            entry["statement"],
+            entry["params"],
+            f"\nplan:\n{entry['plan']}" if entry["plan"] else "",
+        )
+
+    def _explain(self, statement: str, parameters) -> str:
+        plan = self._plans.get(statement)
+        if plan is not None:
+            self._plans.move_to_end(statement)
+            return plan
+        with engine.connect() as conn:
+            rows = conn.exec_driver_sql(EXPLAIN_PREFIXES[engine.dialect.name] + statement, parameters).all()
+        plan = "\n".join("  " + " | ".join(str(value) for value in row) for row in rows)
+        self._plans[statement] = plan
+        if len(self._plans) > 256:
+            self._plans.popitem(last=False)
+        self.explained += 1
+        return plan
+
+    # --- 后台EXPLAIN线程 ---
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """启动后台EXPLAIN线程"""
+        if self.running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="sql-profiler-explain", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                entry, statement, parameters = self._explain_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                entry["plan"] = self._explain(statement, parameters)
+            except Exception as exc:
+                entry["plan"] = f"  EXPLAIN failed: {exc}"
+            self._log_slow(entry)
+
+    def stats(self) -> dict:
+        return {
+            "slow_query_ms": self.slow_query_seconds * 1000,
+            "n_plus_one_threshold": self.n_plus_one_threshold,
+            "sample_rate": self.sample_rate,
+            "requests": self.requests,
+            "sampled": self.sampled,
+            "slow_queries": self.slow_queries,
+            "n_plus_one": self.n_plus_one,
+            "explained": self.explained,
+            "running": self.running,
+            "recent_slow": list(self.recent_slow),
+            "recent_n_plus_one": list(self.recent_n_plus_one),
+        }
+
+
+class SqlProfilerMiddleware:
+    """为每个HTTP请求建立SQL分析上下文"""
+
+    def __init__(self, app, profiler: "SqlProfiler" = None):
+        self.app = app
+        self.profiler = profiler or sql_profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = self.profiler.begin_request(scope["method"], scope["path"])
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.profiler.end_request(token)
+
+
+sql_profiler = SqlProfiler(
+    slow_query_ms=settings.SQL_SLOW_QUERY_MS,
+    explain=settings.SQL_SLOW_QUERY_EXPLAIN,
+    n_plus_one_threshold=settings.SQL_N_PLUS_ONE_THRESHOLD,
+    sample_rate=settings.SQL_TRACE_SAMPLE_RATE,
+    max_trace_statements=settings.SQL_TRACE_MAX_STATEMENTS
+)
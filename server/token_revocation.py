@@ -0,0 +1,228 @@
+"""
+JWT吊销列表
+
+- 每个token带随机jti；登出吊销当前token，刷新时吊销旧的refresh token（轮换）
+- 吊销记录保存在revoked_tokens表，按token的exp自动清理
+- 内存中保存未过期的吊销记录：Bloom过滤器 + 精确集合。请求鉴权时先查Bloom过滤器，
+  绝大多数未吊销的token在这里直接通过；命中时再查精确集合排除误判，全程不访问数据库
+- 后台线程每隔TOKEN_REVOCATION_SYNC_SECONDS从数据库增量加载其他进程写入的吊销记录，
+  并清理过期记录
+"""
+
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import select, delete
+
+from config import settings
+from database import SessionLocal
+from models import RevokedToken
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """定长位数组的Bloom过滤器（只增不删，清理时整体重建）
+
+    jti本身是随机的128位十六进制串，直接取前后64位做双重哈希，不再计算哈希函数
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.bits = max(64, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / self.capacity * math.log(2)))
+        self._array = bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        try:
+            h1 = int(key[:16], 16)
+            h2 = int(key[16:32], 16) | 1
+        except ValueError:
+            h1 = hash(key)
+            h2 = hash(key[::-1]) | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.bits
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self._array[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        # 请求路径上调用，展开循环避免生成器开销；未吊销的token通常在前一两个位置就返回
+        try:
+            position = int(key[:16], 16)
+            step = int(key[16:32], 16) | 1
+        except ValueError:
+            position = hash(key)
+            step = hash(key[::-1]) | 1
+        array, bits = self._array, self.bits
+        for _ in range(self.hashes):
+            index = position % bits
+            if not array[index >> 3] & (1 << (index & 7)):
+                return False
+            position += step
+        return True
+
+
+def _expires_epoch(expires_at: datetime) -> float:
+    return expires_at.replace(tzinfo=timezone.utc).timestamp()
+
+
+class RevocationStore:
+    """已吊销jti的内存视图（数据库为准）"""
+
+    def __init__(self, capacity: int, error_rate: float, sync_interval: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._revoked = {}          # jti -> exp（epoch秒）
+        self._last_id = 0           # 已加载的revoked_tokens最大id
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+        # 统计指标
+        self.checks = 0
+        self.bloom_hits = 0
+        self.false_positives = 0
+        self.pruned = 0
+
+    # --- 请求路径 ---
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        """jti是否已吊销（没有jti的旧token无法吊销，视为有效）"""
+        if jti is None:
+            return False
+        self.checks += 1
+        if not self._revoked:
+            return False
+        if jti not in self._bloom:
+            return False
+        self.bloom_hits += 1
+        expires = self._revoked.get(jti)
+        if expires is None:
+            self.false_positives += 1
+            return False
+        return True
+
+    def _remember(self, jti: str, expires: float) -> bool:
+        """加入内存视图，已存在时返回False（调用方需持有锁）"""
+        if jti in self._revoked:
+            return False
+        self._revoked[jti] = expires
+        if self._bloom.count >= self._bloom.capacity:
+            self._rebuild(max(self.capacity, len(self._revoked) * 2))
+        else:
+            self._bloom.add(jti)
+        return True
+
+    async def revoke(self, db, payload: dict) -> bool:
+        """吊销token（写入当前事务，由调用方提交）
+
+        内存视图立即生效；同一jti已被吊销时返回False（刷新token被并发重复使用）
+        """
+        jti = payload.get("jti")
+        if jti is None:
+            return True
+        expires_at = datetime.utcfromtimestamp(payload["exp"])
+        with self._lock:
+            if not self._remember(jti, float(payload["exp"])):
+                return False
+        db.add(RevokedToken(
+            jti=jti,
+            user_id=int(payload["sub"]),
+            token_type=payload.get("type", "access"),
+            expires_at=expires_at
+        ))
+        return True
+
+    # --- 同步与清理 ---
+    def _rebuild(self, capacity: int):
+        bloom = BloomFilter(capacity, self.error_rate)
+        for jti in self._revoked:
+            bloom.add(jti)
+        self._bloom = bloom
+
+    def load(self) -> int:
+        """从数据库增量加载吊销记录并清理过期记录，返回新加载的条数"""
+        now = datetime.utcnow()
+        loaded = 0
+        with SessionLocal() as db:
+            db.execute(delete(RevokedToken).where(RevokedToken.expires_at <= now))
+            db.commit()
+            rows = db.execute(
+                select(RevokedToken.id, RevokedToken.jti, RevokedToken.expires_at)
+                .where(RevokedToken.id > self._last_id)
+                .order_by(RevokedToken.id)
+            ).all()
+        with self._lock:
+            for row in rows:
+                if self._remember(row.jti, _expires_epoch(row.expires_at)):
+                    loaded += 1
+                self._last_id = max(self._last_id, row.id)
+            self._prune_locked(time.time())
+        return loaded
+
+    def _prune_locked(self, now: float):
+        expired = [jti for jti, expires in self._revoked.items() if expires <= now]
+        for jti in expired:
+            del self._revoked[jti]
+        self.pruned += len(expired)
+        # Bloom过滤器无法删除，过期项较多时重建以恢复误判率
+        if expired and self._bloom.count > 2 * len(self._revoked) + 1000:
+            self._rebuild(max(self.capacity, len(self._revoked) * 2))
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """启动后台同步线程"""
+        if self.running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="token-revocation-sync", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while not self._stop_event.wait(self.sync_interval):
+            try:
+                self.load()
+            except Exception:
+                logger.exception("Token revocation sync failed")
+
+    def stats(self) -> dict:
+        return {
+            "revoked": len(self._revoked),
+            "bloom_bits": self._bloom.bits,
+            "bloom_hashes": self._bloom.hashes,
+            "bloom_items": self._bloom.count,
+            "checks": self.checks,
+            "bloom_hits": self.bloom_hits,
+            "false_positives": self.false_positives,
+            "pruned": self.pruned,
+            "running": self.running,
+        }
+
+
+revocation_store = RevocationStore(
+    capacity=settings.TOKEN_REVOCATION_BLOOM_CAPACITY,
+    error_rate=settings.TOKEN_REVOCATION_BLOOM_ERROR_RATE,
+    sync_interval=settings.TOKEN_REVOCATION_SYNC_SECONDS
+)
@@ -0,0 +1,583 @@
+"""
+问答检索使用的本地向量索引
+
+- 文档正文按段落切分为带重叠的片段（chunk），由可替换的本地embedder生成向量；
+  默认的hashing embedder不依赖模型文件，可离线使用
+- 向量及行元数据保存在VECTOR_INDEX_DIR下的内存映射文件中，容量不足时扩展文件，
+  只记录片段在正文中的位置，片段文本检索命中后再从documents表截取
+- exact模式分块做矩阵乘法的暴力余弦检索；ivf模式用球面k-means把向量分到nlist个桶，
+  查询时只计算最近的nprobe个桶
+- 文档创建/更新/回滚/删除后增量更新对应的行，删除的行会被复用；每行记录文档的updated_at，
+  启动时与documents表对比，补齐提交后写索引失败的文档
+
+重建索引: python vector_index.py --rebuild
+训练IVF: python vector_index.py --train-ivf
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import re
+import threading
+import zlib
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+import numpy as np
+from sqlalchemy import select, func, case
+
+from config import settings
+from database import engine
+from models import Document
+from search_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+HEADER_FILE = "index.json"
+INDEX_VERSION = 2
+
+# 段落和句末标点处切分
+PARAGRAPH_PATTERN = re.compile(r"\n\s*\n")
+SENTENCE_PATTERN = re.compile(r"(?<=[。！？!?；;.\n])")
+
+
+# ===== 分块 =====
+def _sentences(text: str, start: int):
+    """把段落拆成句子，返回 (起始位置, 文本)"""
+    offset = start
+    for sentence in SENTENCE_PATTERN.split(text):
+        if sentence:
+            yield offset, sentence
+            offset += len(sentence)
+
+
+def chunk_text(content: Optional[str], size: int, overlap: int) -> list:
+    """把正文切分为不超过size个字符的片段，相邻片段重叠约overlap个字符
+
+    Returns:
+        [(start, length)]，位置按字符计算
+    """
+    content = content or ""
+    pieces = []
+    position = 0
+    for match in PARAGRAPH_PATTERN.finditer(content + "\n\n"):
+        paragraph = content[position:match.start()]
+        for offset, sentence in _sentences(paragraph, position):
+            # 超长句子按固定长度硬切
+            for i in range(0, len(sentence), size):
+                pieces.append((offset + i, min(size, len(sentence) - i)))
+        position = match.end()
+
+    chunks = []
+    current_start = current_end = None
+    for start, length in pieces:
+        if current_start is not None and start + length - current_start > size:
+            chunks.append((current_start, current_end - current_start))
+            # 从上一片段末尾回退overlap个字符开始下一个片段，同时保证长度不超过size
+            current_start = max(min(start, current_end - overlap), start + length - size)
+        if current_start is None:
+            current_start = start
+        current_end = start + length
+    if current_start is not None and content[current_start:current_end].strip():
+        chunks.append((current_start, current_end - current_start))
+    return chunks
+
+
+# ===== Embedder =====
+class HashingEmbedder:
+    """特征哈希embedder：词（中文bigram）经crc32映射到固定维度，带符号、对数词频、L2归一化
+
+    每个词写入两个桶（取crc32的高低16位，各自带符号），单个桶冲突时向量不会整体抵消
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.name = f"hashing2-{dim}"
+
+    def _embed_one(self, text: str, out: np.ndarray):
+        counts = Counter(tokenize(text))
+        for token, tf in counts.items():
+            hashed = zlib.crc32(token.encode("utf-8"))
+            weight = 1.0 + math.log(tf)
+            for part in (hashed & 0xFFFF, hashed >> 16):
+                sign = 1.0 if part & 0x8000 else -1.0
+                out[(part & 0x7FFF) % self.dim] += sign * weight
+
+    def embed(self, texts: list) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            self._embed_one(text, vectors[i])
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+EMBEDDERS = {
+    "hashing": lambda: HashingEmbedder(settings.VECTOR_DIM),
+}
+
+
+def register_embedder(name: str, factory: Callable):
+    """注册自定义embedder，factory返回带name/dim属性和embed(texts)方法的对象"""
+    EMBEDDERS[name] = factory
+
+
+def create_embedder():
+    if settings.VECTOR_EMBEDDER not in EMBEDDERS:
+        raise ValueError(f"Unknown VECTOR_EMBEDDER: {settings.VECTOR_EMBEDDER}")
+    return EMBEDDERS[settings.VECTOR_EMBEDDER]()
+
+
+# ===== 向量存储 =====
+class VectorIndex:
+    """内存映射的向量索引（单进程写入）
+
+    每一行对应一个片段：vectors(float32) / doc_ids(int32，-1表示空闲) /
+    spans(int32 起始位置, 长度) / published(uint8) / ivf_lists(int32 所属桶) /
+    stamps(float64 写入时文档的updated_at)
+    """
+
+    def __init__(self, directory: str, embedder):
+        self.directory = directory
+        self.embedder = embedder
+        self.dim = embedder.dim
+        self.capacity = 0
+        self.size = 0                # 已使用过的最大行号+1
+        self.centroids: Optional[np.ndarray] = None
+        self.trained_rows = 0
+        self._free_rows: list = []
+        self._lock = threading.RLock()
+        self._arrays = {}
+
+    # --- 文件 ---
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _layouts(self) -> dict:
+        return {
+            "vectors": ("vectors.f32", np.float32, (self.dim,)),
+            "doc_ids": ("doc_ids.i32", np.int32, ()),
+            "spans": ("spans.i32", np.int32, (2,)),
+            "published": ("published.u8", np.uint8, ()),
+            "ivf_lists": ("ivf_lists.i32", np.int32, ()),
+            "stamps": ("stamps.f64", np.float64, ()),
+        }
+
+    def _map(self, capacity: int):
+        """按容量（行数）映射全部文件，文件不足时扩展（新增部分由文件系统填零）"""
+        self._arrays = {}
+        for key, (name, dtype, shape) in self._layouts().items():
+            path = self._path(name)
+            row_bytes = np.dtype(dtype).itemsize * int(np.prod(shape or (1,)))
+            with open(path, "ab") as f:
+                if f.tell() < capacity * row_bytes:
+                    f.truncate(capacity * row_bytes)
+            self._arrays[key] = np.memmap(path, dtype=dtype, mode="r+", shape=(capacity,) + shape)
+        self.capacity = capacity
+
+    def _write_header(self):
+        header = {
+            "version": INDEX_VERSION,
+            "embedder": self.embedder.name,
+            "dim": self.dim,
+            "capacity": self.capacity,
+            "size": self.size,
+            "trained_rows": self.trained_rows,
+        }
+        tmp_path = self._path(HEADER_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(header, f)
+        os.replace(tmp_path, self._path(HEADER_FILE))
+
+    def open(self) -> bool:
+        """打开已有索引，不存在或embedder不一致时创建空索引；返回是否沿用了已有数据"""
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            header = None
+            if os.path.exists(self._path(HEADER_FILE)):
+                with open(self._path(HEADER_FILE)) as f:
+                    header = json.load(f)
+            reuse = bool(header) and header.get("version") == INDEX_VERSION \
+                and header.get("embedder") == self.embedder.name and header.get("dim") == self.dim
+            if not reuse:
+                self._reset()
+                return False
+            self._map(header["capacity"])
+            self.size = header["size"]
+            self.trained_rows = header.get("trained_rows", 0)
+            centroids_path = self._path("ivf_centroids.npy")
+            self.centroids = np.load(centroids_path) if self.trained_rows and os.path.exists(centroids_path) else None
+            self._free_rows = np.nonzero(self._arrays["doc_ids"][:self.size] == -1)[0].tolist()
+            return True
+
+    def _reset(self):
+        self._arrays = {}
+        for name, _, _ in self._layouts().values():
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+        if os.path.exists(self._path("ivf_centroids.npy")):
+            os.remove(self._path("ivf_centroids.npy"))
+        self.size = 0
+        self.centroids = None
+        self.trained_rows = 0
+        self._free_rows = []
+        self._map(max(1024, self.capacity))
+        self._arrays["doc_ids"][:] = -1
+        self._write_header()
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def flush(self):
+        with self._lock:
+            for array in self._arrays.values():
+                array.flush()
+            self._write_header()
+
+    def _allocate(self, count: int) -> np.ndarray:
+        rows = []
+        while self._free_rows and len(rows) < count:
+            rows.append(self._free_rows.pop())
+        needed = count - len(rows)
+        if needed:
+            if self.size + needed > self.capacity:
+                old_capacity = self.capacity
+                self._map(max(self.capacity * 2, self.size + needed))
+                self._arrays["doc_ids"][old_capacity:] = -1
+            rows.extend(range(self.size, self.size + needed))
+            self.size += needed
+        return np.array(rows, dtype=np.int64)
+
+    # --- 写入 ---
+    def rows_of(self, document_id: int) -> np.ndarray:
+        return np.nonzero(self._arrays["doc_ids"][:self.size] == document_id)[0]
+
+    def _remove_rows(self, rows: np.ndarray):
+        if len(rows):
+            self._arrays["doc_ids"][rows] = -1
+            self._arrays["vectors"][rows] = 0
+            self._free_rows.extend(rows.tolist())
+
+    def replace_document(self, document_id: int, vectors: np.ndarray, spans: list, is_published: bool, stamp: float = 0.0):
+        """用新的片段向量替换文档原有的行"""
+        with self._lock:
+            self._remove_rows(self.rows_of(document_id))
+            if len(spans):
+                rows = self._allocate(len(spans))
+                self._arrays["vectors"][rows] = vectors
+                self._arrays["doc_ids"][rows] = document_id
+                self._arrays["spans"][rows] = np.asarray(spans, dtype=np.int32)
+                self._arrays["published"][rows] = 1 if is_published else 0
+                self._arrays["stamps"][rows] = stamp
+                if self.centroids is not None:
+                    self._arrays["ivf_lists"][rows] = np.argmax(vectors @ self.centroids.T, axis=1)
+
+    def remove_document(self, document_id: int):
+        with self._lock:
+            self._remove_rows(self.rows_of(document_id))
+
+    def set_published(self, document_id: int, is_published: bool, stamp: Optional[float] = None):
+        with self._lock:
+            rows = self.rows_of(document_id)
+            self._arrays["published"][rows] = 1 if is_published else 0
+            if stamp is not None:
+                self._arrays["stamps"][rows] = stamp
+
+    def document_ids(self) -> set:
+        with self._lock:
+            ids = np.unique(self._arrays["doc_ids"][:self.size])
+        return set(ids[ids >= 0].tolist())
+
+    def document_states(self) -> dict:
+        """document_id -> (stamp, is_published)，取文档任一行的记录"""
+        with self._lock:
+            doc_ids = np.asarray(self._arrays["doc_ids"][:self.size])
+            alive = np.nonzero(doc_ids >= 0)[0]
+            ids, first = np.unique(doc_ids[alive], return_index=True)
+            rows = alive[first]
+            stamps = np.asarray(self._arrays["stamps"][rows])
+            published = np.asarray(self._arrays["published"][rows])
+        return {
+            int(document_id): (float(stamp), bool(flag))
+            for document_id, stamp, flag in zip(ids, stamps, published)
+        }
+
+    # --- IVF ---
+    def train_ivf(self, nlist: Optional[int] = None, iterations: int = 10, sample_size: int = 50000, seed: int = 0) -> int:
+        """球面k-means训练桶中心并重新分配全部行，返回桶数量"""
+        with self._lock:
+            alive = np.nonzero(self._arrays["doc_ids"][:self.size] >= 0)[0]
+            if len(alive) == 0:
+                return 0
+            nlist = nlist or int(min(4096, max(16, math.sqrt(len(alive)))))
+            nlist = min(nlist, len(alive))
+            rng = np.random.default_rng(seed)
+            sample = alive if len(alive) <= sample_size else rng.choice(alive, sample_size, replace=False)
+            data = np.asarray(self._arrays["vectors"][np.sort(sample)])
+            centroids = data[rng.choice(len(data), nlist, replace=False)].copy()
+            for _ in range(iterations):
+                assignment = np.argmax(data @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assignment, data)
+                norms = np.linalg.norm(sums, axis=1, keepdims=True)
+                empty = norms[:, 0] == 0
+                sums[empty] = centroids[empty]
+                norms[empty] = 1.0
+                centroids = (sums / norms).astype(np.float32)
+
+            batch = settings.VECTOR_SEARCH_BATCH_ROWS
+            for begin in range(0, self.size, batch):
+                end = min(begin + batch, self.size)
+                block = np.asarray(self._arrays["vectors"][begin:end])
+                self._arrays["ivf_lists"][begin:end] = np.argmax(block @ centroids.T, axis=1)
+            self.centroids = centroids
+            self.trained_rows = len(alive)
+            np.save(self._path("ivf_centroids.npy"), centroids)
+            self.flush()
+            return nlist
+
+    def ivf_ready(self) -> bool:
+        return self.centroids is not None
+
+    # --- 检索 ---
+    def search(self, query: np.ndarray, top_k: int, include_drafts: bool, mode: str = "exact", nprobe: int = 8) -> list:
+        """返回 [(行号, 相似度)]，按相似度倒序"""
+        with self._lock:
+            size = self.size
+            if size == 0:
+                return []
+            vectors = self._arrays["vectors"]
+            doc_ids = self._arrays["doc_ids"]
+            published = self._arrays["published"]
+            batch = settings.VECTOR_SEARCH_BATCH_ROWS
+
+            if mode == "ivf" and self.centroids is not None:
+                probes = np.argsort(self.centroids @ query)[::-1][:nprobe]
+                candidates = np.nonzero(np.isin(self._arrays["ivf_lists"][:size], probes))[0]
+                candidate_blocks = [candidates[i:i + batch] for i in range(0, len(candidates), batch)]
+            else:
+                candidate_blocks = [np.arange(i, min(i + batch, size)) for i in range(0, size, batch)]
+
+            best_rows, best_scores = [], []
+            for rows in candidate_blocks:
+                if len(rows) == 0:
+                    continue
+                if rows[-1] - rows[0] + 1 == len(rows):
+                    # 连续行直接切片，避免复制
+                    block = slice(rows[0], rows[-1] + 1)
+                    scores = vectors[block] @ query
+                    valid = doc_ids[block] >= 0
+                    if not include_drafts:
+                        valid &= published[block] == 1
+                else:
+                    scores = vectors[rows] @ query
+                    valid = doc_ids[rows] >= 0
+                    if not include_drafts:
+                        valid &= published[rows] == 1
+                scores = np.where(valid, scores, -np.inf)
+                k = min(top_k, len(scores))
+                top = np.argpartition(-scores, k - 1)[:k]
+                best_rows.append(rows[top])
+                best_scores.append(scores[top])
+
+            if not best_rows:
+                return []
+            rows = np.concatenate(best_rows)
+            scores = np.concatenate(best_scores)
+            order = np.argsort(-scores)[:top_k]
+            return [
+                (int(rows[i]), float(scores[i]))
+                for i in order if np.isfinite(scores[i])
+            ]
+
+    def row_info(self, row: int) -> tuple:
+        """行对应的 (document_id, start, length)"""
+        start, length = self._arrays["spans"][row]
+        return int(self._arrays["doc_ids"][row]), int(start), int(length)
+
+    def stats(self) -> dict:
+        with self._lock:
+            alive = int(np.count_nonzero(self._arrays["doc_ids"][:self.size] >= 0)) if self.size else 0
+        return {
+            "embedder": self.embedder.name,
+            "dim": self.dim,
+            "directory": self.directory,
+            "capacity": self.capacity,
+            "rows": alive,
+            "free_rows": len(self._free_rows),
+            "ivf_lists": 0 if self.centroids is None else len(self.centroids),
+            "ivf_trained_rows": self.trained_rows,
+        }
+
+
+# ===== 模块级接口 =====
+embedder = create_embedder()
+vector_index = VectorIndex(settings.VECTOR_INDEX_DIR, embedder)
+
+
+def document_stamp(updated_at: Optional[datetime]) -> float:
+    """documents.updated_at（UTC naive）转换为索引中记录的时间戳"""
+    return updated_at.replace(tzinfo=timezone.utc).timestamp() if updated_at else 0.0
+
+
+def embed_document(content: Optional[str]) -> tuple:
+    """切分并计算文档全部片段的向量，返回 (vectors, spans)"""
+    spans = chunk_text(content, settings.VECTOR_CHUNK_SIZE, settings.VECTOR_CHUNK_OVERLAP)
+    if not spans:
+        return np.zeros((0, embedder.dim), dtype=np.float32), []
+    texts = [content[start:start + length] for start, length in spans]
+    return embedder.embed(texts), spans
+
+
+def index_rows(rows) -> int:
+    """同步写入一批文档 (id, content, is_published, updated_at)，返回片段数"""
+    chunks = 0
+    for document_id, content, is_published, updated_at in rows:
+        vectors, spans = embed_document(content)
+        vector_index.replace_document(document_id, vectors, spans, is_published, document_stamp(updated_at))
+        chunks += len(spans)
+    return chunks
+
+
+def init_vector_index(rebuild: bool = False) -> int:
+    """启动时打开索引，并补齐与documents表不一致的文档；返回重新索引的文档数
+
+    索引中缺少、或记录的updated_at与documents表不同的文档重新切分写入（提交后写索引失败时
+    在这里修复）；只有发布状态不同的文档直接更新标记
+    """
+    reused = vector_index.open()
+    if rebuild and reused:
+        vector_index.clear()
+    indexed = vector_index.document_states()
+
+    with engine.connect() as conn:
+        wanted = {
+            row.id: (document_stamp(row.updated_at), bool(row.is_published))
+            for row in conn.execute(
+                select(Document.id, Document.updated_at, Document.is_published)
+                .where(func.length(Document.content) > 0)
+            )
+        }
+        for document_id in indexed.keys() - wanted.keys():
+            vector_index.remove_document(document_id)
+        stale = []
+        for document_id, (stamp, is_published) in wanted.items():
+            current = indexed.get(document_id)
+            if current is None or current[0] != stamp:
+                stale.append(document_id)
+            elif current[1] != is_published:
+                vector_index.set_published(document_id, is_published)
+        stale.sort()
+        reindexed = 0
+        for begin in range(0, len(stale), 500):
+            rows = conn.execute(
+                select(Document.id, Document.content, Document.is_published, Document.updated_at)
+                .where(Document.id.in_(stale[begin:begin + 500]))
+            ).all()
+            index_rows(rows)
+            reindexed += len(rows)
+    vector_index.flush()
+    if reindexed:
+        logger.info("Vector index: embedded %d documents", reindexed)
+    return reindexed
+
+
+async def index_document(document_id: int, content: Optional[str], is_published: bool, updated_at: Optional[datetime] = None):
+    """文档正文变化后（提交后）重新切分并写入向量，失败只记录日志（下次启动时补齐）"""
+    try:
+        vectors, spans = await asyncio.to_thread(embed_document, content)
+        vector_index.replace_document(document_id, vectors, spans, is_published, document_stamp(updated_at))
+        vector_index.flush()
+    except Exception:
+        logger.exception("Failed to update vector index for document %d", document_id)
+
+
+def remove_document(document_id: int):
+    vector_index.remove_document(document_id)
+    vector_index.flush()
+
+
+def remove_documents(document_ids):
+    """批量删除文档的向量（只落盘一次）"""
+    for document_id in document_ids:
+        vector_index.remove_document(document_id)
+    vector_index.flush()
+
+
+def set_published(document_id: int, is_published: bool, updated_at: Optional[datetime] = None):
+    vector_index.set_published(document_id, is_published, document_stamp(updated_at) if updated_at else None)
+    vector_index.flush()
+
+
+async def search_chunks(db, query: str, top_k: int, include_drafts: bool, mode: Optional[str] = None) -> list:
+    """检索与问题最相关的片段，返回片段文本、文档标题和相似度"""
+    mode = mode or settings.VECTOR_SEARCH_MODE
+    query_vector = embedder.embed([query])[0]
+    if mode == "ivf" and not vector_index.ivf_ready():
+        mode = "exact"
+    hits = await asyncio.to_thread(
+        vector_index.search, query_vector, top_k, include_drafts, mode, settings.VECTOR_IVF_NPROBE
+    )
+    if not hits:
+        return []
+
+    # 没有任何共同特征的片段（相似度<=0）不返回
+    infos = [(vector_index.row_info(row), score) for row, score in hits if score > 0]
+    if not infos:
+        return []
+
+    # 一次查询取回全部命中文档：每个文档只截取覆盖其全部命中片段的区间
+    ranges = {}
+    for (document_id, start, length), _ in infos:
+        low, high = ranges.get(document_id, (start, start + length))
+        ranges[document_id] = (min(low, start), max(high, start + length))
+    low_case = case({d: low for d, (low, _) in ranges.items()}, value=Document.id)
+    length_case = case({d: high - low for d, (low, high) in ranges.items()}, value=Document.id)
+    rows = {
+        row.id: row
+        for row in (await db.execute(
+            select(
+                Document.id,
+                Document.title,
+                Document.is_published,
+                func.substr(Document.content, low_case + 1, length_case).label("text"),
+            ).where(Document.id.in_(list(ranges)))
+        )).all()
+    }
+
+    results = []
+    for (document_id, start, length), score in infos:
+        row = rows.get(document_id)
+        if row is None or (not include_drafts and not row.is_published):
+            continue
+        offset = start - ranges[document_id][0]
+        results.append({
+            "document_id": document_id,
+            "title": row.title,
+            "start": start,
+            "text": (row.text or "")[offset:offset + length],
+            "score": round(score, 4),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vector index maintenance")
+    parser.add_argument("--rebuild", action="store_true", help="re-embed all documents")
+    parser.add_argument("--train-ivf", action="store_true", help="train IVF centroids for approximate search")
+    parser.add_argument("--nlist", type=int, default=None)
+    args = parser.parse_args()
+    if not args.rebuild and not args.train_ivf:
+        parser.print_help()
+    else:
+        from database import create_tables
+        create_tables()
+        count = init_vector_index(rebuild=args.rebuild)
+        print(f"✓ Embedded {count} documents")
+        if args.train_ivf:
+            print(f"✓ Trained {vector_index.train_ivf(args.nlist)} IVF lists")
@@ -0,0 +1,102 @@
+"""
+文档版本对比
+
+- line模式：按行对比
+- word模式：先按行对比，再只对被替换的行块做词级对比，避免对整篇文档做词级匹配；
+  中日韩字符逐字切分，其余按单词/空白/标点切分
+- 对比结果按 (document_id, from, to, mode) 缓存在diff_cache中，大文档在线程池中计算
+"""
+
+import asyncio
+import difflib
+import re
+from typing import Optional
+
+from cache import TTLCache
+from config import settings
+from version_store import load_version_content
+
+DIFF_MODES = ("line", "word")
+
+# 中日韩字符单字成词，其余按单词、空白、单个标点切分
+CJK_RANGES = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af"
+WORD_PATTERN = re.compile(rf"[{CJK_RANGES}]|[^\W{CJK_RANGES}]+|\s+|[^\w\s]")
+
+# (document_id, from_version, to_version, mode) -> 对比结果
+diff_cache = TTLCache(max_size=settings.DOCUMENT_DIFF_CACHE_SIZE)
+
+
+def tokenize_words(text: str) -> list:
+    return WORD_PATTERN.findall(text)
+
+
+def _opcodes(old: list, new: list, autojunk: bool = True) -> list:
+    return difflib.SequenceMatcher(None, old, new, autojunk=autojunk).get_opcodes()
+
+
+def _change(op: str, old: str, new: str) -> dict:
+    """equal片段只返回old，避免未修改的内容在响应中重复两次"""
+    if op == "equal":
+        return {"op": op, "old": old, "new": None}
+    return {"op": op, "old": old or None, "new": new or None}
+
+
+def diff_texts(old_text: str, new_text: str, mode: str = "line") -> dict:
+    """对比两段文本
+
+    Returns:
+        changes为按顺序排列的片段：equal/insert/delete/replace，
+        added/removed为增加/删除的行数（word模式下为词数）
+    """
+    old_lines = old_text.splitlines(keepends=True)
+    new_lines = new_text.splitlines(keepends=True)
+    changes = []
+    added = removed = 0
+    for tag, i1, i2, j1, j2 in _opcodes(old_lines, new_lines):
+        old_block = "".join(old_lines[i1:i2])
+        new_block = "".join(new_lines[j1:j2])
+        if mode == "word" and tag == "replace":
+            old_words = tokenize_words(old_block)
+            new_words = tokenize_words(new_block)
+            for wtag, a1, a2, b1, b2 in _opcodes(old_words, new_words, autojunk=False):
+                changes.append(_change(wtag, "".join(old_words[a1:a2]), "".join(new_words[b1:b2])))
+                if wtag != "equal":
+                    removed += a2 - a1
+                    added += b2 - b1
+            continue
+        changes.append(_change(tag, old_block, new_block))
+        if tag != "equal":
+            removed += i2 - i1
+            added += j2 - j1
+    return {"mode": mode, "added": added, "removed": removed, "changes": changes}
+
+
+async def diff_versions(
+    db,
+    document_id: int,
+    from_version: int,
+    to_version: int,
+    mode: str = "line"
+) -> Optional[dict]:
+    """对比文档的两个版本，任一版本不存在时返回None"""
+    key = (document_id, from_version, to_version, mode)
+    result = diff_cache.get(key)
+    if result is not None:
+        return result
+
+    old_text = await load_version_content(db, document_id, from_version)
+    new_text = await load_version_content(db, document_id, to_version)
+    if old_text is None or new_text is None:
+        return None
+
+    if len(old_text) + len(new_text) > settings.DOCUMENT_DIFF_OFFLOAD_BYTES:
+        result = await asyncio.to_thread(diff_texts, old_text, new_text, mode)
+    else:
+        result = diff_texts(old_text, new_text, mode)
+    diff_cache.set(key, result)
+    return result
+
+
+def forget_document(document_id: int):
+    """文档删除后清理其缓存的对比结果"""
+    diff_cache.discard_where(lambda key: key[0] == document_id)
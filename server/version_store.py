@@ -0,0 +1,266 @@
+"""
+文档版本存储：周期性全文快照 + 相邻版本之间的增量
+
+- 版本号满足 (version_number - 1) % 快照间隔 == 0 时保存全文快照，其余版本
+  只保存相对上一版本的行级增量；增量不比快照小时同样退化为快照
+- 全文和增量都经过压缩（zlib，安装zstandard后可选zstd），每行记录所用编码
+- 读取任意版本时从不晚于它的最近快照开始依次应用增量，链长不超过快照间隔
+- 版本内容不可变，还原后的全文缓存在version_cache中（LRU）
+
+旧数据（每个版本保存一份全文）迁移: python version_store.py --migrate
+"""
+
+import argparse
+import asyncio
+import difflib
+import json
+import logging
+import zlib
+from typing import Optional
+
+from sqlalchemy import select, inspect, text, DateTime
+
+from cache import TTLCache
+from config import settings
+from models import DocumentVersion
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:  # zstd为可选依赖
+    zstandard = None
+
+STORAGE_SNAPSHOT = "snapshot"
+STORAGE_DELTA = "delta"
+
+CODEC_ZLIB = "zlib"
+CODEC_ZSTD = "zstd"
+
+# (document_id, version_number) -> 全文
+version_cache = TTLCache(max_size=settings.DOCUMENT_VERSION_CACHE_SIZE)
+
+
+def default_codec() -> str:
+    """配置的压缩算法，未安装zstandard时回退到zlib"""
+    if settings.DOCUMENT_VERSION_CODEC == CODEC_ZSTD:
+        if zstandard is not None:
+            return CODEC_ZSTD
+        logger.warning("zstandard is not installed, falling back to zlib")
+    return CODEC_ZLIB
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    if codec == CODEC_ZSTD:
+        level = settings.DOCUMENT_VERSION_COMPRESS_LEVEL
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    return zlib.compress(data, min(settings.DOCUMENT_VERSION_COMPRESS_LEVEL, 9))
+
+
+def decompress(payload: bytes, codec: str) -> bytes:
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed document versions")
+        return zstandard.ZstdDecompressor().decompress(payload)
+    return zlib.decompress(payload)
+
+
+def make_delta(base: str, target: str) -> bytes:
+    """生成行级增量
+
+    增量为JSON数组，整数对 [i1, i2] 表示复制base的第i1到i2行，字符串表示插入的文本
+    """
+    base_lines = base.splitlines(keepends=True)
+    target_lines = target.splitlines(keepends=True)
+    matcher = difflib.SequenceMatcher(None, base_lines, target_lines)
+    ops = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append("".join(target_lines[j1:j2]))
+    return json.dumps(ops, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def apply_delta_lines(base_lines: list, delta: bytes) -> list:
+    """在按行拆分的base上应用增量，返回新版本的行列表"""
+    lines = []
+    for op in json.loads(delta):
+        if isinstance(op, str):
+            lines.extend(op.splitlines(keepends=True))
+        else:
+            lines.extend(base_lines[op[0]:op[1]])
+    return lines
+
+
+def apply_delta(base: str, delta: bytes) -> str:
+    """在base上应用make_delta生成的增量"""
+    return "".join(apply_delta_lines(base.splitlines(keepends=True), delta))
+
+
+def is_snapshot_version(version_number: int, interval: Optional[int] = None) -> bool:
+    interval = interval or settings.DOCUMENT_VERSION_SNAPSHOT_INTERVAL
+    return interval <= 1 or (version_number - 1) % interval == 0
+
+
+def encode_version(
+    version_number: int,
+    content: str,
+    previous_content: Optional[str] = None,
+    interval: Optional[int] = None,
+    codec: Optional[str] = None
+) -> dict:
+    """计算版本的存储字段（storage/codec/payload/content_size）
+
+    Args:
+        previous_content: 上一版本的全文，为空时只能保存快照
+    """
+    codec = codec or default_codec()
+    content = content or ""
+    raw = content.encode("utf-8")
+    snapshot = compress(raw, codec)
+    fields = {
+        "storage": STORAGE_SNAPSHOT,
+        "codec": codec,
+        "payload": snapshot,
+        "content_size": len(raw),
+    }
+    if previous_content is None or is_snapshot_version(version_number, interval):
+        return fields
+    delta = compress(make_delta(previous_content, content), codec)
+    if len(delta) < len(snapshot):
+        fields.update(storage=STORAGE_DELTA, payload=delta)
+    return fields
+
+
+def decode_chain(rows: list) -> str:
+    """按版本号升序依次解码，rows的第一项必须是快照
+
+    整条链在行列表上应用增量，只在最后拼接一次全文
+    """
+    lines = None
+    for row in rows:
+        data = decompress(row.payload, row.codec)
+        if row.storage == STORAGE_SNAPSHOT:
+            lines = data.decode("utf-8").splitlines(keepends=True)
+        else:
+            lines = apply_delta_lines(lines, data)
+    return "".join(lines)
+
+
+def _chain_query(document_id: int, version_number: int):
+    """目标版本及其之前最近快照之间的全部存储行"""
+    latest_snapshot = (
+        select(DocumentVersion.version_number)
+        .where(
+            DocumentVersion.document_id == document_id,
+            DocumentVersion.version_number <= version_number,
+            DocumentVersion.storage == STORAGE_SNAPSHOT,
+        )
+        .order_by(DocumentVersion.version_number.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    return (
+        select(
+            DocumentVersion.version_number,
+            DocumentVersion.storage,
+            DocumentVersion.codec,
+            DocumentVersion.payload,
+            DocumentVersion.content_size,
+        )
+        .where(
+            DocumentVersion.document_id == document_id,
+            DocumentVersion.version_number >= latest_snapshot,
+            DocumentVersion.version_number <= version_number,
+        )
+        .order_by(DocumentVersion.version_number)
+    )
+
+
+async def load_version_content(db, document_id: int, version_number: int) -> Optional[str]:
+    """还原指定版本的全文（优先读缓存），版本不存在时返回None
+
+    大文档的解压和增量应用放到线程池中执行，不阻塞事件循环
+    """
+    key = (document_id, version_number)
+    content = version_cache.get(key)
+    if content is not None:
+        return content
+    rows = (await db.execute(_chain_query(document_id, version_number))).all()
+    if not rows or rows[-1].version_number != version_number:
+        return None
+    if rows[-1].content_size > settings.DOCUMENT_DIFF_OFFLOAD_BYTES:
+        content = await asyncio.to_thread(decode_chain, rows)
+    else:
+        content = decode_chain(rows)
+    version_cache.set(key, content)
+    return content
+
+
+def remember_version(document_id: int, version_number: int, content: str):
+    """写入新版本后直接缓存其全文"""
+    version_cache.set((document_id, version_number), content or "")
+
+
+def forget_document(document_id: int):
+    """文档删除后清理其缓存的版本全文（SQLite可能复用已删除的id）"""
+    version_cache.discard_where(lambda key: key[0] == document_id)
+
+
+def migrate_full_copies(engine, batch_size: int = 200) -> int:
+    """把旧的全文版本表转换为快照+增量存储，返回转换的版本数"""
+    inspector = inspect(engine)
+    if not inspector.has_table(DocumentVersion.__tablename__):
+        return 0
+    columns = {c["name"] for c in inspector.get_columns(DocumentVersion.__tablename__)}
+    if "payload" in columns:
+        return 0
+
+    legacy_table = f"{DocumentVersion.__tablename__}_legacy"
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {DocumentVersion.__tablename__} RENAME TO {legacy_table}"))
+        for index in DocumentVersion.__table__.indexes:
+            conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+        DocumentVersion.__table__.create(conn)
+
+        migrated = 0
+        previous = (None, None)
+        result = conn.execution_options(yield_per=batch_size).execute(text(
+            f"SELECT id, document_id, version_number, content, created_at, created_by "
+            f"FROM {legacy_table} ORDER BY document_id, version_number"
+        ).columns(created_at=DateTime))
+        for rows in result.mappings().partitions():
+            values = []
+            for row in rows:
+                previous_content = previous[1] if previous[0] == row["document_id"] else None
+                values.append(dict(
+                    id=row["id"],
+                    document_id=row["document_id"],
+                    version_number=row["version_number"],
+                    created_at=row["created_at"],
+                    created_by=row["created_by"],
+                    **encode_version(row["version_number"], row["content"], previous_content)
+                ))
+                previous = (row["document_id"], row["content"])
+            conn.execute(DocumentVersion.__table__.insert(), values)
+            migrated += len(values)
+        conn.execute(text(f"DROP TABLE {legacy_table}"))
+        if conn.dialect.name == "postgresql":
+            # 新表的自增序列从保留的最大id继续
+            conn.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{DocumentVersion.__tablename__}', 'id'), "
+                f"COALESCE(MAX(id), 1)) FROM {DocumentVersion.__tablename__}"
+            ))
+    return migrated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Document version storage maintenance")
+    parser.add_argument("--migrate", action="store_true", help="convert full-copy versions to snapshot+delta storage")
+    args = parser.parse_args()
+    if args.migrate:
+        from database import engine
+        print(f"✓ Migrated {migrate_full_copies(engine)} document versions")
+    else:
+        parser.print_help()